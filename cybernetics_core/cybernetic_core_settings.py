@@ -11,6 +11,9 @@ class WatcherSettings(BaseSettings):
     processed_folder: str = Field(..., env="PROCESSED_FOLDER")
     check_interval: int = Field(..., env="CHECK_INTERVAL")
     supported_extensions: str = Field(..., env="SUPPORTED_EXTENSIONS")
+    watch_mode: str = Field(..., env="WATCH_MODE")
+    watch_debounce: float = Field(..., env="WATCH_DEBOUNCE")
+    watch_rescan_interval: int = Field(..., env="WATCH_RESCAN_INTERVAL")
     
     #LOG_LEVEL: str = Field(..., env="LOG_LEVEL")
     #LOG_FORMAT: str = Field(..., env="LOG_FORMAT")
@@ -1,11 +1,11 @@
 import aiohttp
 import asyncio
-import base64
 import magic
 import traceback
 import os
 import shutil
-from pylon import settings, output_messages
+from inotify_simple import INotify, flags as inotify_flags
+from pylon import settings, output_messages, track_processing_time, record_processed_file, update_deferred_files, start_metrics_server
 from pylon.context import ApplicationContext
 from cybernetic_core_settings import watcher_settings
 
@@ -14,10 +14,21 @@ class WatcherService:
         self.context = None
         self.mime = magic.Magic(mime=True)
         self.timeout = aiohttp.ClientTimeout(total=settings.async_timeout) # 90 seconds
-        self.seen_files = set()
+        # (mtime, size) of the files already dispatched that are still in the folder
+        self.file_index = {}
+        self.pending = {}
+        self.in_flight = set()
+        # files left in the folder while the files queue is full, a later rescan picks them up
+        self.deferred = set()
+        # admissions started by settled inotify events, kept until done so none is lost or left running
+        self.tasks = set()
+        self.inotify = None
+        # inotify watch descriptor -> collection subfolder, "" for the watch folder itself
+        self.watches = {}
 
-    async def initialize(self):
-        self.context = await ApplicationContext.create()
+    async def initialize(self, context=None):
+        self.context = context or await ApplicationContext.create("sentry")
+        start_metrics_server()
         self.context.logger.info(f"{output_messages.WATCHER_INITIALIZATION}")
 
     async def run(self):
@@ -34,63 +45,269 @@ class WatcherService:
     def is_supported(self, filename):
         return any(filename.lower().endswith(ext) for ext in watcher_settings.supported_extensions)
 
+    def get_collection_folders(self):
+        """Subfolders of the watch folder, one per QDRANT_COLLECTIONS entry, their files are stored in that collection"""
+        return [collection for collection in settings.qdrant_collections if collection != settings.collection_name]
+
+    def create_collection_folders(self):
+        for collection in self.get_collection_folders():
+            os.makedirs(os.path.join(watcher_settings.watch_folder, collection), exist_ok=True)
+
+    def get_collection(self, filename):
+        """Collection a watched file targets, None for COLLECTION_NAME"""
+        return os.path.dirname(filename) or None
+
     def get_current_files(self):
+        """Supported files of the watch folder and its collection subfolders with their (mtime, size), keyed by relative path"""
         if not os.path.exists(watcher_settings.watch_folder):
             raise RuntimeError(f"{output_messages.WATCHER_NO_FOLDER_KO}: {watcher_settings.watch_folder}")
-        return {f for f in os.listdir(watcher_settings.watch_folder) if self.is_supported(f)}
+        current_files = {}
+        for folder in ["", *self.get_collection_folders()]:
+            path = os.path.join(watcher_settings.watch_folder, folder)
+            if not os.path.isdir(path):
+                continue
+            # scandir keeps it to one stat per entry
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_file() and self.is_supported(entry.name):
+                        stat = entry.stat()
+                        current_files[os.path.join(folder, entry.name)] = (stat.st_mtime_ns, stat.st_size)
+        return current_files
+
+    def get_file_state(self, filename):
+        try:
+            stat = os.stat(os.path.join(watcher_settings.watch_folder, filename))
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
 
-    async def send_files(self, session, filepath):
+    @track_processing_time("sentry")
+    async def send_files(self, session, filepath, collection=None):
         """Asynchronous file ingestion."""
         filename = os.path.basename(filepath)
         self.context.logger.debug(f"{output_messages.WATCHER_READ_FILE_START}", filename=filename)
         
-        with open(filepath, 'rb') as f:
-            file_content = f.read()
+        size = os.path.getsize(filepath)
+        message_id = self.context.redis.generate_message_id()
+        # probe stores the chunks of a collection subfolder file in that collection
+        target = {settings.collection_field: collection} if collection else {}
+        if size > settings.blob_threshold:
+            # claim-check: the file goes to the blob store, only its reference goes through redis
+            with open(filepath, 'rb') as f:
+                content_mime = self.mime.from_buffer(f.read(2048))
+            reference = await asyncio.to_thread(self.context.blob.put_file, filepath, message_id)
+            self.context.logger.debug(f"{output_messages.WATCHER_BLOB_STORED}", filename=filename, size=size, reference=reference)
+            payload = self.context.redis.generate_message(
+                id=message_id,
+                content=None,
+                filename=filename,
+                content_field=None,
+                content_type=None,
+                content_mime=content_mime,
+                extra={settings.blob_field: reference, "size": size, **target}
+            )
+        else:
+            with open(filepath, 'rb') as f:
+                file_content = f.read()
             content_mime = self.mime.from_buffer(file_content)
-            encoded_content = base64.b64encode(file_content).decode(settings.encoding)
 
             payload = self.context.redis.generate_message(
-                id=None,
-                encoded_content=encoded_content,
+                id=message_id,
+                content=file_content,
                 filename=filename,
                 content_field=None,
                 content_type=None,
-                content_mime=content_mime
+                content_mime=content_mime,
+                extra=target or None
             )
 
-            self.context.logger.debug(f"{output_messages.WATCHER_QUEUE_TARGET}", queue=settings.redis_queue_files)
-            await self.context.redis.send_message(payload, settings.redis_queue_files)
+        self.context.logger.debug(f"{output_messages.WATCHER_QUEUE_TARGET}", queue=settings.redis_queue_files)
+        await self.context.redis.send_message(payload, settings.redis_queue_files)
+
+        processed_dir = os.path.join(watcher_settings.watch_folder, watcher_settings.processed_folder.lstrip("/"), collection or "")
+        self.context.logger.debug(f"{output_messages.WATCHER_MOVE_FILE_START}", directory=processed_dir)
+        
+        os.makedirs(processed_dir, exist_ok=True)
+        shutil.move(filepath, os.path.join(processed_dir, filename))
+
+    async def dispatch_file(self, session, filename, state):
+        """Sends one file, at most once at a time, and indexes it when done"""
+        if filename in self.in_flight:
+            return
+        self.in_flight.add(filename)
+        try:
+            # a file journey starts here, every message derived from it continues this trace
+            with self.context.tracer.span("sentry.dispatch", **{"message.filename": filename}):
+                await self.send_files(session, os.path.join(watcher_settings.watch_folder, filename), self.get_collection(filename))
+            self.file_index[filename] = state
+            record_processed_file("success", "sentry")
+        except Exception as e:
+            record_processed_file("failed", "sentry")
+            self.context.logger.error(f"{output_messages.WATCHER_EXCEPTION}", error=str(e), filename=filename)
+            traceback.print_exc()
+        finally:
+            self.in_flight.discard(filename)
+
+    async def admit(self, session, files):
+        """Dispatches as many (filename, state) pairs as the files queue has room for, the others are deferred"""
+        capacity = await self.context.redis.get_capacity(settings.redis_queue_files)
+        # None: the files queue has no watermark
+        if capacity is not None:
+            # files being sent are not in the queue yet
+            capacity = max(capacity - len(self.in_flight), 0)
+        admitted = files if capacity is None else files[:capacity]
+        self.deferred.difference_update(filename for filename, _ in admitted)
+        self.deferred.update(filename for filename, _ in files[len(admitted):])
+        update_deferred_files(len(self.deferred))
+        if len(admitted) < len(files):
+            self.context.logger.info(f"{output_messages.WATCHER_FILES_DEFERRED}", deferred=len(self.deferred), queue=settings.redis_queue_files)
+
+        # Wait for all tasks to complete
+        if admitted:
+            await asyncio.gather(*(self.dispatch_file(session, filename, state) for filename, state in admitted))
+
+    async def rescan(self, session):
+        """Dispatches every file that is new or changed since it was indexed, oldest first, forgets the ones that left"""
+        current_files = await asyncio.to_thread(self.get_current_files)
+        for filename in self.file_index.keys() - current_files.keys():
+            del self.file_index[filename]
+        self.deferred &= current_files.keys()
+
+        files = sorted(
+            ((filename, state) for filename, state in current_files.items()
+             if self.file_index.get(filename) != state and filename not in self.pending and filename not in self.in_flight),
+            key=lambda item: item[1][0]
+        )
+        await self.admit(session, files)
 
-            processed_dir = os.path.join(watcher_settings.watch_folder, watcher_settings.processed_folder.lstrip("/"))
-            self.context.logger.debug(f"{output_messages.WATCHER_MOVE_FILE_START}", directory=processed_dir)
-            
-            os.makedirs(processed_dir, exist_ok=True)
-            shutil.move(filepath, os.path.join(processed_dir, filename))
+    def get_deferred_files(self):
+        """(filename, state) of the deferred files still waiting in the folder, oldest first, the others are forgotten"""
+        files = []
+        for filename in list(self.deferred):
+            state = self.get_file_state(filename)
+            if state is None or self.file_index.get(filename) == state:
+                self.deferred.discard(filename)
+            elif filename not in self.pending and filename not in self.in_flight:
+                files.append((filename, state))
+        return sorted(files, key=lambda item: item[1][0])
+
+    async def retry_deferred(self, session):
+        """Admits deferred files once the files queue has room again, only they are looked at, not the whole folder"""
+        capacity = await self.context.redis.get_capacity(settings.redis_queue_files)
+        if capacity is not None and capacity <= len(self.in_flight):
+            return
+        files = await asyncio.to_thread(self.get_deferred_files)
+        update_deferred_files(len(self.deferred))
+        await self.admit(session, files)
 
     async def look_for_files(self):
         await asyncio.sleep(10)
+        monitor = self.context.redis.supervise(self.context.redis.run_queue_monitor([settings.redis_queue_files]))
+        self.create_collection_folders()
         async with aiohttp.ClientSession() as session:
-            while True:
-                try:
-                    current_files = self.get_current_files()
-                    new_files = current_files - self.seen_files
-                    modified_files = current_files & self.seen_files
+            if watcher_settings.watch_mode == "inotify":
+                await self.watch_for_files(session)
+            else:
+                await self.poll_for_files(session)
+
+    async def poll_for_files(self, session):
+        while True:
+            try:
+                await self.rescan(session)
+            except Exception as e:
+                self.context.logger.error(f"{output_messages.WATCHER_EXCEPTION}", error=str(e))
+                traceback.print_exc()
 
-                    tasks = []
-                    for filename in new_files | modified_files:
-                        full_path = os.path.join(watcher_settings.watch_folder, filename)
-                        tasks.append(self.send_files(session, full_path))
+            await asyncio.sleep(watcher_settings.check_interval)
 
-                    # Wait for all tasks to complete
-                    if tasks:
-                        await asyncio.gather(*tasks)
+    async def watch_for_files(self, session):
+        """Reacts to close-write and moved-to events, the folder is only listed on cold start and on queue overflow"""
+        loop = asyncio.get_running_loop()
+        self.inotify = INotify()
+        for folder in ["", *self.get_collection_folders()]:
+            wd = self.inotify.add_watch(os.path.join(watcher_settings.watch_folder, folder), inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+            self.watches[wd] = folder
+        rescan_needed = asyncio.Event()
+        loop.add_reader(self.inotify.fileno(), self.read_events, loop, session, rescan_needed)
+        self.context.logger.info(f"{output_messages.WATCHER_INOTIFY_START}", folder=watcher_settings.watch_folder)
 
-                    self.seen_files.update(current_files)
+        # cold start: anything dropped while the sentry was down
+        rescan_needed.set()
+        next_rescan = None
+        try:
+            while True:
+                # the safety rescan keeps its own clock, deferred files are retried in between as the files queue drains
+                timeout = max(next_rescan - loop.time(), 0) if next_rescan is not None else None
+                if self.deferred:
+                    timeout = min(timeout, settings.redis_backpressure_interval) if timeout is not None else settings.redis_backpressure_interval
+                try:
+                    await asyncio.wait_for(rescan_needed.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    if rescan_needed.is_set() or (next_rescan is not None and loop.time() >= next_rescan):
+                        rescan_needed.clear()
+                        next_rescan = loop.time() + watcher_settings.watch_rescan_interval if watcher_settings.watch_rescan_interval else None
+                        await self.rescan(session)
+                    elif self.deferred:
+                        await self.retry_deferred(session)
                 except Exception as e:
                     self.context.logger.error(f"{output_messages.WATCHER_EXCEPTION}", error=str(e))
                     traceback.print_exc()
+        finally:
+            loop.remove_reader(self.inotify.fileno())
+            self.inotify.close()
+            for handle in self.pending.values():
+                handle.cancel()
+            self.pending.clear()
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def read_events(self, loop, session, rescan_needed):
+        for event in self.inotify.read(timeout=0):
+            if event.mask & inotify_flags.Q_OVERFLOW:
+                # the kernel dropped events, only a listing can tell what arrived
+                self.context.logger.warning(f"{output_messages.WATCHER_INOTIFY_OVERFLOW}")
+                rescan_needed.set()
+                continue
+            if event.name and self.is_supported(event.name):
+                filename = os.path.join(self.watches.get(event.wd, ""), event.name)
+                self.debounce(loop, session, filename, self.get_file_state(filename))
+
+    def debounce(self, loop, session, filename, state):
+        """Waits for the file to stay unchanged for a debounce period before sending it"""
+        handle = self.pending.pop(filename, None)
+        if handle:
+            handle.cancel()
+        if state is None:
+            return
+        self.pending[filename] = loop.call_later(watcher_settings.watch_debounce, self.settle, loop, session, filename, state)
+
+    def settle(self, loop, session, filename, state):
+        self.pending.pop(filename, None)
+        current_state = self.get_file_state(filename)
+        if current_state != state:
+            # still being written, or replaced in the meantime
+            self.debounce(loop, session, filename, current_state)
+            return
+        if self.deferred:
+            # older files are waiting for room, the next rescan sends them in order
+            self.deferred.add(filename)
+            update_deferred_files(len(self.deferred))
+        elif self.file_index.get(filename) != state:
+            task = loop.create_task(self.admit(session, [(filename, state)]))
+            self.tasks.add(task)
+            task.add_done_callback(lambda task: self.settled(task, filename))
 
-                await asyncio.sleep(watcher_settings.check_interval)
+    def settled(self, task, filename):
+        """Done callback of an admission, a failed one leaves the file deferred for the next retry"""
+        self.tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        self.context.logger.error(f"{output_messages.WATCHER_SETTLE_KO}", error=str(task.exception()), filename=filename)
+        self.deferred.add(filename)
+        update_deferred_files(len(self.deferred))
 
 if __name__ == "__main__":
     async def main():
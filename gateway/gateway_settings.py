@@ -4,6 +4,8 @@ from pathlib import Path
 
 class ExtractorSettings(BaseSettings):
     check_interval: int = Field(..., env="CHECK_INTERVAL")
+    pdf_workers: int = Field(..., env="PDF_WORKERS")
+    pdf_page_batch: int = Field(..., env="PDF_PAGE_BATCH")
 
     model_config = SettingsConfigDict(
         env_file = Path(__file__).resolve().parent / ".env",
@@ -0,0 +1,26 @@
+# PDF page-range parsing, kept apart from zealot so the process pool workers only import pdfplumber
+import logging
+import warnings
+import pdfplumber
+
+def count_pages(file_path):
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+def extract_page_range(file_path, source, first_page, last_page):
+    """Document dicts for pages [first_page, last_page) of a PDF, in the PDFPlumberLoader layout"""
+    logging.getLogger("pdfminer").setLevel(logging.ERROR)
+    documents = []
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        with pdfplumber.open(file_path) as pdf:
+            total_pages = len(pdf.pages)
+            for page_number in range(first_page, min(last_page, total_pages)):
+                page = pdf.pages[page_number]
+                documents.append({
+                    "page_content": page.extract_text() or "",
+                    "metadata": {"source": source, "page": page_number, "total_pages": total_pages},
+                })
+                # parsed layout objects are only needed for this page
+                page.flush_cache()
+    return documents
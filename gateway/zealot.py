@@ -1,29 +1,35 @@
 #import aiohttp
 import asyncio
-import base64
 import json
 #import magic
 import traceback
 import tempfile
 import os
-from pylon import settings, record_error, ProcessingError, json_to_text, output_messages
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pylon import settings, record_error, record_processed_file, track_processing_time, start_metrics_server, ProcessingError, json_to_text, available_cpus, output_messages
 from pylon.context import ApplicationContext
 from gateway_settings import extractor_settings
+from psi_blade import count_pages, extract_page_range
 from typing import Dict, Any
 import traceback
-from langchain_community.document_loaders import PDFPlumberLoader
+from langchain_core.documents import Document
 from pathlib import Path
-import warnings
 import logging
 
 class ExtractorService:
     def __init__(self):
         self.context = None
+        self.pool = None
         logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
-    async def initialize(self):
-        self.context = await ApplicationContext.create()
-        self.context.logger.info(f"{output_messages.EXTRACTOR_INITIALIZATION}")
+    async def initialize(self, context=None):
+        self.context = context or await ApplicationContext.create("zealot")
+        # forkserver: workers do not inherit the event loop, redis connections or threads of this process
+        workers = extractor_settings.pdf_workers or available_cpus()
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+        start_metrics_server()
+        self.context.logger.info(f"{output_messages.EXTRACTOR_INITIALIZATION}", pdf_workers=workers)
 
     async def run(self):
         try:
@@ -32,37 +38,67 @@ class ExtractorService:
             self.context.logger.info(f"{output_messages.EXTRACTOR_TERMINATED}")
         except Exception as e:
             self.context.logger.info(f"{output_messages.EXTRACTOR_KO}", error=str(e), traceback=traceback.format_exc())
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+
+    def write_temporary_pdf(self, file_bytes: bytes) -> str:
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temporary_file:
+            temporary_file.write(file_bytes)
+            return temporary_file.name
+
+    @track_processing_time("zealot")
+    async def stream_pdf(self, message_id: str, filename: str, file_bytes: bytes, file_path: str, content_mime: str, extra: dict = None) -> int:
+        """Parses page ranges in the process pool and sends each range as soon as it is done, returns the parts sent"""
+        loop = asyncio.get_running_loop()
+        temporary_file_path = None
+        try:
+            # blob store files are already on disk, queued bytes go to a temp file the workers can open
+            if not file_path:
+                temporary_file_path = await asyncio.to_thread(self.write_temporary_pdf, file_bytes)
+                file_path = temporary_file_path
+
+            total_pages = await loop.run_in_executor(self.pool, count_pages, file_path)
+            page_batch = extractor_settings.pdf_page_batch
+            ranges = [(first, min(first + page_batch, total_pages)) for first in range(0, total_pages, page_batch)]
+            if not ranges:
+                raise ProcessingError(f"{output_messages.EXTRACTOR_PDF_KO}: {output_messages.EXTRACTOR_READ_KO_MSG}")
+
+            async def parse_range(part, first, last):
+                return part, await loop.run_in_executor(self.pool, extract_page_range, file_path, filename, first, last)
+
+            # ranges are sent in completion order, parts and page metadata keep the document order
+            for parsed_range in asyncio.as_completed([parse_range(part, first, last) for part, (first, last) in enumerate(ranges)]):
+                part, documents = await parsed_range
+                payload = self.context.redis.generate_message(
+                    id=message_id,
+                    content=self.context.redis.serialize_documents(documents),
+                    filename=filename,
+                    content_field=None,
+                    content_type=None,
+                    content_mime=content_mime,
+                    extra={**(extra or {}), "part": part, "parts": len(ranges)}
+                )
+                await self.context.redis.send_message(payload, settings.redis_queue_documents)
+                self.context.logger.debug(f"{output_messages.EXTRACTOR_PDF_PART_SENT}", filename=filename, part=part, parts=len(ranges))
+            return len(ranges)
+        except ProcessingError:
+            raise
+        except Exception as e:
+            self.context.logger.error(f"{output_messages.EXTRACTOR_PDF_KO}", error=str(e), filename=filename)
+            raise ProcessingError(f"{output_messages.EXTRACTOR_PDF_KO}: {e}")
+        finally:
+            if temporary_file_path and os.path.exists(temporary_file_path):
+                try:
+                    os.unlink(temporary_file_path)
+                except Exception as e:
+                    self.context.logger.error(f"{output_messages.EXTRACTOR_CLEANUP_KO}", error=str(e))
 
     def extract_documents(self, file_bytes: bytes, filename: str) -> str:
         ext = Path(filename).suffix.lower()
-        temporary_file_path = None
 
-        if ext == ".pdf":
-            try:
-                # Write to temp file for PDFPlumberLoader
-                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temporary_file:
-                    temporary_file.write(file_bytes)
-                    temporary_file_path = temporary_file.name
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore")
-                    loader = PDFPlumberLoader(temporary_file_path)
-                    documents = loader.load()
-                if temporary_file_path:
-                    os.unlink(temporary_file_path)
-                return documents
-            except Exception as e:
-                self.context.logger.error(f"{output_messages.EXTRACTOR_PDF_KO}", error=str(e), filename=filename)
-                raise ProcessingError(f"{output_messages.EXTRACTOR_PDF_KO}: {e}")
-            finally:
-                if temporary_file_path and os.path.exists(temporary_file_path):
-                    try:
-                        os.unlink(temporary_file_path)
-                    except Exception as e:
-                        self.context.logger.error(f"{output_messages.EXTRACTOR_CLEANUP_KO}", error=str(e))
-
-        elif ext in [".txt", ".md"]:
+        if ext in [".txt", ".md"]:
             try:
-                return file_bytes.decode(settings.encoding)
+                return [Document(page_content=file_bytes.decode(settings.encoding), metadata={"source": filename})]
             except UnicodeDecodeError as e:
                 self.context.logger.error(f"{output_messages.EXTRACTOR_TEXT_KO}", error=str(e), filename=filename)
                 raise ProcessingError(f"{output_messages.EXTRACTOR_TEXT_KO}: {e}")
@@ -70,7 +106,7 @@ class ExtractorService:
         elif ext == ".json":
             try:
                 obj = json.loads(file_bytes.decode(settings.encoding))
-                return json_to_text(obj)
+                return [Document(page_content=json_to_text(obj), metadata={"source": filename})]
             except json.JSONDecodeError as e:
                 self.context.logger.error(f"{output_messages.EXTRACTOR_JSON_KO}", error=str(e), filename=filename)
                 raise ProcessingError(f"{output_messages.EXTRACTOR_JSON_KO_MSG}: {e}")
@@ -80,6 +116,7 @@ class ExtractorService:
 
         raise ProcessingError(f"{output_messages.EXTRACTOR_UNSUPPORTED_TYPE}: {ext}")
 
+    @track_processing_time("zealot")
     def read_documents_from_message(self, message_id: str, filename: str, file_bytes: bytes, content_mime: str) -> Dict[str, Any]:
         """Process a single file"""
         try:
@@ -106,7 +143,10 @@ class ExtractorService:
     async def look_for_file_messages(self):
         """Asynchronous documents ingestion."""
         self.context.logger.debug(f"{output_messages.EXTRACTOR_WAIT_START}")
+        # reaper, lease heartbeat and queue monitor, if one of them fails the stage stops with it
+        background = self.context.redis.supervise(self.context.redis.run_background(settings.redis_queue_files, [settings.redis_queue_files, settings.redis_queue_documents]))
         while True:
+                file_message = None
                 try:
                     file_message = await self.context.redis.get_message(settings.redis_queue_files)
                     if not file_message:
@@ -115,49 +155,76 @@ class ExtractorService:
                     # decodes the message
                     decoded_message = self.context.redis.decode_message(file_message)
                     if not decoded_message:
+                        await self.context.redis.nack_message(file_message)
                         continue
                     
                     # validates message
                     required_fields = ["filename", "id", settings.redis_content_field, settings.redis_content_type]
                     valid = self.context.redis.is_valid_message(decoded_message, required_fields)
                     if not valid:
+                        await self.context.redis.nack_message(file_message)
                         continue
                     
-                    # reads decoded message - all fields have been checked
-                    filename = decoded_message.get("filename")
-                    message_id = decoded_message.get("id")
-                    content_mime = decoded_message.get(settings.redis_content_type)
-                    base64_content = decoded_message.get(settings.redis_content_field)
-                    file_bytes = base64.b64decode(base64_content)
-                    
-                    # extracts documents from message
-                    documents = self.read_documents_from_message(message_id, filename, file_bytes, content_mime)
-                    if not documents:
-                        continue
-
-                    serialized = json.dumps([
-                        d.dict() if hasattr(d, "dict") else str(d)
-                        for d in documents
-                    ])
-                    encoded_content = base64.b64encode(serialized.encode(settings.encoding)).decode(settings.encoding)
-
-                    # sets the payload with informatio for metadata
-                    payload = self.context.redis.generate_message(
-                        id=message_id,
-                        encoded_content=encoded_content,
-                        filename=filename,
-                        content_field=None,
-                        content_type=None,
-                        content_mime=content_mime
-                    )
-
-                    # sends documents to their redis queue
-                    await self.context.redis.send_message(payload, settings.redis_queue_documents)
-                    #await self.context.redis.send_it(queue=settings.redis_queue_documents, content=payload, message_id=message_id)
+                    with self.context.tracer.stage("zealot", decoded_message, file_message):
+                        # reads decoded message - all fields have been checked
+                        filename = decoded_message.get("filename")
+                        message_id = decoded_message.get("id")
+                        content_mime = decoded_message.get(settings.redis_content_type)
+                        # a chunking strategy or target collection asked for by the producer travels with the documents
+                        forwarded = {field: decoded_message[field] for field in (settings.chunking_field, settings.collection_field) if decoded_message.get(field)} or None
+                        is_pdf = Path(filename).suffix.lower() == ".pdf"
+                        blob_reference = decoded_message.get(settings.blob_field)
+                        file_bytes = None
+                        file_path = None
+                        if blob_reference:
+                            # claim-check message, the file itself waits in the blob store
+                            if not self.context.blob.exists(blob_reference):
+                                self.context.logger.error(f"{output_messages.EXTRACTOR_BLOB_KO}", filename=filename, reference=blob_reference)
+                                await self.context.redis.nack_message(file_message)
+                                continue
+                            if is_pdf:
+                                file_path = self.context.blob.get_path(blob_reference)
+                            else:
+                                file_bytes = await asyncio.to_thread(self.context.blob.read_bytes, blob_reference)
+                        else:
+                            file_bytes = self.context.redis.get_content(decoded_message)
+
+                        if is_pdf:
+                            # pages go downstream in batches while the rest of the file is still being parsed
+                            await self.stream_pdf(message_id, filename, file_bytes, file_path, content_mime, forwarded)
+                        else:
+                            # extracts documents from message
+                            documents = self.read_documents_from_message(message_id, filename, file_bytes, content_mime)
+                            if not documents:
+                                await self.context.redis.nack_message(file_message)
+                                continue
+
+                            serialized = self.context.redis.serialize_documents(documents)
+
+                            # sets the payload with informatio for metadata
+                            payload = self.context.redis.generate_message(
+                                id=message_id,
+                                content=serialized,
+                                filename=filename,
+                                content_field=None,
+                                content_type=None,
+                                content_mime=content_mime,
+                                extra=forwarded
+                            )
+
+                            # sends documents to their redis queue
+                            await self.context.redis.send_message(payload, settings.redis_queue_documents)
+                            #await self.context.redis.send_it(queue=settings.redis_queue_documents, content=payload, message_id=message_id)
+                        await self.context.redis.ack_message(file_message)
+                        record_processed_file("success", "zealot")
+                        if blob_reference:
+                            self.context.blob.delete(blob_reference)
 
                 except Exception as e:
+                    record_processed_file("failed", "zealot")
                     self.context.logger.error(f"{output_messages.EXTRACTOR_EXCEPTION}", error=str(e))
                     traceback.print_exc()
+                    await self.context.redis.nack_message(file_message)
 
                 await asyncio.sleep(extractor_settings.check_interval)
 
@@ -5,6 +5,16 @@ from pathlib import Path
 class EmbedderSettings(BaseSettings):
     check_interval: int = Field(..., env="CHECK_INTERVAL")
     processed_folder: str = Field(..., env="PROCESSED_FOLDER")
+    batch_mode: bool = Field(..., env="BATCH_MODE")
+    batch_size: int = Field(..., env="BATCH_SIZE")
+    batch_timeout: float = Field(..., env="BATCH_TIMEOUT")
+    pipeline_depth: int = Field(..., env="PIPELINE_DEPTH")
+    reindex_batch_size: int = Field(..., env="REINDEX_BATCH_SIZE")
+    reindex_checkpoint_prefix: str = Field(..., env="REINDEX_CHECKPOINT_PREFIX")
+    reindex_drop_old: bool = Field(..., env="REINDEX_DROP_OLD")
+    reindex_drop_legacy: bool = Field(..., env="REINDEX_DROP_LEGACY")
+    reindex_catch_up_passes: int = Field(..., env="REINDEX_CATCH_UP_PASSES")
+    reindex_catch_up_threshold: int = Field(..., env="REINDEX_CATCH_UP_THRESHOLD")
 
     model_config = SettingsConfigDict(
         env_file = Path(__file__).resolve().parent / ".env",
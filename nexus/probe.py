@@ -1,24 +1,42 @@
 import asyncio
-import base64
-import json
 import traceback
 import os
-from pylon import settings, output_messages
+from dataclasses import dataclass, field
+from typing import List
+from pylon import settings, record_chunks, record_vectors, record_processed_file, track_processing_time, start_metrics_server, output_messages
 from pylon.context import ApplicationContext
 from nexus_settings import embedder_settings
 from langchain_core.documents import Document
 
+@dataclass
+class PagesBatch:
+    """Pages collected from one or more pages messages, embedded and stored together"""
+    texts: List[str] = field(default_factory=list)
+    metadata: List[dict] = field(default_factory=list)
+    collections: List[str] = field(default_factory=list)
+    filenames: List[str] = field(default_factory=list)
+    progress: List[tuple] = field(default_factory=list)
+    sources: List[tuple] = field(default_factory=list)
+    messages: list = field(default_factory=list)
+    spans: list = field(default_factory=list)
+    vectors: List[List[float]] = None
+
 class EmbedderService:
     def __init__(self):
         self.context = None
+        self.created = set()
 
-    async def initialize(self):
-        self.context = await ApplicationContext.create()
+    async def initialize(self, context=None):
+        self.context = context or await ApplicationContext.create("probe")
+        start_metrics_server()
         self.context.logger.info(f"{output_messages.EMBEDDER_INITIALIZATION}")
 
     async def run(self):
         try:
-            await self.look_for_pages_messages()
+            if embedder_settings.batch_mode:
+                await self.look_for_pages_batches()
+            else:
+                await self.look_for_pages_messages()
         except KeyboardInterrupt:
             self.context.logger.info(f"{output_messages.EMBEDDER_TERMINATED}")
         except Exception as e:
@@ -27,80 +45,274 @@ class EmbedderService:
                         traceback=traceback.format_exc())
             raise
 
+    def read_pages(self, pages_message):
+        """Decodes a pages message into its filename, page texts, metadata, (id, part, parts) progress, target collection and stage span"""
+        decoded_pages = self.context.redis.decode_message(pages_message)
+        if not decoded_pages:
+            self.context.logger.debug(f"{output_messages.EMBEDDER_NO_MESSAGES_DECODED}")
+            return None
+
+        # reads decoded message
+        filename = decoded_pages.get("filename")
+        message_id = decoded_pages.get("id")
+        content_mime = decoded_pages.get(settings.redis_content_type)
+        self.context.logger.debug(f"{message_id} - {filename} - {content_mime}")
+
+        span = self.context.tracer.receive("probe", decoded_pages, pages_message)
+        try:
+            # decode documents
+            content = self.context.redis.get_content(decoded_pages)
+            if not content:
+                self.context.tracer.end_span(span, error=output_messages.EMBEDDER_NO_MESSAGES_DECODED)
+                return None
+            # Deserialize into Document objects
+            pages = [Document(**page) for page in self.context.redis.deserialize_documents(content)]
+            # Extract page content
+            kept = [i for i, page in enumerate(pages) if page.page_content.strip()]
+            texts = [pages[i].page_content for i in kept]
+            # what the extractor and the chunker found (headings, page numbers) stays, the point identity goes on top
+            metadata = [{**pages[page].metadata, "source": filename, "chunk_index": i} for i, page in enumerate(kept)]
+
+            # page batches of a large PDF arrive as separate parts of the same file
+            parts = self.context.redis.get_parts(decoded_pages) or {"part": None, "parts": None}
+            if parts["parts"] is not None:
+                for chunk_metadata in metadata:
+                    chunk_metadata["part"] = parts["part"]
+        except Exception as e:
+            # the caller never gets the span, it ends here
+            self.context.tracer.end_span(span, error=e)
+            raise
+
+        collection = decoded_pages.get(settings.collection_field)
+        return filename, texts, metadata, (message_id, parts["part"], parts["parts"]), collection, span
+
+    def get_qdrant(self, collection=None):
+        """Gateway of the collection a file is stored in, a team collection is created (with its alias) on its first write"""
+        if not collection:
+            return self.context.qdrant
+        qdrant, _ = self.context.collections.get(collection)
+        if collection not in self.created:
+            qdrant.recreate_collection(self.context.ollama.get_embedding_model())
+            qdrant.create_payload_index()
+            self.created.add(collection)
+        return qdrant
+
+    def plan_upserts(self, texts, metadata, collection=None):
+        """Point ids of every chunk, and only the chunks whose point is not stored yet (texts, metadata)"""
+        qdrant = self.get_qdrant(collection)
+        ids = qdrant.point_ids(texts, metadata)
+        existing = qdrant.existing_ids(ids)
+        new = [i for i, point_id in enumerate(ids) if point_id not in existing]
+        record_chunks("probe", "unchanged", len(ids) - len(new))
+        record_chunks("probe", "new", len(new))
+        self.context.logger.debug(f"{output_messages.EMBEDDER_CHUNKS_UNCHANGED}", unchanged=len(ids) - len(new), new=len(new))
+        return ids, [texts[i] for i in new], [metadata[i] for i in new]
+
+    def delete_stale(self, filename, ids, progress, collection=None):
+        """Removes the points a previous ingestion of the same file (or file part) left behind"""
+        _, part, parts = progress
+        self.get_qdrant(collection).delete_stale(filename, ids, part, parts)
+
+    def store(self, vectors, texts, metadata, collections):
+        """Writes each chunk into the collection its file targets"""
+        grouped = {}
+        for i, collection in enumerate(collections):
+            grouped.setdefault(collection, []).append(i)
+        for collection, indexes in grouped.items():
+            self.get_qdrant(collection).add_to_qdrant(
+                [vectors[i] for i in indexes],
+                [texts[i] for i in indexes],
+                [metadata[i] for i in indexes]
+            )
+
+    @track_processing_time("probe")
+    def embed(self, texts):
+        """Vectors of the chunk texts, the embedding cache answers for the ones the chunker already embedded"""
+        return self.context.ollama.get_vectors(documents=texts)
+
+    async def write_status_when_complete(self, filename, progress):
+        """Writes the status file once the last part of the file is stored"""
+        message_id, part, parts = progress
+        if await self.context.redis.complete_part(settings.redis_queue_pages, message_id, part, parts):
+            await asyncio.to_thread(self.write_status, filename)
+            record_processed_file("success", "probe")
+
+    def write_status(self, filename):
+        """Marks a file as processed for the API /file_status polling"""
+        try:
+            status_folder = embedder_settings.processed_folder
+            os.makedirs(status_folder, exist_ok=True)
+            status_file = os.path.join(status_folder, f"{filename}.status")
+            with open(status_file, "w") as f:
+                f.write("processed")
+            self.context.logger.info(f"Status file written: {status_file}")
+        except Exception as e:
+            self.context.logger.error("Failed to write status file", error=str(e))
+
     async def look_for_pages_messages(self):
         """Asynchronous embeddings generation."""
         self.context.logger.debug(f"{output_messages.EMBEDDER_WAIT_START}")
+        # reaper, lease heartbeat and queue monitor, if one of them fails the stage stops with it
+        background = self.context.redis.supervise(self.context.redis.run_background(settings.redis_queue_pages, [settings.redis_queue_pages]))
         while True:
+                pages_message = None
                 try:
                     pages_message = await self.context.redis.get_message(settings.redis_queue_pages)
                     if not pages_message:
                         continue
-                    
-                    # decode message
-                    decoded_pages = self.context.redis.decode_message(pages_message)
-                    if not decoded_pages:
-                        self.context.logger.debug(f"{output_messages.EMBEDDER_NO_MESSAGES_DECODED}", decoded_pages=len(decoded_pages))
-                        continue
-                    
-                    # reads decoded message
-                    filename = decoded_pages.get("filename")
-                    message_id = decoded_pages.get("id")
-                    content_mime = decoded_pages.get(settings.redis_content_type)
-                    self.context.logger.debug(f"{message_id} - {filename} - {content_mime}")
-
-                    # decode documents
-                    base64_content = decoded_pages.get(settings.redis_content_field)
-                    if not base64_content:
+
+                    pages = self.read_pages(pages_message)
+                    if not pages:
+                        await self.context.redis.nack_message(pages_message)
                         continue
-                    # Decode from base64
-                    raw_bytes = base64.b64decode(base64_content)
-                    # Deserialize into Document objects
-                    pages = [Document(**page) for page in json.loads(raw_bytes.decode(settings.encoding))]
-                    # Extract page content
-                    document_page = [page.page_content for page in pages if page.page_content.strip()] 
-
-                    self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_START}")
-                    # generate the vectors for the extracted page content - reasoning heavy load
-                    vectors = self.context.ollama.get_vectors(documents=document_page)
-                    self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_ENDED}")
-
-                    # add metadata to the vectors
-                    documents_with_metadata = []
-                    for i, content in enumerate(document_page):
-                        documents_with_metadata.append({
-                            "vector": vectors[i],
-                            "text": content,
-                            "metadata": {
-                                "source": filename,
-                                "chunk_index": i
-                            }
-                        })
-
-                    # extract vectors, texts, and metadata
-                    vectors = [doc["vector"] for doc in documents_with_metadata]
-                    texts = [doc["text"] for doc in documents_with_metadata]
-                    metadata = [doc["metadata"] for doc in documents_with_metadata]
-
-                    # add data to qdrant
-                    #self.context.qdrant.add_to_qdrant(documents_with_metadata)
-                    self.context.qdrant.add_to_qdrant(vectors, texts, metadata)
-
-                    # After successful insertion into Qdrant, set the file status
-                    try:
-                        status_folder = embedder_settings.processed_folder
-                        os.makedirs(status_folder, exist_ok=True)
-                        status_file = os.path.join(status_folder, f"{filename}.status")
-                        with open(status_file, "w") as f:
-                            f.write("processed")
-                        self.context.logger.info(f"Status file written: {status_file}")
-                    except Exception as e:
-                        self.context.logger.error("Failed to write status file", error=str(e))
+                    filename, texts, metadata, progress, collection, span = pages
+                    with self.context.tracer.activate(span):
+                        # chunks already stored with the same content are neither embedded nor written again
+                        ids, texts, metadata = self.plan_upserts(texts, metadata, collection)
+
+                        if texts:
+                            self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_START}")
+                            # generate the vectors for the extracted page content - reasoning heavy load
+                            vectors = self.embed(texts)
+                            self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_ENDED}")
+
+                            # add data to qdrant
+                            self.get_qdrant(collection).add_to_qdrant(vectors, texts, metadata)
+                            record_vectors("probe", "stored", len(vectors))
+                        self.delete_stale(filename, ids, progress, collection)
+
+                        # After successful insertion into Qdrant, set the file status
+                        await self.write_status_when_complete(filename, progress)
+                        await self.context.redis.ack_message(pages_message)
                 except Exception as e:
                     self.context.logger.error(f"{output_messages.EMBEDDER_EXCEPTION}", error=str(e))
                     traceback.print_exc()
+                    await self.context.redis.nack_message(pages_message)
 
                 await asyncio.sleep(embedder_settings.check_interval)
 
+    async def look_for_pages_batches(self):
+        """Batched embeddings generation with overlapping embed, upsert and status stages."""
+        self.context.logger.debug(f"{output_messages.EMBEDDER_WAIT_START}")
+        embed_queue = asyncio.Queue(maxsize=embedder_settings.pipeline_depth)
+        upsert_queue = asyncio.Queue(maxsize=embedder_settings.pipeline_depth)
+        status_queue = asyncio.Queue(maxsize=embedder_settings.pipeline_depth)
+
+        await asyncio.gather(
+            self.context.redis.run_background(settings.redis_queue_pages, [settings.redis_queue_pages]),
+            self.collect_batches(embed_queue),
+            self.embed_batches(embed_queue, upsert_queue),
+            self.upsert_batches(upsert_queue, status_queue),
+            self.write_batch_statuses(status_queue),
+        )
+
+    async def collect_batches(self, embed_queue):
+        """Gathers pages messages until the batch size or the batch time budget is reached."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = PagesBatch()
+            deadline = None
+            try:
+                while len(batch.texts) < embedder_settings.batch_size:
+                    # wait as long as needed for the first message, then only for what is left of the budget
+                    timeout = None
+                    if deadline is not None:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        # never hand a zero timeout to BLPOP, it would block forever
+                        timeout = max(timeout, 0.01)
+                    pages_message = await self.context.redis.get_message(settings.redis_queue_pages, timeout=timeout)
+                    if not pages_message:
+                        continue
+
+                    span = None
+                    try:
+                        pages = self.read_pages(pages_message)
+                        if not pages:
+                            await self.context.redis.nack_message(pages_message)
+                            continue
+                        filename, texts, metadata, progress, collection, span = pages
+                        ids, texts, metadata = await asyncio.to_thread(self.plan_upserts, texts, metadata, collection)
+                    except Exception as e:
+                        # only this message goes back, the batch keeps the ones already collected
+                        self.context.logger.error(f"{output_messages.EMBEDDER_EXCEPTION}", error=str(e))
+                        traceback.print_exc()
+                        await self.context.redis.nack_message(pages_message)
+                        if span:
+                            self.context.tracer.end_span(span, error=e)
+                        continue
+
+                    batch.messages.append(pages_message)
+                    batch.spans.append(span)
+                    batch.sources.append((filename, ids, progress, collection))
+                    batch.texts.extend(texts)
+                    batch.metadata.extend(metadata)
+                    batch.collections.extend([collection] * len(texts))
+                    batch.filenames.append(filename)
+                    batch.progress.append(progress)
+                    if deadline is None:
+                        deadline = loop.time() + embedder_settings.batch_timeout
+            except Exception as e:
+                self.context.logger.error(f"{output_messages.EMBEDDER_EXCEPTION}", error=str(e))
+                traceback.print_exc()
+
+            if batch.messages:
+                self.context.logger.debug(f"{output_messages.EMBEDDER_BATCH_COLLECTED}",
+                        files=len(batch.filenames),
+                        chunks=len(batch.texts))
+                await embed_queue.put(batch)
+
+    async def embed_batches(self, embed_queue, upsert_queue):
+        """Embeds collected batches off the event loop so collection keeps going."""
+        while True:
+            batch = await embed_queue.get()
+            try:
+                self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_START}")
+                if batch.texts:
+                    batch.vectors = await asyncio.to_thread(self.embed, batch.texts)
+                self.context.logger.debug(f"{output_messages.EMBEDDER_REQUEST_VECTORS_ENDED}")
+                await upsert_queue.put(batch)
+            except Exception as e:
+                self.context.logger.error(f"{output_messages.EMBEDDER_EXCEPTION}", error=str(e))
+                traceback.print_exc()
+                await self.release_batch(batch, error=e)
+
+    async def upsert_batches(self, upsert_queue, status_queue):
+        """Stores embedded batches in qdrant while the next batch is being embedded."""
+        while True:
+            batch = await upsert_queue.get()
+            try:
+                if batch.texts:
+                    await asyncio.to_thread(self.store, batch.vectors, batch.texts, batch.metadata, batch.collections)
+                    record_vectors("probe", "stored", len(batch.vectors))
+                for filename, ids, progress, collection in batch.sources:
+                    await asyncio.to_thread(self.delete_stale, filename, ids, progress, collection)
+                await status_queue.put(batch)
+            except Exception as e:
+                self.context.logger.error(f"{output_messages.EMBEDDER_EXCEPTION}", error=str(e))
+                traceback.print_exc()
+                await self.release_batch(batch, error=e)
+
+    async def write_batch_statuses(self, status_queue):
+        """Writes the status files of every file in a stored batch."""
+        while True:
+            batch = await status_queue.get()
+            for filename, progress in zip(batch.filenames, batch.progress):
+                await self.write_status_when_complete(filename, progress)
+            for pages_message in batch.messages:
+                await self.context.redis.ack_message(pages_message)
+            # a message stage span covers its wait for the batch to fill up and the shared embed and upsert
+            for span in batch.spans:
+                self.context.tracer.end_span(span)
+
+    async def release_batch(self, batch, error=None):
+        """Hands every message of a failed batch back to the queue."""
+        for pages_message in batch.messages:
+            await self.context.redis.nack_message(pages_message)
+        for span in batch.spans:
+            self.context.tracer.end_span(span, error=error or "released")
+
 if __name__ == "__main__":
     async def main():
         service = EmbedderService()
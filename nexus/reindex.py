@@ -0,0 +1,137 @@
+import asyncio
+import traceback
+from pylon import settings, output_messages
+from pylon.context import ApplicationContext
+from nexus_settings import embedder_settings
+from qdrant_client.models import PointStruct
+
+class ReindexService:
+    """Re-embeds the aliased collection into a collection for the current embedder, then swaps the alias.
+
+    Queries keep using the old collection until the swap. Progress is checkpointed in redis after every
+    batch, running the job again resumes where it stopped.
+    """
+
+    def __init__(self):
+        self.context = None
+
+    async def initialize(self):
+        self.context = await ApplicationContext.create("reindex")
+        self.context.ollama.initialize_client()
+
+    async def run(self):
+        try:
+            await self.reindex()
+        except KeyboardInterrupt:
+            self.context.logger.info(f"{output_messages.EMBEDDER_TERMINATED}")
+        except Exception as e:
+            self.context.logger.error(f"{output_messages.EMBEDDER_KO}",
+                        error=str(e),
+                        traceback=traceback.format_exc())
+            raise
+
+    def checkpoint_key(self, target):
+        return f"{embedder_settings.reindex_checkpoint_prefix}:{target}"
+
+    async def reindex(self):
+        qdrant = self.context.async_qdrant
+        # an unaliased collection from before versioning is its own source
+        source = await qdrant.get_alias_target() or settings.collection_name
+        target = qdrant.versioned_collection_name(self.context.ollama.get_embedding_model())
+        if source == target:
+            self.context.logger.info(f"{output_messages.REINDEX_UP_TO_DATE}", collection=source)
+            return
+
+        if source == settings.collection_name and not embedder_settings.reindex_drop_legacy and await qdrant.get_client().collection_exists(source):
+            # the alias can only take the name by deleting this collection
+            self.context.logger.error(f"{output_messages.REINDEX_LEGACY_KO}", collection=source)
+            return
+
+        self.context.logger.info(f"{output_messages.REINDEX_START}", source=source, target=target)
+        if not await qdrant.get_client().collection_exists(target):
+            await qdrant.create_collection(target)
+        await qdrant.create_payload_index(collection=target)
+
+        key = self.checkpoint_key(target)
+        checkpoint = await self.context.redis.get_checkpoint(key) or {"offset": None, "copied": 0, "done": False}
+        if checkpoint["copied"]:
+            self.context.logger.info(f"{output_messages.REINDEX_RESUMED}", copied=checkpoint["copied"])
+
+        while not checkpoint["done"]:
+            points, next_offset = await qdrant.scroll(source, checkpoint["offset"], embedder_settings.reindex_batch_size)
+            await self.copy_points(points, target)
+            checkpoint = {"offset": next_offset, "copied": checkpoint["copied"] + len(points), "done": next_offset is None}
+            await self.context.redis.set_checkpoint(key, checkpoint)
+            self.context.logger.info(f"{output_messages.REINDEX_PROGRESS}", copied=checkpoint["copied"])
+
+        # probes kept writing to the old collection while it was copied, passes shrink the gap until it is small enough
+        for _ in range(embedder_settings.reindex_catch_up_passes):
+            if await self.catch_up(source, target) <= embedder_settings.reindex_catch_up_threshold:
+                break
+
+        previous = await qdrant.swap_alias(target, drop_legacy=embedder_settings.reindex_drop_legacy)
+        await self.context.redis.clear_checkpoint(key)
+        self.context.logger.info(f"{output_messages.REINDEX_DONE}", alias=settings.collection_name, collection=target)
+
+        if previous:
+            # writes that reached the old collection between the last pass and the swap, probes write to the new one now
+            # so its points missing from the old one are not deletions, only copies are made
+            await self.catch_up(previous, target, mirror_deletions=False)
+
+        if embedder_settings.reindex_drop_old and previous:
+            await qdrant.get_client().delete_collection(previous)
+            self.context.logger.info(f"{output_messages.REINDEX_OLD_DROPPED}", collection=previous)
+
+    async def copy_points(self, points, target):
+        """Re-embeds the text of each point, ids and payloads are kept as they are"""
+        points = [point for point in points if point.payload.get(settings.index_field)]
+        if not points:
+            return
+        vectors = await self.context.ollama.aembed_documents([point.payload[settings.index_field] for point in points])
+        await self.context.async_qdrant.upsert([
+            PointStruct(id=point.id, vector=vector, payload=point.payload)
+            for point, vector in zip(points, vectors)
+        ], collection=target)
+
+    async def catch_up(self, source, target, mirror_deletions=True):
+        """Copies the points that reached the source after the scroll went past them and removes the ones deleted from it, returns the changes
+
+        Point ids hash the chunk text, so an edited chunk is a new id and comparing ids is enough.
+        """
+        qdrant = self.context.async_qdrant
+        source_ids, changes = set(), 0
+        offset = None
+        while True:
+            points, offset = await qdrant.scroll(source, offset, embedder_settings.reindex_batch_size)
+            source_ids.update(str(point.id) for point in points)
+            existing = await qdrant.existing_ids([point.id for point in points], collection=target)
+            missing = [point for point in points if str(point.id) not in existing]
+            if missing:
+                self.context.logger.info(f"{output_messages.REINDEX_CATCH_UP}", points=len(missing))
+                await self.copy_points(missing, target)
+                changes += len(missing)
+            if offset is None:
+                break
+        if not mirror_deletions:
+            return changes
+
+        # the target only holds copies, one that is gone from the source was deleted there (probe's delete_stale)
+        offset = None
+        while True:
+            points, offset = await qdrant.scroll(target, offset, embedder_settings.reindex_batch_size)
+            deleted = [point.id for point in points if str(point.id) not in source_ids]
+            if deleted:
+                self.context.logger.info(f"{output_messages.REINDEX_CATCH_UP_DELETED}", points=len(deleted))
+                await qdrant.delete_ids(deleted, collection=target)
+                changes += len(deleted)
+            if offset is None:
+                break
+        return changes
+
+if __name__ == "__main__":
+    async def main():
+        service = ReindexService()
+        await service.initialize()
+        await service.run()
+
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+# observatory/hallucination.py - local stand-ins for the models, qdrant and redis, everything runs with no network
+from pylon import settings, EmbedderFactory, LLMFactory
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from fakeredis import TcpFakeServer
+import redis.asyncio as redis_async
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+
+EMBEDDER_NAME = "hallucination"
+LLM_NAME = "hallucination"
+WORD_PATTERN = re.compile(r"\w+")
+
+class HallucinatedEmbeddings(Embeddings):
+    """Deterministic hashed bag of words, texts sharing words get close vectors so the semantic chunker still finds breakpoints"""
+
+    def __init__(self, dimension=None, latency=0.0, latency_per_text=0.0):
+        self.dimension = dimension or settings.vector_dimension
+        # simulated model cost, per call and per embedded text
+        self.latency = latency
+        self.latency_per_text = latency_per_text
+
+    def embed(self, text):
+        vector = [0.0] * self.dimension
+        for word in WORD_PATTERN.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode(settings.encoding), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        delay = self.latency + self.latency_per_text * len(texts)
+        if delay:
+            time.sleep(delay)
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+def register_embedder(latency=0.0, latency_per_text=0.0):
+    """Registers the stand-in embedder, CURRENT_EMBEDDER_NAME=hallucination selects it"""
+    EmbedderFactory.register(
+        EMBEDDER_NAME,
+        lambda: HallucinatedEmbeddings(latency=latency, latency_per_text=latency_per_text),
+        model_name=f"{EMBEDDER_NAME}-{settings.vector_dimension}"
+    )
+
+class HallucinatedLLM(LLM):
+    """Answers with the first context line after a fixed delay, the way the prompt rules ask for a copied sentence"""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return LLM_NAME
+
+    def answer(self, prompt):
+        lines = [line.strip() for line in prompt.splitlines() if line.strip()]
+        for i, line in enumerate(lines[:-1]):
+            if "CONTEXT" in line or line.startswith("Context:"):
+                return lines[i + 1]
+        return "I don't know."
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.answer(prompt)
+
+    async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.answer(prompt)
+
+def register_llm(latency=0.0):
+    """Registers the stand-in LLM, MODEL_NAME=hallucination selects it"""
+    LLMFactory.register(LLM_NAME, lambda callbacks: HallucinatedLLM(latency=latency, callbacks=callbacks))
+
+class LaggingClient:
+    """Async qdrant client proxy sleeping before every call, a remote server stand-in over the in-memory one"""
+
+    def __init__(self, client, latency=0.0):
+        self._client = client
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not asyncio.iscoroutinefunction(attribute):
+            return attribute
+
+        async def delayed(*args, **kwargs):
+            if self._latency:
+                await asyncio.sleep(self._latency)
+            return await attribute(*args, **kwargs)
+        return delayed
+
+class PatientRedis(redis_async.Redis):
+    """fakeredis answers BLMOVE right away, polling here keeps idle workers from spinning"""
+
+    poll_interval = 0.005
+
+    async def blmove(self, first_list, second_list, timeout, src="LEFT", dest="RIGHT"):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            value = await self.lmove(first_list, second_list, src, dest)
+            if value is not None or (deadline and time.monotonic() >= deadline):
+                return value
+            await asyncio.sleep(self.poll_interval)
+
+def start_embedded_redis(host="127.0.0.1", port=0):
+    """fakeredis over TCP in a daemon thread, shared by every worker process, returns the server and its port"""
+    server = TcpFakeServer((host, port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
@@ -0,0 +1,88 @@
+# observatory/mineral_field.py - deterministic benchmark corpus, PDFs, markdown and JSON of a given size in pages
+from pathlib import Path
+import json
+import random
+
+KINDS = ("pdf", "md", "json")
+LINES_PER_PAGE = 30
+WORDS_PER_LINE = 12
+# sentences wander between a few topics, so semantic breakpoints exist
+TOPICS = {
+    "mining": "mineral field probe harvest vespene geyser assimilator nexus worker saturation income patch",
+    "defense": "photon cannon shield battery pylon power field sentry guardian shield ramp wall choke",
+    "tactics": "zealot charge stalker blink immortal barrier colossus lance range flank retreat engage",
+    "research": "forge upgrade armor weapons shields cybernetics core warp gate twilight council research",
+    "scouting": "observer detection hallucination phoenix lift scouting timing expansion army position map",
+}
+
+def make_sentence(rng, topic):
+    words = rng.choices(TOPICS[topic].split(), k=rng.randint(8, 16))
+    return " ".join(words).capitalize() + "."
+
+def make_page(rng, page_number):
+    """About LINES_PER_PAGE lines of WORDS_PER_LINE words, one or two topics per page"""
+    topics = rng.sample(sorted(TOPICS), 2)
+    words = []
+    for sentence in range(LINES_PER_PAGE):
+        topic = topics[0] if sentence < LINES_PER_PAGE // 2 else topics[1]
+        words.extend(make_sentence(rng, topic).split())
+    words = words[:LINES_PER_PAGE * WORDS_PER_LINE]
+    lines = [" ".join(words[i:i + WORDS_PER_LINE]) for i in range(0, len(words), WORDS_PER_LINE)]
+    return [f"Page {page_number + 1}"] + lines
+
+def make_pdf(pages):
+    """Smallest valid PDF with one text line per entry of every page, enough for pdfplumber"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        text = " T* ".join(f"({line})" + " Tj" for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 50 760 Td {text} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R /Resources << /Font << /F1 {font} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += b"".join(f"{offset:010d} 00000 n \n".encode("latin-1") for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
+
+def make_markdown(title, pages):
+    sections = [f"# {title}"]
+    for lines in pages:
+        sections.append(f"## {lines[0]}\n\n" + " ".join(lines[1:]))
+    return "\n\n".join(sections) + "\n"
+
+def make_json(title, pages):
+    return json.dumps({
+        "title": title,
+        "sections": [{"heading": lines[0], "body": " ".join(lines[1:])} for lines in pages]
+    }, indent=2)
+
+def generate_corpus(folder, pages, files_per_kind, kinds=KINDS, seed=0):
+    """Writes files_per_kind files of every kind, each of the given size in pages, returns their paths"""
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for kind in kinds:
+        for number in range(files_per_kind):
+            # the same seed, size and name always give the same bytes
+            rng = random.Random(f"{seed}-{kind}-{pages}-{number}")
+            title = f"corpus-{pages}p-{number:04d}"
+            content = [make_page(rng, page) for page in range(pages)]
+            path = folder / f"{title}.{kind}"
+            if kind == "pdf":
+                path.write_bytes(make_pdf(content))
+            elif kind == "md":
+                path.write_text(make_markdown(title, content), encoding="utf-8")
+            else:
+                path.write_text(make_json(title, content), encoding="utf-8")
+            paths.append(path)
+    return paths
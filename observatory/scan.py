@@ -0,0 +1,390 @@
+# observatory/scan.py - offline ingestion benchmark, sentry -> zealot -> stalker -> probe -> qdrant on local stand-ins
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+# stage: (folder, module, service class, settings module, settings object)
+SERVICES = {
+    "sentry": ("cybernetics_core", "sentry", "WatcherService", "cybernetic_core_settings", "watcher_settings"),
+    "zealot": ("gateway", "zealot", "ExtractorService", "gateway_settings", "extractor_settings"),
+    "stalker": ("twilight_council", "stalker", "ChunkerService", "twilight_council_settings", "chunker_settings"),
+    "probe": ("nexus", "probe", "EmbedderService", "nexus_settings", "embedder_settings"),
+}
+sys.path[:0] = [str(ROOT)] + [str(ROOT / folder) for folder, *_ in SERVICES.values()]
+
+from pylon import settings, available_cpus, RedisGateway, QdrantGateway, OllamaGateway, BlobGateway, Tracer
+from pylon.context import ApplicationContext
+from gateway_settings import extractor_settings
+from hallucination import EMBEDDER_NAME, PatientRedis, register_embedder, start_embedded_redis
+from mineral_field import KINDS, generate_corpus
+from contextlib import suppress
+from qdrant_client import QdrantClient
+import redis
+import redis.asyncio as redis_async
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import signal
+import structlog
+import subprocess
+import tempfile
+import time
+import uuid
+
+PIPELINE = ("sentry", "zealot", "stalker", "probe")
+CONSUMERS = ("zealot", "stalker", "probe")
+
+# ---- worker side, one process per stage
+
+def parse_value(value):
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return value
+
+def configure(config, stage):
+    """Points the settings of this process at the run folder and the stand-ins"""
+    run_folder = Path(config["run_folder"])
+    prefix = config["prefix"]
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, config["log_level"])))
+
+    settings.redis_host = config["redis_host"]
+    settings.redis_port = config["redis_port"]
+    settings.redis_db = config["redis_db"]
+    # queues, part counters and cached vectors of a run never mix with anything else on the same redis
+    settings.redis_queue_files = f"{prefix}:{settings.redis_queue_files}"
+    settings.redis_queue_documents = f"{prefix}:{settings.redis_queue_documents}"
+    settings.redis_queue_pages = f"{prefix}:{settings.redis_queue_pages}"
+    settings.embedding_cache_prefix = f"{prefix}:{settings.embedding_cache_prefix}"
+    settings.collection_name = prefix
+    settings.current_embedder_name = EMBEDDER_NAME
+    settings.metrics_port = 0
+    settings.trace_enabled = True
+    settings.trace_export_folder = str(run_folder / "traces")
+    settings.blob_folder = str(run_folder / "cargo")
+    register_embedder(config["embed_latency"], config["embed_latency_per_text"])
+
+    _, _, _, settings_module, settings_object = SERVICES[stage]
+    service_settings = getattr(importlib.import_module(settings_module), settings_object)
+    service_settings.check_interval = config["check_interval"]
+    if stage == "sentry":
+        service_settings.watch_folder = str(run_folder / "stargate")
+        service_settings.processed_folder = "warp_gate"
+    if stage == "probe":
+        service_settings.processed_folder = str(run_folder / "status")
+
+    # --set overrides, "<stage>.<name>" for the stage settings
+    for name, value in config["overrides"].items():
+        target, _, field = name.rpartition(".")
+        if not target:
+            setattr(settings, field, value)
+        elif target == stage:
+            setattr(service_settings, field, value)
+    # per queue watermarks follow the run prefix
+    settings.redis_watermarks = {f"{prefix}:{queue}": marks for queue, marks in settings.redis_watermarks.items()}
+
+async def build_context(config, stage):
+    connection_class = PatientRedis if config["embedded_redis"] else redis_async.Redis
+    redis = RedisGateway(connection_class(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db))
+    qdrant = QdrantGateway(client=QdrantClient(location=config["qdrant_location"]))
+    ollama = OllamaGateway()
+    ollama.initialize_client()
+    if stage == "probe":
+        qdrant.recreate_collection(ollama.get_embedding_model())
+        qdrant.create_payload_index()
+    return ApplicationContext(redis, qdrant, ollama, structlog.get_logger(), blob_gateway=BlobGateway(), tracer=Tracer(stage))
+
+def peak_rss_mb():
+    # kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def pool_peak_rss_mb(pool):
+    """Largest peak RSS among the PDF pool processes, read from /proc while they are alive"""
+    peaks = []
+    for pid in list(getattr(pool, "_processes", None) or {}):
+        with suppress(OSError):
+            for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    peaks.append(int(line.split()[1]) / 1024)
+    return max(peaks) if peaks else None
+
+async def run_worker(stage, run_folder):
+    run_folder = Path(run_folder)
+    config = json.loads((run_folder / "config.json").read_text())
+    configure(config, stage)
+    _, module, service_class, _, _ = SERVICES[stage]
+    service = getattr(importlib.import_module(module), service_class)()
+    await service.initialize(await build_context(config, stage))
+    if stage == "zealot":
+        # the pool starts its processes on first use, warmed here the first PDF does not pay for it
+        loop = asyncio.get_running_loop()
+        workers = extractor_settings.pdf_workers or available_cpus()
+        await asyncio.gather(*[loop.run_in_executor(service.pool, os.getpid) for _ in range(workers)])
+    (run_folder / "ready" / stage).touch()
+
+    result = {"stage": stage, "pid": os.getpid()}
+    if stage == "sentry":
+        # one pass over the corpus, the way a bulk drop on the watch folder is picked up
+        await service.rescan(None)
+        # files deferred by backpressure go out as the files queue drains
+        while service.deferred:
+            await asyncio.sleep(settings.redis_backpressure_interval)
+            await service.rescan(None)
+    else:
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        task = asyncio.create_task(service.run())
+        await asyncio.wait([task, asyncio.create_task(stop.wait())], return_when=asyncio.FIRST_COMPLETED)
+        if stage == "zealot":
+            result["pool_peak_rss_mb"] = pool_peak_rss_mb(service.pool)
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        if stage == "probe":
+            result["points"] = service.context.qdrant.get_client().count(settings.collection_name, exact=True).count
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    result.update(peak_rss_mb=peak_rss_mb(), cpu_seconds=usage.ru_utime + usage.ru_stime)
+    (run_folder / "results" / f"{stage}.json").write_text(json.dumps(result))
+
+# ---- harness side
+
+def percentiles(values):
+    """Nearest-rank p50/p95/p99 and max, in milliseconds"""
+    if not values:
+        return None
+    values = sorted(values)
+    def rank(p):
+        return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+    return {"count": len(values), "p50": rank(50), "p95": rank(95), "p99": rank(99), "max": values[-1]}
+
+def read_spans(folder):
+    spans = []
+    for export_file in Path(folder).glob("*.jsonl"):
+        for line in export_file.read_text().splitlines():
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for span in scope_spans["spans"]:
+                        spans.append({
+                            "name": span["name"],
+                            "trace_id": span["traceId"],
+                            "start_ns": int(span["startTimeUnixNano"]),
+                            "end_ns": int(span["endTimeUnixNano"]),
+                            "error": span["status"].get("code") == 2
+                        })
+    return spans
+
+def summarize(pages, files, corpus_bytes, spans, results, completed, finished_ns, elapsed, prefix, queue_peaks):
+    by_name = {}
+    traces = {}
+    for span in spans:
+        # queue names carry the run prefix, the report does not
+        name = span["name"].replace(f"{prefix}:", "")
+        by_name.setdefault(name, []).append((span["end_ns"] - span["start_ns"]) / 1e6)
+        first, last = traces.get(span["trace_id"], (span["start_ns"], span["end_ns"]))
+        traces[span["trace_id"]] = (min(first, span["start_ns"]), max(last, span["end_ns"]))
+
+    # from the first dispatch to the last status file, worker start-up is left out
+    starts = [span["start_ns"] for span in spans if span["name"] == "sentry.dispatch"]
+    wall = (finished_ns - min(starts)) / 1e9 if starts and finished_ns else elapsed
+    points = results.get("probe", {}).get("points", 0)
+    return {
+        "pages": pages,
+        "files": files,
+        "completed": completed,
+        "bytes": corpus_bytes,
+        "seconds": wall,
+        "docs_per_second": completed / wall if wall else 0.0,
+        "chunks": points,
+        "chunks_per_second": points / wall if wall else 0.0,
+        "errors": sum(span["error"] for span in spans),
+        "spans": {name: percentiles(durations) for name, durations in sorted(by_name.items())},
+        "end_to_end": percentiles([(last - first) / 1e6 for first, last in traces.values()]),
+        "queue_peaks": queue_peaks,
+        "workers": results
+    }
+
+def queue_depths(connection, prefix):
+    depths = {}
+    for queue in (settings.redis_queue_files, settings.redis_queue_documents, settings.redis_queue_pages):
+        try:
+            depths[queue] = connection.llen(f"{prefix}:{queue}")
+        except redis.exceptions.ResponseError:
+            depths[queue] = connection.xlen(f"{prefix}:{queue}")
+    return depths
+
+def pending_messages(connection, prefix):
+    """Messages of the run queued or taken and not acknowledged yet"""
+    pending = 0
+    for queue in (settings.redis_queue_files, settings.redis_queue_documents, settings.redis_queue_pages):
+        queue = f"{prefix}:{queue}"
+        try:
+            pending += connection.llen(queue) + connection.llen(f"{queue}{settings.redis_processing_suffix}")
+        except redis.exceptions.ResponseError:
+            # stream transport, its acks are not waited for
+            pass
+    return pending
+
+def spawn(stage, run_folder):
+    log = open(run_folder / "logs" / f"{stage}.log", "w")
+    return subprocess.Popen([sys.executable, __file__, "--worker", stage, "--run-folder", str(run_folder)], stdout=log, stderr=subprocess.STDOUT)
+
+def wait_for(condition, processes, timeout, what):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        dead = [stage for stage, process in processes.items() if process.poll() is not None]
+        if dead:
+            raise RuntimeError(f"{', '.join(dead)} exited while waiting for {what}, see its log")
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+def run_size(args, pages, redis_host, redis_port, embedded_redis):
+    """One full pipeline run over a fresh corpus of the given size, workers started and stopped around it"""
+    run_folder = Path(args.work_folder) / f"{pages}p"
+    shutil.rmtree(run_folder, ignore_errors=True)
+    for folder in ("ready", "results", "logs", "status", "traces"):
+        (run_folder / folder).mkdir(parents=True)
+    corpus = generate_corpus(run_folder / "stargate", pages, args.files, args.kinds, args.seed)
+    # sentry moves the files away
+    corpus_bytes = sum(path.stat().st_size for path in corpus)
+    prefix = f"observatory-{uuid.uuid4().hex[:8]}"
+    config = {
+        "run_folder": str(run_folder),
+        "prefix": prefix,
+        "redis_host": redis_host,
+        "redis_port": redis_port,
+        "redis_db": args.redis_db,
+        "embedded_redis": embedded_redis,
+        "qdrant_location": args.qdrant,
+        "check_interval": args.check_interval,
+        "embed_latency": args.embed_latency / 1000,
+        "embed_latency_per_text": args.embed_latency_per_text / 1000,
+        "log_level": args.log_level,
+        "overrides": dict(args.overrides)
+    }
+    (run_folder / "config.json").write_text(json.dumps(config))
+
+    workers = {stage: spawn(stage, run_folder) for stage in CONSUMERS}
+    queue_peaks = {}
+    try:
+        if not wait_for(lambda: all((run_folder / "ready" / stage).exists() for stage in CONSUMERS), workers, args.timeout, "start-up"):
+            raise RuntimeError("workers did not start in time")
+        connection = redis.Redis(host=redis_host, port=redis_port, db=args.redis_db)
+        started = time.monotonic()
+        workers["sentry"] = spawn("sentry", run_folder)
+        status_files = lambda: list((run_folder / "status").glob("*.status"))
+        consumers = {stage: workers[stage] for stage in CONSUMERS}
+
+        def corpus_done():
+            # the deepest each queue got, backpressure keeps it near the high watermark
+            for queue, depth in queue_depths(connection, prefix).items():
+                queue_peaks[queue] = max(queue_peaks.get(queue, 0), depth)
+            return len(status_files()) >= len(corpus)
+        wait_for(corpus_done, consumers, args.timeout, "the corpus")
+        elapsed = time.monotonic() - started
+        completed = status_files()
+        finished_ns = max((path.stat().st_mtime_ns for path in completed), default=None)
+        # statuses are written before the last acks, stage spans end after them
+        wait_for(lambda: pending_messages(connection, prefix) == 0, consumers, 30, "the last acks")
+        time.sleep(0.5)
+        workers["sentry"].wait(timeout=args.timeout)
+    finally:
+        for process in workers.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+        for process in workers.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    results = {}
+    for stage in PIPELINE:
+        result_file = run_folder / "results" / f"{stage}.json"
+        if result_file.exists():
+            results[stage] = json.loads(result_file.read_text())
+    return summarize(pages, len(corpus), corpus_bytes, read_spans(run_folder / "traces"), results, len(completed), finished_ns, elapsed, prefix, queue_peaks)
+
+def print_report(summary):
+    print(f"\n== {summary['pages']} page(s) per file: {summary['completed']}/{summary['files']} files, "
+          f"{summary['bytes'] / 1024:.0f} KiB, {summary['chunks']} chunks in {summary['seconds']:.2f}s")
+    print(f"   {summary['docs_per_second']:.2f} docs/s, {summary['chunks_per_second']:.1f} chunks/s, {summary['errors']} failed span(s)")
+    print(f"   {'span':<24}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in list(summary["spans"].items()) + [("end to end", summary["end_to_end"])]:
+        if stats:
+            print(f"   {name:<24}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+    print("   peak queue depth: " + ", ".join(f"{queue} {depth}" for queue, depth in summary["queue_peaks"].items()))
+    print(f"   {'worker':<24}{'peak rss MB':>14}{'cpu s':>10}")
+    for stage, result in summary["workers"].items():
+        print(f"   {stage:<24}{result['peak_rss_mb']:>14.1f}{result['cpu_seconds']:>10.2f}")
+        if result.get("pool_peak_rss_mb"):
+            print(f"   {'zealot pdf pool':<24}{result['pool_peak_rss_mb']:>14.1f}")
+
+def parse_override(value):
+    name, _, raw = value.partition("=")
+    return name.strip().lower(), parse_value(raw)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion benchmark: fakeredis (or --redis), in-memory qdrant, hashed embedder")
+    parser.add_argument("--sizes", default="1,8,32", help="pages per file, one pipeline run per size")
+    parser.add_argument("--files", type=int, default=10, help="files per kind and size")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="file kinds in the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--redis", help="host:port of a real redis, an embedded fakeredis otherwise")
+    parser.add_argument("--redis-db", type=int, default=0)
+    parser.add_argument("--qdrant", default=":memory:", help="qdrant location, in probe's memory by default")
+    parser.add_argument("--check-interval", type=float, default=0, help="pause of every stage between messages")
+    parser.add_argument("--embed-latency", type=float, default=0, help="simulated ms per embedder call")
+    parser.add_argument("--embed-latency-per-text", type=float, default=0, help="simulated ms per embedded text")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[], metavar="NAME=VALUE",
+                        help="setting override, e.g. chunking_strategy=word or probe.batch_mode=true")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds to wait for each run")
+    parser.add_argument("--work-folder", help="corpus, traces and logs, a temporary folder by default")
+    parser.add_argument("--output", help="writes the summaries as json")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--worker", choices=PIPELINE, help=argparse.SUPPRESS)
+    parser.add_argument("--run-folder", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(run_worker(args.worker, args.run_folder))
+        return
+
+    args.kinds = [kind for kind in args.kinds.split(",") if kind]
+    keep = bool(args.work_folder)
+    args.work_folder = args.work_folder or tempfile.mkdtemp(prefix="observatory-")
+    server = None
+    if args.redis:
+        redis_host, _, redis_port = args.redis.rpartition(":")
+        redis_port = int(redis_port)
+    else:
+        server, redis_port = start_embedded_redis()
+        redis_host = "127.0.0.1"
+
+    summaries = []
+    try:
+        for pages in [int(size) for size in args.sizes.split(",") if size]:
+            summary = run_size(args, pages, redis_host, redis_port, server is not None)
+            print_report(summary)
+            summaries.append(summary)
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+        if not keep:
+            shutil.rmtree(args.work_folder, ignore_errors=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(summaries, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+# observatory/storm.py - load test of the /ask API, simulated users against stubbed ollama and qdrant
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from pylon import settings, QdrantGateway, AsyncQdrantGateway, OllamaGateway, Tracer, run_loop_lag_monitor
+from pylon.context import ApplicationContext
+from hallucination import EMBEDDER_NAME, LLM_NAME, HallucinatedEmbeddings, LaggingClient, register_embedder, register_llm
+from mineral_field import TOPICS, make_page
+from scan import parse_override, percentiles
+from prometheus_client.parser import text_string_to_metric_families
+from dotenv import dotenv_values
+from qdrant_client import QdrantClient, AsyncQdrantClient
+import argparse
+import asyncio
+import httpx
+import json
+import logging
+import os
+import random
+import structlog
+import time
+
+PHASES = ("embed", "search", "prompt", "generate", "total")
+
+def make_chunks(count, seed):
+    """Texts to search, a few lines of the benchmark corpus each"""
+    rng = random.Random(f"{seed}-chunks")
+    chunks = []
+    page = 0
+    while len(chunks) < count:
+        lines = make_page(rng, page)[1:]
+        chunks.extend(" ".join(lines[i:i + 3]) for i in range(0, len(lines), 3))
+        page += 1
+    return chunks[:count]
+
+def make_questions(count, seed):
+    rng = random.Random(f"{seed}-questions")
+    words = sorted({word for topic in TOPICS.values() for word in topic.split()})
+    return [f"What does the text say about {rng.choice(words)} and {rng.choice(words)}?" for _ in range(count)]
+
+async def build_context(args):
+    """Application context of the API over the stand-ins: hashed embedder, echoing LLM, in-memory qdrant behind a fixed latency"""
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(getattr(logging, args.log_level)))
+    settings.current_embedder_name = EMBEDDER_NAME
+    settings.model_name = LLM_NAME
+    # every question should reach the embedder, --set embedding_cache_enabled=true measures the cache instead
+    settings.embedding_cache_enabled = False
+    settings.trace_enabled = False
+    for name, value in args.overrides:
+        setattr(settings, name, value)
+    register_embedder(args.embed_latency / 1000)
+    register_llm(args.generate_latency / 1000)
+
+    ollama = OllamaGateway()
+    ollama.initialize_client()
+    qdrant = QdrantGateway(client=QdrantClient(location=":memory:"))
+    async_qdrant = AsyncQdrantGateway(client=LaggingClient(AsyncQdrantClient(location=":memory:"), args.search_latency / 1000))
+    await async_qdrant.recreate_collection(ollama.get_embedding_model())
+    await async_qdrant.create_payload_index()
+
+    texts = make_chunks(args.chunks, args.seed)
+    vectors = HallucinatedEmbeddings().embed_documents(texts)
+    for first in range(0, len(texts), 256):
+        metadata = [{"source": f"storm-{i // 64}.md", "chunk_index": i % 64} for i in range(first, min(first + 256, len(texts)))]
+        await async_qdrant.add_to_qdrant(vectors[first:first + 256], texts[first:first + 256], metadata)
+
+    return ApplicationContext(None, qdrant, ollama, structlog.get_logger(), async_qdrant, None, Tracer("disruptor"))
+
+def load_app(context):
+    # compose hands the API both env files, its settings read part of the root one from the environment
+    for name, value in dotenv_values(ROOT / ".env").items():
+        os.environ.setdefault(name, value)
+    from robotics_bay.disruptor import app, limiter
+    # the limiter would turn most of the load into 429s, the startup event would connect to the real services
+    limiter.enabled = False
+    app.state.context = context
+    return app
+
+def parse_server_timing(header):
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+def lag_from_metrics(before, after):
+    """Bucket-resolution lag percentiles (upper bounds, ms) from two scrapes of event_loop_lag_seconds"""
+    def buckets(text):
+        counts = {}
+        for family in text_string_to_metric_families(text):
+            if family.name == "event_loop_lag_seconds":
+                for sample in family.samples:
+                    if sample.name.endswith("_bucket"):
+                        counts[float(sample.labels["le"])] = sample.value
+        return counts
+    start, end = buckets(before), buckets(after)
+    deltas = sorted((le, end[le] - start.get(le, 0)) for le in end)
+    total = deltas[-1][1] if deltas else 0
+    if not total:
+        return None
+    def rank(p):
+        return next(le for le, count in deltas if count >= p / 100 * total) * 1000
+    return {"count": int(total), "p50": rank(50), "p95": rank(95), "p99": rank(99), "max": None}
+
+async def simulated_user(client, questions, rng, args, stop_at, records):
+    """Closed loop: one question at a time, the next one as soon as the answer is back"""
+    while time.monotonic() < stop_at:
+        body = {"question": rng.choice(questions), "max_context_chunks": args.max_context_chunks}
+        started = time.monotonic()
+        try:
+            response = await client.post("/ask", json=body)
+            status = response.status_code
+            timings = parse_server_timing(response.headers.get("server-timing"))
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+            timings = {}
+        records.append({"started": started, "finished": time.monotonic(), "status": status, "timings": timings})
+
+async def run_level(client, users, questions, args, lag_samples):
+    records = []
+    rng = random.Random(f"{args.seed}-{users}")
+    stop_at = time.monotonic() + args.warmup + args.duration
+    tasks = [asyncio.create_task(simulated_user(client, questions, random.Random(rng.random()), args, stop_at, records)) for _ in range(users)]
+
+    await asyncio.sleep(args.warmup)
+    # requests started during warm-up and the lag they caused are left out
+    window_start = time.monotonic()
+    del lag_samples[:]
+    before = (await client.get("/metrics")).text if args.target else None
+    await asyncio.gather(*tasks)
+    after = (await client.get("/metrics")).text if args.target else None
+
+    measured = [record for record in records if record["started"] >= window_start]
+    succeeded = [record for record in measured if record["status"] == 200]
+    elapsed = max((record["finished"] for record in measured), default=window_start) - window_start
+    return {
+        "users": users,
+        "requests": len(measured),
+        "errors": len(measured) - len(succeeded),
+        "statuses": sorted({str(record["status"]) for record in measured}),
+        "seconds": elapsed,
+        "throughput": len(succeeded) / elapsed if elapsed else 0.0,
+        "latency": percentiles([(record["finished"] - record["started"]) * 1000 for record in succeeded]),
+        "server_timing": {
+            phase: percentiles([record["timings"][phase] for record in succeeded if phase in record["timings"]])
+            for phase in PHASES
+        },
+        "loop_lag": lag_from_metrics(before, after) if args.target else percentiles([lag * 1000 for lag in lag_samples])
+    }
+
+def print_report(summary):
+    print(f"\n== {summary['users']} users: {summary['requests']} requests in {summary['seconds']:.1f}s, "
+          f"{summary['throughput']:.1f} req/s, {summary['errors']} errors {summary['statuses']}")
+    print(f"   {'ms':<20}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    rows = [("request", summary["latency"])]
+    rows += [(f"  {phase}", stats) for phase, stats in summary["server_timing"].items()]
+    rows += [("event loop lag", summary["loop_lag"])]
+    for name, stats in rows:
+        if stats:
+            maximum = f"{stats['max']:>10.1f}" if stats["max"] is not None else f"{'-':>10}"
+            print(f"   {name:<20}{stats['count']:>7}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{maximum}")
+
+async def storm(args):
+    questions = make_questions(args.questions, args.seed)
+    lag_samples = []
+    monitor = None
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=httpx.Limits(max_connections=max(args.users)))
+    else:
+        app = load_app(await build_context(args))
+        # the app runs on this loop, its lag is the server lag
+        monitor = asyncio.create_task(run_loop_lag_monitor(args.lag_interval, lag_samples))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://disruptor", timeout=args.timeout)
+
+    summaries = []
+    async with client:
+        for users in args.users:
+            summary = await run_level(client, users, questions, args, lag_samples)
+            print_report(summary)
+            summaries.append(summary)
+    if monitor:
+        monitor.cancel()
+    return summaries
+
+async def serve(args):
+    """The API over the stand-ins on a real HTTP server, for --target runs from another shell"""
+    import uvicorn
+    app = load_app(await build_context(args))
+    monitor = asyncio.create_task(run_loop_lag_monitor(args.lag_interval))
+    # lifespan off: the startup event would replace the stubbed context
+    server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.serve, lifespan="off", log_level=args.log_level.lower()))
+    try:
+        await server.serve()
+    finally:
+        monitor.cancel()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of /ask: closed-loop users against a stubbed embedder, LLM and qdrant")
+    parser.add_argument("--users", default="10,50,200", help="concurrent users, one run per level")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each level")
+    parser.add_argument("--target", help="base url of a running API, the app is driven in-process otherwise")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="serves the stubbed API over HTTP instead of load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--embed-latency", type=float, default=5, help="ms per query embedding")
+    parser.add_argument("--search-latency", type=float, default=5, help="ms added to every qdrant call")
+    parser.add_argument("--generate-latency", type=float, default=250, help="ms per LLM answer")
+    parser.add_argument("--chunks", type=int, default=2000, help="chunks stored in the stubbed collection")
+    parser.add_argument("--questions", type=int, default=500, help="distinct questions the users pick from")
+    parser.add_argument("--max-context-chunks", type=int, default=5)
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="seconds between event loop lag samples")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[], metavar="NAME=VALUE",
+                        help="setting override, e.g. retrieval_mode=dense or blocking_executor_workers=16")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="writes the summaries as json")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    args.users = [int(users) for users in args.users.split(",") if users]
+
+    if args.serve:
+        asyncio.run(serve(args))
+        return
+    summaries = asyncio.run(storm(args))
+    if args.output:
+        Path(args.output).write_text(json.dumps(summaries, indent=2))
+
+if __name__ == "__main__":
+    main()
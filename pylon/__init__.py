@@ -4,28 +4,66 @@ Common utilities and configurations shared across services.
 
 from .adept import output_messages
 from .immortal import settings
-from .mothership_core import OllamaGateway
-from .void_ray import ProcessingError, json_to_text, suppress_stderr
+from .void_ray import ProcessingError, json_to_text, suppress_stderr, available_cpus
 from .phoenix import (
     track_processing_time,
     update_queue_size,
+    update_deferred_files,
     record_processed_file,
-    record_error
+    record_error,
+    record_cache_lookup,
+    record_chunking,
+    record_chunks,
+    record_vectors,
+    record_request,
+    time_model_call,
+    start_metrics_server,
+    run_loop_lag_monitor
 )
-from .warp_prism import QdrantGateway
+from .shield_battery import EmbeddingCache, CachedEmbeddings
+from .reaver import ChunkingRegistry, ChunkingStrategy
+from .arbiter import CrossEncoderReranker
+from .mothership_core import OllamaGateway, EmbedderFactory, LLMFactory
+from .warp_prism import QdrantGateway, AsyncQdrantGateway, CollectionRouter, UnknownCollectionError
 from .colossus import RedisGateway
+from .shuttle import BlobGateway
+from .revelation import Tracer
+from .time_warp import start_timings, server_timing
 
 __all__ = [
 	'output_messages',
     'settings',
     'OllamaGateway',
+    'EmbedderFactory',
+    'LLMFactory',
     'ProcessingError',
     'json_to_text',
     'suppress_stderr',
+    'available_cpus',
     'track_processing_time',
     'update_queue_size',
     'record_processed_file',
     'record_error',
+    'record_cache_lookup',
+    'record_chunking',
+    'record_chunks',
+    'record_vectors',
+    'record_request',
+    'time_model_call',
+    'start_metrics_server',
+    'run_loop_lag_monitor',
+    'EmbeddingCache',
+    'CachedEmbeddings',
+    'ChunkingRegistry',
+    'ChunkingStrategy',
+    'CrossEncoderReranker',
     'QdrantGateway',
-	'RedisGateway'
+    'AsyncQdrantGateway',
+    'CollectionRouter',
+    'UnknownCollectionError',
+	'RedisGateway',
+    'BlobGateway',
+    'Tracer',
+    'start_timings',
+    'server_timing'
 ] 
\ No newline at end of file
@@ -16,7 +16,18 @@ class OutputMessages():
     REDIS_MSG_FIELD_KO = "[Colossus hit] Missing required field"
     REDIS_MSG_CONTENT_EMPTY = "[Colossus hit] Empty content field "
     REDIS_MSG_FORMAT_KO = "[Colossus hit] Invalid base64 content"
+    REDIS_ENVELOPE_KO = "[Colossus hit] Unknown envelope version"
     REDIS_CONTENT_TO_DOCUMENT_OK="[Colossus] Content transformed into standard document. "
+    REDIS_ACK_KO = "[Colossus hit] Failed to settle message "
+    REDIS_QUEUE_SIZE_KO = "[Colossus hit] Failed to read queue size "
+    REDIS_MESSAGE_REQUEUED = "[Colossus] Message returned to queue "
+    REDIS_PARTS_KO = "[Colossus hit] Failed to track file parts "
+    REDIS_DEAD_LETTER = "[Colossus hit] Message sent to dead-letter queue "
+    REDIS_LEASE_KO = "[Colossus hit] Failed to extend message lease "
+    REDIS_LEASE_LOST = "[Colossus hit] Message lease already expired, it can be delivered twice "
+    REDIS_BACKGROUND_KO = "[Colossus down] Background task stopped, taking the stage down "
+    REDIS_BACKPRESSURE_PAUSE = "[Colossus] Queue over its high watermark, holding fire "
+    REDIS_BACKPRESSURE_RESUME = "[Colossus] Queue down to its low watermark, firing again "
     # watcher - sentry.py
     WATCHER_INITIALIZATION = "[Sentry] Patrolling for new files..."
     WATCHER_EXCEPTION = "[Sentry down] Exploded "
@@ -26,6 +37,11 @@ class OutputMessages():
     WATCHER_MOVE_FILE_START = "[Sentry] Sending processed file into directory"
     WATCHER_NO_FOLDER_KO = "[Sentry] Target folder not found"
     WATCHER_QUEUE_TARGET="[Sentry] Target queue name "
+    WATCHER_INOTIFY_START="[Sentry] Watching folder events "
+    WATCHER_INOTIFY_OVERFLOW="[Sentry hit] Folder events lost, rescanning "
+    WATCHER_FILES_DEFERRED="[Sentry] Files queue full, leaving files in the folder for now "
+    WATCHER_BLOB_STORED="[Sentry] File too large for the queue, loaded into shuttle "
+    WATCHER_SETTLE_KO="[Sentry hit] Settled file not admitted, deferring it "
     # extractor - zealot.py
     EXTRACTOR_INITIALIZATION = "[Zealot] Ready to serve."
     EXTRACTOR_EXCEPTION = "[Zealot down] Exploded "
@@ -43,6 +59,8 @@ class OutputMessages():
     EXTRACTOR_JSON_KO_MSG = "[Zealot hit] Invalid JSON"
     EXTRACTOR_JSON_DECODE_KO = "[Zealot hit] Invalide file encoding"
     EXTRACTOR_UNSUPPORTED_TYPE = "[Zealot hit] Unsupported file type"
+    EXTRACTOR_PDF_PART_SENT = "[Zealot] Pages sent downstream"
+    EXTRACTOR_BLOB_KO = "[Zealot hit] Shuttle cargo not found"
     # chunker - stalker.py
     CHUNKER_INITIALIZATION = "[Stalker] Ready to serve."
     CHUNKER_EXCEPTION = "[Stalker down] Exploded "
@@ -51,6 +69,9 @@ class OutputMessages():
     CHUNKER_WAIT_START = "[Stalker] Wating for orders."
     CHUNKER_READY = "[Stalker] Chunker sharpen"
     CHUNKER_DONE = "[Stalker] Document chunks extracted"
+    CHUNKING_STRATEGY = "[Reaver] Chunking strategy selected"
+    CHUNKING_STRATEGY_KO = "[Reaver hit] Unknown chunking strategy"
+    CHUNKING_OVERLAP_KO = "[Reaver hit] Chunk overlap must be smaller than the window"
     # embedder - probe.py
     EMBEDDER_INITIALIZATION = "[Probe] Ready to serve."
     EMBEDDER_EXCEPTION = "[Probe down] Exploded "
@@ -61,12 +82,41 @@ class OutputMessages():
     EMBEDDER_NO_MESSAGES_DECODED="[Probe] No messages in decoded data. "
     EMBEDDER_REQUEST_VECTORS_START="[Probe] Requesting vectors."
     EMBEDDER_REQUEST_VECTORS_ENDED="[Probe] Vectors acquired."
+    EMBEDDER_CHUNKS_UNCHANGED = "[Probe] Chunks already stored skipped "
+    REINDEX_START = "[Probe] Re-index started "
+    REINDEX_UP_TO_DATE = "[Probe] Collection already embedded with the current model "
+    REINDEX_RESUMED = "[Probe] Re-index resumed from checkpoint "
+    REINDEX_PROGRESS = "[Probe] Re-index progress "
+    REINDEX_CATCH_UP = "[Probe] Re-index catching up with points written meanwhile "
+    REINDEX_CATCH_UP_DELETED = "[Probe] Re-index mirroring points deleted meanwhile "
+    REINDEX_LEGACY_KO = "[Probe] Re-index stopped, the source is a collection created before aliases and REINDEX_DROP_LEGACY is off "
+    REINDEX_DONE = "[Probe] Re-index done, alias swapped "
+    REINDEX_OLD_DROPPED = "[Probe] Previous collection dropped "
+    EMBEDDER_BATCH_COLLECTED="[Probe] Pages batch collected."
+    # embedding cache - shield_battery.py
+    CACHE_REDIS_KO="[Shield Battery hit] Cache tier unavailable, embedding without it "
+    # blob store - shuttle.py
+    BLOB_STORED="[Shuttle] Cargo loaded "
+    BLOB_DELETED="[Shuttle] Cargo unloaded "
+    BLOB_REFERENCE_KO="[Shuttle hit] Invalid cargo reference"
+    # reranker - arbiter.py
+    RERANK_MODEL_LOADED="[Arbiter] Cross-encoder loaded "
+    RERANK_RESULT="[Arbiter] Candidates reranked "
     # qdrant
     QDRANT_COLLECTION_EXISTS="[Warp Prism] Collection exists. "
     QDRANT_COLLECTION_CREATION="[Warp Prism] Collection created. "
+    QDRANT_COLLECTION_TUNED="[Warp Prism] Collection tuned. "
+    QDRANT_ALIAS_SWAPPED="[Warp Prism] Collection alias swapped. "
+    QDRANT_LEGACY_COLLECTION="[Warp Prism] Unaliased collection replaced by an alias. "
+    QDRANT_LEGACY_COLLECTION_KO="[Warp Prism] Unaliased collection holds the alias name, it is only deleted when asked to "
     QDRANT_INDEX_CREATION="[Warp Prism] Index created. "
     QDRANT_POINTS_SKIPPED="[Warp Prism] Skipped point generation - empty vectors/documents"
+    QDRANT_STALE_DELETED="[Warp Prism] Stale points of the source removed "
+    QDRANT_POINTS_DELETED="[Warp Prism] Points removed "
+    QDRANT_HYBRID_RESULT="[Warp Prism] Dense and text targets fused "
     QDRANT_SEARCH_RESULT="[Warp Prism] Targets found "
+    QDRANT_COLLECTION_ROUTED="[Warp Prism] Collection gateway bound. "
+    QDRANT_UNKNOWN_COLLECTION="[Warp Prism] Collection not configured: "
     # metrics - phoenix.py
     # api - disruptor.py
     API_INITIALIZATION="[Disruptor] Ready to serve."
@@ -79,6 +129,7 @@ class OutputMessages():
     API_QUESTION="[Disruptor] System input"
     API_QUESTION_KO="[Disruptor hit] System failed to respond."
     API_CONTEXT_KO="[Disruptor] System failed to retrieve context"
+    API_COLLECTION_KO="[Disruptor] System has no such collection"
     API_EMBEDDINGS_START="[Disruptor] Embeddings generation starting"
     API_EMBEDDINGS_STARTED="[Disruptor] Embeddings generation started"
     API_EMBEDDINGS_OK="[Disruptor] Embedding generation success"
@@ -0,0 +1,76 @@
+from .immortal import settings
+from .adept import output_messages
+from .phoenix import record_cache_lookup
+from collections import OrderedDict
+from typing import List
+import hashlib
+import threading
+import structlog
+
+# Local cross-encoder that re-orders the retrieved candidates before they reach the prompt
+class CrossEncoderReranker:
+
+    def __init__(self, model_name=None, top_k=None, candidates=None, cache_size=None):
+        self._logger = structlog.get_logger()
+        self._model = None
+        self._model_name = model_name or settings.rerank_model
+        self.top_k = top_k or settings.rerank_top_k
+        self.candidates = candidates or settings.rerank_candidates
+        self._cache_size = cache_size if cache_size is not None else settings.rerank_cache_size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def initialize_client(self):
+        # imported here, only the services that rerank pay for loading torch
+        from sentence_transformers import CrossEncoder
+        self._model = CrossEncoder(self._model_name, device="cpu", max_length=settings.rerank_max_length)
+        self._logger.info(f"{output_messages.RERANK_MODEL_LOADED}", model=self._model_name)
+
+    def get_model(self):
+        with self._lock:
+            if not self._model:
+                self.initialize_client()
+        return self._model
+
+    def make_key(self, query, text):
+        return hashlib.sha1(f"{self._model_name}\0{query}\0{text}".encode(settings.encoding)).digest()
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance of every text to the query, pairs scored before come from the LRU"""
+        keys = [self.make_key(query, text) for text in texts]
+        scores = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[i] = self._scores[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        record_cache_lookup("rerank", "hit", len(texts) - len(missing))
+        record_cache_lookup("rerank", "miss", len(missing))
+
+        if missing:
+            predicted = self.get_model().predict(
+                [(query, texts[i]) for i in missing],
+                batch_size=settings.rerank_batch_size,
+                show_progress_bar=False
+            )
+            with self._lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._scores[keys[i]] = scores[i]
+                while len(self._scores) > self._cache_size:
+                    self._scores.popitem(last=False)
+        return scores
+
+    def select(self, query, hits):
+        """The top_k qdrant hits by cross-encoder score, the score of each hit replaced by its rerank score"""
+        if not hits:
+            return hits
+        scores = self.score(query, [hit.payload.get(settings.index_field, "") for hit in hits])
+        ranked = sorted(zip(scores, range(len(hits))), reverse=True)[:self.top_k]
+        self._logger.debug(f"{output_messages.RERANK_RESULT}", candidates=len(hits), kept=len(ranked))
+        return [hits[i].model_copy(update={"score": score}) for score, i in ranked]
+
+    async def aselect(self, query, hits, executor):
+        # model inference is CPU bound, it runs on the bounded executor and never on the event loop
+        return await executor.run(self.select, query, hits)
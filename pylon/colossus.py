@@ -1,13 +1,36 @@
 import redis
 import redis.asyncio as redis_async
+import asyncio
 import uuid
 import json
 import base64
+import hashlib
+import msgpack
+import os
+import socket
 import traceback
 import structlog
 import time
-from typing import Dict, Any
+from typing import Dict, Any, NamedTuple
 from pylon import settings, record_error, output_messages
+from pylon.phoenix import update_queue_size, record_message_bytes, record_message_latency, record_backpressure
+from pylon.revelation import outgoing_trace
+
+# versioned binary envelope: magic, version byte, msgpack body with raw bytes fields
+ENVELOPE_MAGIC = b"PRT"
+ENVELOPE_VERSION = 1
+# deliveries of earlier copies of a stream entry, a nacked entry goes back as a new one
+STREAM_DELIVERIES_FIELD = b"deliveries"
+
+class QueueMessage(NamedTuple):
+    """A message read from a queue, with the receipt needed to acknowledge it"""
+    queue: str
+    data: bytes
+    receipt: Any = None
+    # monotonic time of the dequeue, for the dequeue-to-ack latency
+    received: float = None
+    # wall clock of the dequeue, for the queue wait span
+    dequeued_ns: int = None
 
 # redis client code
 class RedisGateway():
@@ -15,6 +38,12 @@ class RedisGateway():
     def __init__(self, connection):
         self._logger = structlog.get_logger()
         self._connection = connection
+        self._groups = set()
+        # messages taken and not settled yet, their leases are kept alive by the heartbeat
+        self._held = {}
+        # last depth seen per queue, and the queues paused until they drain to their low watermark
+        self._depths = {}
+        self._paused = set()
 
     @classmethod
     async def create(cls):
@@ -35,12 +64,11 @@ class RedisGateway():
     async def send_it(self, queue, content, message_id):
         if content:
             if isinstance(content, list):
-                content = json.dumps([doc.dict() if hasattr(doc, "dict") else str(doc) for doc in content])
+                content = self.serialize_documents(content)
                 self._logger.debug(f"{output_messages.REDIS_CONTENT_TO_DOCUMENT_OK}")
-            encoded_content = base64.b64encode(content.encode(settings.encoding)).decode(settings.encoding)
             payload = self.generate_message(
                 id=message_id,
-                encoded_content=encoded_content,
+                content=content,
                 filename=None,
                 content_field=None,
                 content_type=None,
@@ -57,23 +85,44 @@ class RedisGateway():
                 queue = settings.redis_queue
             redis = self._connection
 
-            result = await redis.rpush(queue, json.dumps(data))
+            if isinstance(data.get(settings.trace_field), dict):
+                # enqueue time of this hop, the consumer turns it into a queue wait span
+                data = {**data, settings.trace_field: {**data[settings.trace_field], "enqueued_ns": time.time_ns()}}
+            await self.wait_for_capacity(queue)
+            raw_data = self.encode_message(data)
+            record_message_bytes(queue, "out", len(raw_data))
+            if self.is_stream():
+                pipeline = redis.pipeline(transaction=False)
+                pipeline.xadd(queue, {settings.redis_stream_field: raw_data})
+                pipeline.xlen(queue)
+                result, depth = await pipeline.execute()
+            else:
+                # RPUSH answers with the new length, the depth comes for free
+                result = depth = await redis.rpush(queue, raw_data)
+            self._depths[queue] = depth
             if not result or result == 0:
                 self._logger.error(output_messages.REDIS_MESSAGE_OUT_KO, result=result)
             else:     
                 self._logger.debug(output_messages.REDIS_MESSAGE_OUT_OK, message_id=data['id'], queue=queue, result=result)
-            await redis.aclose()
         except Exception as e:
             self._logger.error(output_messages.REDIS_MESSAGE_OUT_KO, error=str(e))
-            traceback.print_exc()
-            
-    async def get_message(self, queue):
+            # the caller nacks the message it was working on, acking it would lose this one
+            raise
+
+    async def get_message(self, queue, timeout=None):
         try:
             if not queue:
                 queue = settings.redis_queue
+            if timeout is None:
+                timeout = settings.redis_timeout
             redis_connection = await self._connection
 
-            message = await redis_connection.blpop(queue, timeout=settings.redis_timeout)
+            if self.is_stream():
+                message = await self.get_stream_message(redis_connection, queue, timeout)
+            elif settings.redis_reliable:
+                message = await self.get_reliable_message(redis_connection, queue, timeout)
+            else:
+                message = await redis_connection.blpop(queue, timeout=timeout)
 
             if not message:
                 self._logger.debug(output_messages.REDIS_NO_MESSAGES)
@@ -83,61 +132,520 @@ class RedisGateway():
                 self._logger.error(output_messages.REDIS_FAILED_TO_READ, message=message)
                 return None
 
+            if not isinstance(message, QueueMessage):
+                message = QueueMessage(queue, message[1])
+
+            record_message_bytes(queue, "in", len(message.data))
+            message = message._replace(received=time.monotonic(), dequeued_ns=time.time_ns())
+            if message.receipt is not None:
+                self._held[(queue, message.receipt)] = message
             return message
         except (redis.exceptions.ConnectionError) as e:
             record_error(error_type='redis')
             self._logger.error(output_messages.REDIS_FAILED_TO_CONNECT, error=str(e))
-            time.sleep(settings.redis_retry_delay)
+            await asyncio.sleep(settings.redis_retry_delay)
         except (redis.exceptions.TimeoutError) as e:
             self._logger.debug(output_messages.REDIS_NO_MESSAGES)
-            time.sleep(settings.redis_retry_delay)
+            await asyncio.sleep(settings.redis_retry_delay)
 
         except Exception as e:
             record_error(error_type='unexpected')
             self._logger.error(output_messages.REDIS_EXCEPTION, 
                         error=str(e),
                         traceback=traceback.format_exc())
-            time.sleep(settings.redis_retry_delay)
+            await asyncio.sleep(settings.redis_retry_delay)
+
+    # reliable consume mode: messages wait in a processing list until acknowledged
+    def processing_queue(self, queue):
+        return f"{queue}{settings.redis_processing_suffix}"
+
+    def dead_letter_queue(self, queue):
+        return f"{queue}{settings.redis_dead_letter_suffix}"
+
+    def leases_key(self, queue):
+        return f"{self.processing_queue(queue)}:leases"
+
+    def deliveries_key(self, queue):
+        return f"{self.processing_queue(queue)}:deliveries"
+
+    def fingerprint(self, raw_data):
+        """Stable key for a raw message, the same bytes are moved between lists untouched"""
+        if isinstance(raw_data, str):
+            raw_data = raw_data.encode(settings.encoding)
+        return hashlib.sha1(raw_data).hexdigest()
+
+    async def get_reliable_message(self, redis_connection, queue, timeout):
+        raw_data = await redis_connection.blmove(queue, self.processing_queue(queue), timeout, "LEFT", "RIGHT")
+        if raw_data is None:
+            return None
+
+        fingerprint = self.fingerprint(raw_data)
+        pipeline = redis_connection.pipeline(transaction=False)
+        pipeline.hincrby(self.deliveries_key(queue), fingerprint, 1)
+        pipeline.hset(self.leases_key(queue), fingerprint, time.time() + settings.redis_visibility_timeout)
+        deliveries, _ = await pipeline.execute()
+
+        # a poison message stops here instead of burning another worker run
+        if deliveries > settings.redis_max_deliveries:
+            await self.dead_letter(queue, raw_data, fingerprint, deliveries)
+            return None
+
+        return QueueMessage(queue, raw_data, raw_data)
+
+    def record_latency(self, message, outcome):
+        if message and message.received is not None:
+            record_message_latency(message.queue, outcome, time.monotonic() - message.received)
+
+    async def ack_message(self, message):
+        """Confirms a message was fully processed, it will not be delivered again"""
+        self.record_latency(message, "ack")
+        if not message or message.receipt is None:
+            return
+        self._held.pop((message.queue, message.receipt), None)
+        if self.is_stream():
+            await self.ack_stream_message(message)
+            return
+        try:
+            fingerprint = self.fingerprint(message.receipt)
+            pipeline = self._connection.pipeline(transaction=False)
+            pipeline.lrem(self.processing_queue(message.queue), 1, message.receipt)
+            pipeline.hdel(self.leases_key(message.queue), fingerprint)
+            pipeline.hdel(self.deliveries_key(message.queue), fingerprint)
+            await pipeline.execute()
+        except Exception as e:
+            self._logger.error(output_messages.REDIS_ACK_KO, error=str(e))
+
+    async def nack_message(self, message):
+        """Gives a failed message back to its queue, or to the dead-letter queue once out of deliveries"""
+        self.record_latency(message, "nack")
+        if not message or message.receipt is None:
+            return
+        self._held.pop((message.queue, message.receipt), None)
+        try:
+            if self.is_stream():
+                await self.requeue_stream_entry(message)
+                return
+            await self.release(message.queue, message.receipt)
+        except Exception as e:
+            self._logger.error(output_messages.REDIS_ACK_KO, error=str(e))
+
+    async def release(self, queue, raw_data):
+        redis = self._connection
+        fingerprint = self.fingerprint(raw_data)
+        # whoever removes it from the processing list owns the requeue, acks and reapers can race
+        removed = await redis.lrem(self.processing_queue(queue), 1, raw_data)
+        if not removed:
+            return
+        deliveries = int(await redis.hget(self.deliveries_key(queue), fingerprint) or 0)
+        if deliveries >= settings.redis_max_deliveries:
+            await self.dead_letter(queue, raw_data, fingerprint, deliveries, removed=True)
+            return
+        pipeline = redis.pipeline(transaction=False)
+        pipeline.hdel(self.leases_key(queue), fingerprint)
+        pipeline.rpush(queue, raw_data)
+        await pipeline.execute()
+        self._logger.info(output_messages.REDIS_MESSAGE_REQUEUED, queue=queue, deliveries=deliveries)
+
+    async def dead_letter(self, queue, raw_data, fingerprint, deliveries, removed=False):
+        redis = self._connection
+        pipeline = redis.pipeline(transaction=False)
+        if not removed:
+            pipeline.lrem(self.processing_queue(queue), 1, raw_data)
+        pipeline.rpush(self.dead_letter_queue(queue), raw_data)
+        pipeline.hdel(self.leases_key(queue), fingerprint)
+        pipeline.hdel(self.deliveries_key(queue), fingerprint)
+        await pipeline.execute()
+        record_error(error_type='dead_letter')
+        self._logger.error(output_messages.REDIS_DEAD_LETTER, queue=self.dead_letter_queue(queue), deliveries=deliveries)
+
+    async def requeue_expired(self, queue):
+        """Puts back messages whose worker did not acknowledge them within the visibility timeout"""
+        redis = self._connection
+        in_flight = await redis.lrange(self.processing_queue(queue), 0, -1)
+        if not in_flight:
+            return 0
+
+        fingerprints = [self.fingerprint(raw_data) for raw_data in in_flight]
+        leases = await redis.hmget(self.leases_key(queue), fingerprints)
+        now = time.time()
+        requeued = 0
+        for raw_data, fingerprint, lease in zip(in_flight, fingerprints, leases):
+            if lease is None:
+                # moved but not leased yet, give it a full timeout from now
+                await redis.hsetnx(self.leases_key(queue), fingerprint, now + settings.redis_visibility_timeout)
+                continue
+            if float(lease) <= now:
+                await self.release(queue, raw_data)
+                requeued += 1
+        return requeued
+
+    async def run_reaper(self, queue):
+        """Background loop requeueing expired messages, only needed in reliable list mode"""
+        if not settings.redis_reliable or self.is_stream():
+            return
+        while True:
+            try:
+                await self.requeue_expired(queue)
+            except Exception as e:
+                self._logger.error(output_messages.REDIS_EXCEPTION, error=str(e))
+            await asyncio.sleep(settings.redis_reaper_interval)
+
+    async def extend_lease(self, message):
+        """Pushes back the visibility timeout of a message still being worked on, False once the lease is lost"""
+        if not message or message.receipt is None:
+            return True
+        redis = self._connection
+        if self.is_stream():
+            # claiming it again for the same consumer resets its idle time, only while it is still ours
+            if not await self.owns_stream_entry(message):
+                return False
+            await redis.xclaim(message.queue, settings.redis_consumer_group, self.consumer_name(), 0, [message.receipt], justid=True)
+            return True
+        fingerprint = self.fingerprint(message.receipt)
+        # a released message has no lease left, setting one again would outlive it
+        if not await redis.hexists(self.leases_key(message.queue), fingerprint):
+            return False
+        await redis.hset(self.leases_key(message.queue), fingerprint, time.time() + settings.redis_visibility_timeout)
+        return True
+
+    async def extend_leases(self):
+        """Extends the lease of every message this worker holds"""
+        for key, message in list(self._held.items()):
+            try:
+                if not await self.extend_lease(message):
+                    self._held.pop(key, None)
+                    self._logger.warning(output_messages.REDIS_LEASE_LOST, queue=message.queue)
+            except Exception as e:
+                self._logger.error(output_messages.REDIS_LEASE_KO, queue=message.queue, error=str(e))
+
+    async def run_lease_heartbeat(self):
+        """Background loop keeping the held messages leased, a long PDF or a slow embedding is not handed out twice"""
+        if not settings.redis_reliable and not self.is_stream():
+            return
+        while True:
+            # three renewals per timeout, one missed beat does not lose a lease
+            await asyncio.sleep(settings.redis_visibility_timeout / 3)
+            await self.extend_leases()
+
+    async def run_background(self, queue, monitored):
+        """Reaper and lease heartbeat of the consumed queue, depth sampling of the monitored ones"""
+        await asyncio.gather(
+            self.run_reaper(queue),
+            self.run_lease_heartbeat(),
+            self.run_queue_monitor(monitored)
+        )
+
+    def supervise(self, coroutine):
+        """Runs a background coroutine of the current stage, its failure stops the stage instead of going unnoticed"""
+        stage = asyncio.current_task()
+        task = asyncio.create_task(coroutine)
+
+        def stopped(task):
+            if task.cancelled() or not task.exception():
+                return
+            self._logger.error(output_messages.REDIS_BACKGROUND_KO, error=str(task.exception()))
+            stage.cancel()
+        task.add_done_callback(stopped)
+        return task
+
+    # stream transport: consumer groups spread entries over every replica of a stage
+    def is_stream(self):
+        return settings.redis_transport == settings.redis_transport_stream
+
+    def consumer_name(self):
+        return settings.redis_consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+
+    async def ensure_group(self, redis_connection, queue):
+        if queue in self._groups:
+            return
+        try:
+            await redis_connection.xgroup_create(queue, settings.redis_consumer_group, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._groups.add(queue)
+
+    async def get_stream_message(self, redis_connection, queue, timeout):
+        await self.ensure_group(redis_connection, queue)
+        group = settings.redis_consumer_group
+        consumer = self.consumer_name()
+
+        # entries left pending by a crashed or failed consumer come first
+        claimed = await redis_connection.xautoclaim(
+            queue, group, consumer,
+            min_idle_time=settings.redis_visibility_timeout * 1000,
+            start_id="0-0",
+            count=1
+        )
+        entries = claimed[1] if claimed else []
+        if entries:
+            entry_id, fields = entries[0]
+            pending = await redis_connection.xpending_range(queue, group, min=entry_id, max=entry_id, count=1)
+            deliveries = self.stream_deliveries(fields) + (pending[0]["times_delivered"] if pending else 1)
+            if deliveries > settings.redis_max_deliveries:
+                await self.dead_letter_stream_entry(redis_connection, queue, entry_id, fields, deliveries)
+                return None
+            return QueueMessage(queue, fields[settings.redis_stream_field.encode(settings.encoding)], entry_id)
+
+        # XREADGROUP treats 0 as block forever, keep at least a millisecond
+        block = max(int(timeout * 1000), 1)
+        response = await redis_connection.xreadgroup(group, consumer, {queue: ">"}, count=1, block=block)
+        if not response:
+            return None
+        _, stream_entries = response[0]
+        if not stream_entries:
+            return None
+        entry_id, fields = stream_entries[0]
+        return QueueMessage(queue, fields[settings.redis_stream_field.encode(settings.encoding)], entry_id)
+
+    async def owns_stream_entry(self, message):
+        """True while the entry is pending for this consumer, XAUTOCLAIM may have handed it to another one"""
+        pending = await self._connection.xpending_range(
+            message.queue, settings.redis_consumer_group,
+            min=message.receipt, max=message.receipt, count=1, consumername=self.consumer_name()
+        )
+        return bool(pending)
+
+    def stream_deliveries(self, fields):
+        return int(fields.get(STREAM_DELIVERIES_FIELD, 0))
 
-    def get_queue_size(self, queue):
+    async def requeue_stream_entry(self, message):
+        """Adds a failed entry back as a new one, retried right away as in list mode instead of after the visibility timeout"""
+        redis = self._connection
+        if not await self.owns_stream_entry(message):
+            return
+        entries = await redis.xrange(message.queue, min=message.receipt, max=message.receipt, count=1)
+        if not entries:
+            return
+        entry_id, fields = entries[0]
+        deliveries = self.stream_deliveries(fields) + 1
+        if deliveries >= settings.redis_max_deliveries:
+            await self.dead_letter_stream_entry(redis, message.queue, entry_id, fields, deliveries)
+            return
+        pipeline = redis.pipeline(transaction=True)
+        pipeline.xadd(message.queue, {**fields, STREAM_DELIVERIES_FIELD: deliveries})
+        pipeline.xack(message.queue, settings.redis_consumer_group, entry_id)
+        pipeline.xdel(message.queue, entry_id)
+        await pipeline.execute()
+        self._logger.info(output_messages.REDIS_MESSAGE_REQUEUED, queue=message.queue, deliveries=deliveries)
+
+    async def ack_stream_message(self, message):
+        try:
+            pipeline = self._connection.pipeline(transaction=False)
+            pipeline.xack(message.queue, settings.redis_consumer_group, message.receipt)
+            # one group per stream, a settled entry is not needed anymore
+            pipeline.xdel(message.queue, message.receipt)
+            await pipeline.execute()
+        except Exception as e:
+            self._logger.error(output_messages.REDIS_ACK_KO, error=str(e))
+
+    async def dead_letter_stream_entry(self, redis_connection, queue, entry_id, fields, deliveries):
+        pipeline = redis_connection.pipeline(transaction=False)
+        pipeline.xadd(self.dead_letter_queue(queue), fields)
+        pipeline.xack(queue, settings.redis_consumer_group, entry_id)
+        pipeline.xdel(queue, entry_id)
+        await pipeline.execute()
+        record_error(error_type='dead_letter')
+        self._logger.error(output_messages.REDIS_DEAD_LETTER, queue=self.dead_letter_queue(queue), deliveries=deliveries)
+
+    async def get_group_lag(self, queue):
+        """Entries not yet delivered (lag) and delivered but not acknowledged (pending) for the stage group"""
+        if not queue:
+            queue = settings.redis_queue
+        try:
+            groups = await self._connection.xinfo_groups(queue)
+        except redis.exceptions.ResponseError:
+            return None
+        for group in groups:
+            name = group["name"]
+            if isinstance(name, bytes):
+                name = name.decode(settings.encoding)
+            if name == settings.redis_consumer_group:
+                return {
+                    "group": name,
+                    "consumers": group["consumers"],
+                    "pending": group["pending"],
+                    "lag": group.get("lag")
+                }
+        return None
+
+    async def get_queue_size(self, queue):
         if not queue:
             queue = settings.redis_queue
         redis = self._connection
-        return redis.llen(queue)
+        if self.is_stream():
+            return await redis.xlen(queue)
+        return await redis.llen(queue)
+
+    # backpressure: producers hold their messages while the target queue is over its high watermark
+    def get_watermarks(self, queue):
+        """(high, low) of a queue, REDIS_WATERMARKS entries win over the defaults, a high of 0 means unbounded"""
+        override = settings.redis_watermarks.get(queue, {})
+        high = override.get("high", settings.redis_high_watermark)
+        low = override.get("low", settings.redis_low_watermark)
+        return high, min(low, high)
+
+    async def get_capacity(self, queue):
+        """Messages the queue takes before its high watermark, 0 until it drains to the low one, None when unbounded"""
+        high, low = self.get_watermarks(queue)
+        if not high:
+            return None
+        depth = await self.get_queue_size(queue)
+        self._depths[queue] = depth
+        if queue in self._paused:
+            if depth > low:
+                return 0
+            self._paused.discard(queue)
+        if depth >= high:
+            self._paused.add(queue)
+        return max(high - depth, 0)
+
+    async def wait_for_capacity(self, queue):
+        """Holds the producer while the queue is full, every producer overshoots the high watermark by one message at most"""
+        high, low = self.get_watermarks(queue)
+        if not high or (queue not in self._paused and self._depths.get(queue, 0) < high):
+            return
+        if await self.get_capacity(queue):
+            return
+        started = time.monotonic()
+        self._logger.info(output_messages.REDIS_BACKPRESSURE_PAUSE, queue=queue, depth=self._depths[queue], high=high, low=low)
+        while True:
+            await asyncio.sleep(settings.redis_backpressure_interval)
+            # the message being worked on waits with the producer, its lease must outlast the pause
+            await self.extend_leases()
+            if await self.get_capacity(queue):
+                break
+        waited = time.monotonic() - started
+        record_backpressure(queue, waited)
+        self._logger.info(output_messages.REDIS_BACKPRESSURE_RESUME, queue=queue, depth=self._depths[queue], waited=round(waited, 1))
+
+    async def run_queue_monitor(self, queues):
+        """Samples the depth of the given queues (and their in-flight lists) into the queue_size gauge"""
+        if settings.redis_reliable and not self.is_stream():
+            queues = list(queues) + [self.processing_queue(queue) for queue in queues]
+        while True:
+            for queue in queues:
+                try:
+                    update_queue_size(queue, await self.get_queue_size(queue))
+                except Exception as e:
+                    self._logger.debug(output_messages.REDIS_QUEUE_SIZE_KO, queue=queue, error=str(e))
+            await asyncio.sleep(settings.metrics_queue_interval)
+
+    # multi-part files: one file message fans out into several documents/pages messages
+    def get_parts(self, message):
+        """Part fields of a message, to be carried over to the messages derived from it"""
+        if message.get("parts") is None:
+            return None
+        return {"part": message.get("part"), "parts": message.get("parts")}
+
+    async def complete_part(self, queue, message_id, part, parts):
+        """Records a stored part, True once every part of the file has been seen"""
+        if parts is None:
+            return True
+        key = f"{queue}{settings.redis_parts_suffix}:{message_id}"
+        try:
+            # a set keeps redeliveries of the same part from counting twice
+            pipeline = self._connection.pipeline(transaction=False)
+            pipeline.sadd(key, part)
+            pipeline.scard(key)
+            pipeline.expire(key, settings.redis_parts_ttl)
+            _, seen, _ = await pipeline.execute()
+            if seen < parts:
+                return False
+            await self._connection.delete(key)
+            return True
+        except Exception as e:
+            self._logger.error(output_messages.REDIS_PARTS_KO, error=str(e), message_id=message_id)
+            return False
+
+    # checkpoints of long running jobs, so a restart resumes instead of starting over
+    async def get_checkpoint(self, key):
+        checkpoint = await self._connection.get(key)
+        return json.loads(checkpoint) if checkpoint else None
+
+    async def set_checkpoint(self, key, checkpoint):
+        await self._connection.set(key, json.dumps(checkpoint))
+
+    async def clear_checkpoint(self, key):
+        await self._connection.delete(key)
+
+    def encode_message(self, data):
+        if settings.redis_envelope == settings.redis_envelope_json:
+            # legacy writer, bytes fields travel as base64 strings
+            return json.dumps({
+                key: base64.b64encode(value).decode(settings.encoding) if isinstance(value, bytes) else value
+                for key, value in data.items()
+            })
+        return ENVELOPE_MAGIC + bytes([ENVELOPE_VERSION]) + msgpack.packb(data, use_bin_type=True)
 
     def decode_message(self, message):
         try:
-            _, raw_data = message
-            decoded_message = json.loads(raw_data)
+            raw_data = message[1]
+            if isinstance(raw_data, bytes) and raw_data.startswith(ENVELOPE_MAGIC):
+                version = raw_data[len(ENVELOPE_MAGIC)]
+                if version != ENVELOPE_VERSION:
+                    record_error(error_type='invalid_envelope')
+                    self._logger.error(output_messages.REDIS_ENVELOPE_KO, version=version)
+                    return None
+                decoded_message = msgpack.unpackb(raw_data[len(ENVELOPE_MAGIC) + 1:], raw=False)
+            else:
+                # messages written before the binary envelope
+                decoded_message = json.loads(raw_data)
             self._logger.debug(output_messages.REDIS_DECODED_OK)
             return decoded_message
-        except json.JSONDecodeError as e:
+        except (json.JSONDecodeError, msgpack.UnpackException, ValueError) as e:
             record_error(error_type='invalid_json')
             self._logger.error(output_messages.REDIS_DECODED_KO, error=str(e))
             return None
 
+    def get_content(self, message, content_field=None):
+        """Raw bytes of the message content, whichever envelope carried it"""
+        content = message.get(content_field or settings.redis_content_field)
+        if content is None or isinstance(content, bytes):
+            return content
+        return base64.b64decode(content)
+
+    def serialize_documents(self, documents):
+        return json.dumps([
+            doc if isinstance(doc, dict) else doc.dict() if hasattr(doc, "dict") else str(doc)
+            for doc in documents
+        ]).encode(settings.encoding)
+
+    def deserialize_documents(self, content):
+        """Document dicts (or plain strings) from a serialized documents content"""
+        return json.loads(content.decode(settings.encoding))
+
     def is_valid_message(self, message: Dict[str, Any], required_fields: Dict[str, Any]) -> bool:
         """Validate message structure and content"""
 
+        # claim-check messages carry a blob reference instead of the content
+        blob_reference = message.get(settings.blob_field)
+
         for field in required_fields:
+            if field == settings.redis_content_field and blob_reference:
+                continue
             if field not in message:
                 self._logger.error(f"{output_messages.REDIS_MSG_FIELD_KO}: {field} ")
                 return False
             
+        if blob_reference:
+            return True
+
         if not message[settings.redis_content_field]:
             self._logger.error(f"{output_messages.REDIS_MSG_CONTENT_EMPTY}")
             return False
         
         try:
-            base64.b64decode(message[settings.redis_content_field])
+            if not isinstance(message[settings.redis_content_field], bytes):
+                base64.b64decode(message[settings.redis_content_field])
         except Exception as e:
             self._logger.error(f"{output_messages.REDIS_MSG_FORMAT_KO}: {str(e)}")
             return False
 
         return True
 
-    def generate_message(self, id, encoded_content, filename, content_field, content_type, content_mime):
-        if not encoded_content:
+    def generate_message(self, id, content, filename, content_field, content_type, content_mime, extra=None, trace=None):
+        if not content and not (extra and extra.get(settings.blob_field)):
             self._logger.error("[Colossus hit] No payload, skipping package ", filename=filename)
             return None
 
@@ -148,11 +656,19 @@ class RedisGateway():
 
         data = {
             'id': message_id,
-            content_field: encoded_content,
+            content_field: content,
             content_type: content_mime
         }
 
         if filename:
             data['filename'] = filename
+
+        if extra:
+            data.update(extra)
+
+        # trace context of the stage sending it, the next stage continues the same trace
+        trace = trace or outgoing_trace()
+        if trace and settings.trace_enabled:
+            data[settings.trace_field] = dict(trace)
         
         return data
\ No newline at end of file
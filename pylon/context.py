@@ -1,23 +1,34 @@
-from pylon import RedisGateway, QdrantGateway, OllamaGateway
+from pylon import RedisGateway, QdrantGateway, AsyncQdrantGateway, CollectionRouter, OllamaGateway, BlobGateway, Tracer
+from pathlib import Path
 import structlog
+import sys
 
 class ApplicationContext:
-    def __init__(self, redis_gateway, qdrant_gateway, ollama_gateway, logger):
+    def __init__(self, redis_gateway, qdrant_gateway, ollama_gateway, logger, async_qdrant_gateway=None, blob_gateway=None, tracer=None):
         self.redis = redis_gateway
         self.qdrant = qdrant_gateway
+        self.async_qdrant = async_qdrant_gateway
         self.ollama = ollama_gateway
+        self.blob = blob_gateway
         self.logger = logger
+        self.tracer = tracer
+        # questions may target other collections, each gets its own gateways over the same clients
+        self.collections = CollectionRouter(qdrant_gateway, async_qdrant_gateway)
 
     @classmethod
-    async def create(cls):
+    async def create(cls, service_name=None):
         redis = await RedisGateway.create()
         qdrant = QdrantGateway()
+        async_qdrant = AsyncQdrantGateway()
         ollama = OllamaGateway()
+        blob = BlobGateway()
+        tracer = Tracer(service_name or Path(sys.argv[0]).stem)
 
         qdrant.initialize_client()
-        qdrant.recreate_collection()
+        qdrant.recreate_collection(ollama.get_embedding_model())
         qdrant.create_payload_index()
+        async_qdrant.initialize_client()
 
         logger = structlog.get_logger()
 
-        return cls(redis, qdrant, ollama, logger)
\ No newline at end of file
+        return cls(redis, qdrant, ollama, logger, async_qdrant, blob, tracer)
\ No newline at end of file
@@ -3,6 +3,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 from pathlib import Path
+from typing import Any, Dict
 
 class ApplicationSettings(BaseSettings):
     # Mothership
@@ -21,7 +22,9 @@ class ApplicationSettings(BaseSettings):
     embedder_huggingface: str = Field(..., env="EMBEDDER_HUGGINGFACE")
     current_embedder_name: str = Field(..., env="CURRENT_EMBEDDER_NAME")
     prompt_rules: str = Field(..., env="PROMPT_RULES")
+    prompt_rules_open: str = Field(..., env="PROMPT_RULES_OPEN")
     prompt_response_field: str = Field(..., env="PROMPT_RESPONSE_FIELD")
+    blocking_executor_workers: int = Field(..., env="BLOCKING_EXECUTOR_WORKERS")
     
 
     # Qdrant
@@ -33,6 +36,44 @@ class ApplicationSettings(BaseSettings):
     collection_name: str = Field(..., env="COLLECTION_NAME")
     vector_dimension: int = Field(..., env="VECTOR_DIMENSION")
     index_field: str = Field(..., env="INDEX_FIELD")
+    collection_version_separator: str = Field(..., env="COLLECTION_VERSION_SEPARATOR")
+    retrieval_mode: str = Field(..., env="RETRIEVAL_MODE")
+    retrieval_dense: str = Field(..., env="RETRIEVAL_DENSE")
+    retrieval_hybrid: str = Field(..., env="RETRIEVAL_HYBRID")
+    hybrid_prefetch: int = Field(..., env="HYBRID_PREFETCH")
+    hybrid_min_term_length: int = Field(..., env="HYBRID_MIN_TERM_LENGTH")
+    rrf_k: int = Field(..., env="RRF_K")
+    # collections a request may name, each with optional search overrides (max_chunks, score_threshold, hnsw_ef, retrieval_mode, exact)
+    qdrant_collections: Dict[str, Dict[str, Any]] = Field(..., env="QDRANT_COLLECTIONS")
+    # files message field carrying the target collection down to probe
+    collection_field: str = Field(..., env="COLLECTION_FIELD")
+
+    # Reranking (arbiter) - local cross-encoder over the retrieved candidates
+    rerank_enabled: bool = Field(..., env="RERANK_ENABLED")
+    rerank_model: str = Field(..., env="RERANK_MODEL")
+    rerank_candidates: int = Field(..., env="RERANK_CANDIDATES")
+    rerank_top_k: int = Field(..., env="RERANK_TOP_K")
+    rerank_batch_size: int = Field(..., env="RERANK_BATCH_SIZE")
+    rerank_max_length: int = Field(..., env="RERANK_MAX_LENGTH")
+    rerank_cache_size: int = Field(..., env="RERANK_CACHE_SIZE")
+    qdrant_retrieve_batch: int = Field(..., env="QDRANT_RETRIEVE_BATCH")
+
+    # Collection tuning (warp prism)
+    qdrant_quantization: str = Field(..., env="QDRANT_QUANTIZATION")
+    qdrant_quantization_scalar: str = Field(..., env="QDRANT_QUANTIZATION_SCALAR")
+    qdrant_quantization_product: str = Field(..., env="QDRANT_QUANTIZATION_PRODUCT")
+    qdrant_quantization_always_ram: bool = Field(..., env="QDRANT_QUANTIZATION_ALWAYS_RAM")
+    qdrant_scalar_quantile: float = Field(..., env="QDRANT_SCALAR_QUANTILE")
+    qdrant_product_compression: str = Field(..., env="QDRANT_PRODUCT_COMPRESSION")
+    qdrant_rescore: bool = Field(..., env="QDRANT_RESCORE")
+    qdrant_oversampling: float = Field(..., env="QDRANT_OVERSAMPLING")
+    qdrant_on_disk_vectors: bool = Field(..., env="QDRANT_ON_DISK_VECTORS")
+    qdrant_on_disk_payload: bool = Field(..., env="QDRANT_ON_DISK_PAYLOAD")
+    qdrant_hnsw_m: int = Field(..., env="QDRANT_HNSW_M")
+    qdrant_hnsw_ef_construct: int = Field(..., env="QDRANT_HNSW_EF_CONSTRUCT")
+    qdrant_hnsw_on_disk: bool = Field(..., env="QDRANT_HNSW_ON_DISK")
+    qdrant_with_vectors: bool = Field(..., env="QDRANT_WITH_VECTORS")
+    qdrant_tune_existing: bool = Field(..., env="QDRANT_TUNE_EXISTING")
 
     # Redis
     redis_host: str = Field(..., env="REDIS_HOST")
@@ -51,6 +92,46 @@ class ApplicationSettings(BaseSettings):
     redis_content_field: str = Field(..., env="REDIS_CONTENT_FIELD")
     redis_content_type: str = Field(..., env="REDIS_CONTENT_TYPE")
     redis_content_mime: str = Field(..., env="REDIS_CONTENT_MIME")
+    redis_transport: str = Field(..., env="REDIS_TRANSPORT")
+    redis_transport_list: str = Field(..., env="REDIS_TRANSPORT_LIST")
+    redis_transport_stream: str = Field(..., env="REDIS_TRANSPORT_STREAM")
+    redis_consumer_group: str = Field(..., env="REDIS_CONSUMER_GROUP")
+    redis_consumer_name: str = Field(..., env="REDIS_CONSUMER_NAME")
+    redis_stream_field: str = Field(..., env="REDIS_STREAM_FIELD")
+    redis_envelope: str = Field(..., env="REDIS_ENVELOPE")
+    redis_envelope_msgpack: str = Field(..., env="REDIS_ENVELOPE_MSGPACK")
+    redis_envelope_json: str = Field(..., env="REDIS_ENVELOPE_JSON")
+    redis_reliable: bool = Field(..., env="REDIS_RELIABLE")
+    redis_visibility_timeout: int = Field(..., env="REDIS_VISIBILITY_TIMEOUT")
+    redis_max_deliveries: int = Field(..., env="REDIS_MAX_DELIVERIES")
+    redis_reaper_interval: int = Field(..., env="REDIS_REAPER_INTERVAL")
+    redis_processing_suffix: str = Field(..., env="REDIS_PROCESSING_SUFFIX")
+    redis_dead_letter_suffix: str = Field(..., env="REDIS_DEAD_LETTER_SUFFIX")
+    redis_parts_suffix: str = Field(..., env="REDIS_PARTS_SUFFIX")
+    redis_parts_ttl: int = Field(..., env="REDIS_PARTS_TTL")
+    redis_high_watermark: int = Field(..., env="REDIS_HIGH_WATERMARK")
+    redis_low_watermark: int = Field(..., env="REDIS_LOW_WATERMARK")
+    redis_watermarks: Dict[str, Dict[str, int]] = Field(..., env="REDIS_WATERMARKS")
+    redis_backpressure_interval: float = Field(..., env="REDIS_BACKPRESSURE_INTERVAL")
+
+    # Chunking strategies (reaver) - semantic, word or markdown
+    chunking_strategy: str = Field(..., env="CHUNKING_STRATEGY")
+    chunking_by_extension: Dict[str, str] = Field(..., env="CHUNKING_BY_EXTENSION")
+    chunking_field: str = Field(..., env="CHUNKING_FIELD")
+    chunk_words: int = Field(..., env="CHUNK_WORDS")
+    chunk_overlap: int = Field(..., env="CHUNK_OVERLAP")
+
+    # Blob store (shuttle) - claim-check for large files
+    blob_folder: str = Field(..., env="BLOB_FOLDER")
+    blob_threshold: int = Field(..., env="BLOB_THRESHOLD")
+    blob_field: str = Field(..., env="BLOB_FIELD")
+    blob_chunk_size: int = Field(..., env="BLOB_CHUNK_SIZE")
+
+    # Embedding cache (shield battery)
+    embedding_cache_enabled: bool = Field(..., env="EMBEDDING_CACHE_ENABLED")
+    embedding_cache_max_bytes: int = Field(..., env="EMBEDDING_CACHE_MAX_BYTES")
+    embedding_cache_ttl: int = Field(..., env="EMBEDDING_CACHE_TTL")
+    embedding_cache_prefix: str = Field(..., env="EMBEDDING_CACHE_PREFIX")
 
     # Oracle
     node_image: str = Field(..., env="NODE_IMAGE")
@@ -65,6 +146,21 @@ class ApplicationSettings(BaseSettings):
     mongodb_host: str = Field(..., env="MONGODB_HOST")
     mongodb_database: str = Field(..., env="MONGODB_DATABASE")
 
+    # Metrics (phoenix) - per worker /metrics port, 0 disables it
+    metrics_port: int = Field(..., env="METRICS_PORT")
+    metrics_queue_interval: int = Field(..., env="METRICS_QUEUE_INTERVAL")
+    loop_lag_interval: float = Field(..., env="LOOP_LAG_INTERVAL")
+
+    # Tracing (revelation) - trace context in the envelope, spans exported as OTLP json lines
+    trace_enabled: bool = Field(..., env="TRACE_ENABLED")
+    trace_field: str = Field(..., env="TRACE_FIELD")
+    trace_export_folder: str = Field(..., env="TRACE_EXPORT_FOLDER")
+    trace_export_batch: int = Field(..., env="TRACE_EXPORT_BATCH")
+    trace_export_interval: float = Field(..., env="TRACE_EXPORT_INTERVAL")
+    trace_export_max_bytes: int = Field(..., env="TRACE_EXPORT_MAX_BYTES")
+    trace_export_max_age: float = Field(..., env="TRACE_EXPORT_MAX_AGE")
+    trace_export_backups: int = Field(..., env="TRACE_EXPORT_BACKUPS")
+
     # General
     encoding: str = Field(..., env="ENCODING")
     async_timeout: int = Field(..., env="ASYNC_TIMEOUT")
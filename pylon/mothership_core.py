@@ -1,5 +1,11 @@
 from .immortal import settings
 from .adept import output_messages
+from .shield_battery import EmbeddingCache, CachedEmbeddings
+from .arbiter import CrossEncoderReranker
+from .reaver import ChunkingRegistry, SemanticStrategy, WordWindowStrategy, MarkdownStrategy
+from .void_ray import BoundedExecutor, has_native_async
+from .phoenix import time_model_call, record_model_call
+from .time_warp import timed, add_timing
 import structlog
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_huggingface import HuggingFaceEmbeddings
@@ -12,33 +18,224 @@ from langchain.prompts import PromptTemplate
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import BaseLLM
 from dataclasses import dataclass
 from typing import List, Any
 from datetime import datetime
 import warnings
 import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from langchain.schema import BaseRetriever
+from langchain_core.callbacks import BaseCallbackHandler
+import time
 from pydantic import BaseModel
 
+# Embeddings wrapper timing the calls that reach the model, it sits under the cache so hits are not counted
+class TimedEmbeddings(Embeddings):
+
+    def __init__(self, embedder, model_name, executor=None):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.executor = executor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with time_model_call("embed", self.model_name):
+            return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with time_model_call("embed_query", self.model_name):
+            return self.embedder.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        with time_model_call("embed", self.model_name):
+            if has_native_async(self.embedder, "aembed_documents", Embeddings) or not self.executor:
+                return await self.embedder.aembed_documents(texts)
+            return await self.executor.run(self.embedder.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        with time_model_call("embed_query", self.model_name):
+            if has_native_async(self.embedder, "aembed_query", Embeddings) or not self.executor:
+                return await self.embedder.aembed_query(text)
+            return await self.executor.run(self.embedder.embed_query, text)
+
+# Times every LLM run, chains and streams included, through langchain callbacks
+class ModelCallMetrics(BaseCallbackHandler):
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self._started = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def finish(self, run_id):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            seconds = time.perf_counter() - started
+            record_model_call("generate", self.model_name, seconds)
+            add_timing("generate", seconds)
+
+# Prompt template adding its formatting time to the request timings
+class TimedPromptTemplate(PromptTemplate):
+
+    def format_prompt(self, **kwargs):
+        with timed("prompt"):
+            return super().format_prompt(**kwargs)
+
+    async def aformat_prompt(self, **kwargs):
+        with timed("prompt"):
+            return await super().aformat_prompt(**kwargs)
+
+# chunks the current request wants in its prompt, chains are shared between requests so it cannot live on the retriever
+requested_chunks = ContextVar("requested_chunks", default=None)
+
+@contextmanager
+def chunk_limit(max_chunks):
+    token = requested_chunks.set(max_chunks)
+    try:
+        yield
+    finally:
+        requested_chunks.reset(token)
+
+# the question alone, the chain input also carries the history and hybrid retrieval must not match its words
+requested_question = ContextVar("requested_question", default=None)
+
+@contextmanager
+def lexical_question(question):
+    token = requested_question.set(question)
+    try:
+        yield
+    finally:
+        requested_question.reset(token)
+
+def cap_chunks(results, max_chunks):
+    return results[:max_chunks] if max_chunks else results
+
 # Minimal wrapper to make gateway compatible with LangChain
 class QdrantRetriever(BaseRetriever, BaseModel):
     qdrant: Any
     embedder: Any
+    async_qdrant: Any = None
+    executor: Any = None
+    reranker: Any = None
+
+    def get_limit(self):
+        # with a reranker qdrant over-fetches and the cross-encoder keeps the best few
+        max_chunks = requested_chunks.get()
+        if self.reranker:
+            return max(self.reranker.candidates, max_chunks or 0)
+        return max_chunks
 
     def get_relevant_documents(self, query: str) -> List[Document]:
-        vector = self.embedder.embed_query(query)
-        results = self.qdrant.get_relevant_documents(vector, query)
+        with timed("embed"):
+            vector = self.embedder.embed_query(query)
+        # the history prefix only steers the embedding, lexical terms and the cross-encoder get the question itself
+        question = requested_question.get() or query
+        with timed("search"):
+            results = self.qdrant.get_relevant_documents(vector, question, limit=self.get_limit())
+            if self.reranker:
+                results = self.reranker.select(question, results)
+        results = cap_chunks(results, requested_chunks.get())
+        return [Document(page_content=hit.payload[settings.index_field]) for hit in results]
+
+    async def _aget_relevant_documents(self, query: str) -> List[Document]:
+        with timed("embed"):
+            if has_native_async(self.embedder, "aembed_query", Embeddings) or not self.executor:
+                vector = await self.embedder.aembed_query(query)
+            else:
+                vector = await self.executor.run(self.embedder.embed_query, query)
+        limit = self.get_limit()
+        question = requested_question.get() or query
+        with timed("search"):
+            if self.async_qdrant:
+                results = await self.async_qdrant.get_relevant_documents(vector, question, limit=limit)
+            elif self.executor:
+                results = await self.executor.run(self.qdrant.get_relevant_documents, vector, question, limit=limit)
+            else:
+                results = self.qdrant.get_relevant_documents(vector, question, limit=limit)
+            if self.reranker:
+                results = await self.reranker.aselect(question, results, self.executor)
+        results = cap_chunks(results, requested_chunks.get())
         return [Document(page_content=hit.payload[settings.index_field]) for hit in results]
 
+# The pieces of a built retrieval chain, kept together so they are built once
+@dataclass
+class QAChain:
+    retriever: Any
+    prompt: Any
+    combine_documents_chain: Any
+    chain: Any
+
+# Keeps one QA chain per collection and prompt rules, rebuilt only when its configuration changes
+class QAChainRegistry:
+    def __init__(self):
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def get_configuration(self, gateways):
+        """Everything a built chain depends on, a change in any of them forces a rebuild"""
+        return (
+            tuple(id(gateway) for gateway in gateways),
+            settings.model_name,
+            settings.base_url,
+            settings.current_embedder_name,
+            settings.embedder_model_name,
+            settings.prompt_rules,
+            settings.prompt_rules_open,
+            settings.max_chunks,
+            settings.model_score,
+            settings.model_hnsw,
+            settings.retrieval_mode,
+            settings.rerank_enabled,
+            settings.rerank_model,
+            settings.rerank_candidates,
+            settings.rerank_top_k
+        )
+
+    def get(self, collection, gateways, builder):
+        configuration = self.get_configuration(gateways)
+        with self._lock:
+            entry = self._chains.get(collection)
+            if entry and entry[0] == configuration:
+                return entry[1]
+            qa_chain = builder()
+            self._chains[collection] = (configuration, qa_chain)
+            return qa_chain
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+
 # Embedder factory as an attempt to support multiple embedders
 class EmbedderFactory:
+    # embedders added at runtime (e.g. the benchmark stand-ins), name -> (builder, model name)
+    _registry = {}
+
     def __init__(self):
         self._logger = None
         logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
+    @classmethod
+    def register(cls, embedder_name, builder, model_name=None):
+        """Makes CURRENT_EMBEDDER_NAME=embedder_name build its embedder with builder()"""
+        cls._registry[embedder_name] = (builder, model_name or embedder_name)
+
     def get_embedder(self, embedder_name):
         if not embedder_name:
             return None
+
+        if embedder_name in self._registry:
+            builder, _ = self._registry[embedder_name]
+            return builder()
         
         if embedder_name == settings.embedder_ollama:
             return OllamaEmbeddings(model=settings.model_name, base_url=settings.base_url)
@@ -46,6 +243,30 @@ class EmbedderFactory:
         if embedder_name == settings.embedder_huggingface:
             return HuggingFaceEmbeddings(model_name=settings.embedder_model_name)
 
+    def get_model_name(self, embedder_name):
+        """Name of the model behind an embedder, used to key cached vectors"""
+        if embedder_name in self._registry:
+            return self._registry[embedder_name][1]
+        if embedder_name == settings.embedder_ollama:
+            return settings.model_name
+        if embedder_name == settings.embedder_huggingface:
+            return settings.embedder_model_name
+        return embedder_name
+
+# LLM factory, models registered by name (e.g. the benchmark stand-ins) take the place of ollama
+class LLMFactory:
+    _registry = {}
+
+    @classmethod
+    def register(cls, model_name, builder):
+        """Makes MODEL_NAME=model_name build its LLM with builder(callbacks)"""
+        cls._registry[model_name] = builder
+
+    def get_llm(self, model_name, callbacks=None):
+        if model_name in self._registry:
+            return self._registry[model_name](callbacks)
+        return OllamaLLM(model=model_name, base_url=settings.base_url, callbacks=callbacks)
+
 # The reasoning class to hold RAG logic
 class OllamaGateway:
 
@@ -54,15 +275,37 @@ class OllamaGateway:
         self._embedder_factory = None
         self._embedder = None
         self._splitter = None
+        self._chunkers = None
+        self._reranker = None
         self._llm = None
+        self._qa_chains = QAChainRegistry()
+        self._executor = BoundedExecutor(max_workers=settings.blocking_executor_workers)
         logging.getLogger("pdfminer").setLevel(logging.ERROR)
 
     def initialize_client(self):
         self._logger = structlog.get_logger()
         self._embedder_factory = EmbedderFactory()
         self._embedder = self._embedder_factory.get_embedder(settings.current_embedder_name)
+        model_name = self._embedder_factory.get_model_name(settings.current_embedder_name)
+        if self._embedder:
+            self._embedder = TimedEmbeddings(self._embedder, model_name, executor=self._executor)
+        if self._embedder and settings.embedding_cache_enabled:
+            self._embedder = CachedEmbeddings(
+                embedder=self._embedder,
+                cache=EmbeddingCache(),
+                model_name=model_name,
+                executor=self._executor
+            )
         self._splitter = SemanticChunker(self._embedder)
-        self._llm = OllamaLLM(model=settings.model_name, base_url=settings.base_url)
+        self._chunkers = ChunkingRegistry(default=settings.chunking_strategy, by_extension=settings.chunking_by_extension)
+        self._chunkers.register(SemanticStrategy(self._splitter))
+        self._chunkers.register(WordWindowStrategy(settings.chunk_words, settings.chunk_overlap))
+        self._chunkers.register(MarkdownStrategy(settings.chunk_words, settings.chunk_overlap))
+        self._llm = LLMFactory().get_llm(settings.model_name, callbacks=[ModelCallMetrics(settings.model_name)])
+        # the model itself is only loaded on the first question
+        self._reranker = CrossEncoderReranker() if settings.rerank_enabled else None
+        # built chains hold the previous embedder and llm
+        self._qa_chains.clear()
 
     # the usual getters
     def get_embedder(self):
@@ -74,6 +317,12 @@ class OllamaGateway:
     def get_llm(self):
         return self._llm
 
+    def get_embedding_model(self):
+        """Embedder and model behind the vectors, vectors from another model cannot be mixed in"""
+        # only names are needed, no embedder is loaded for this
+        factory = self._embedder_factory or EmbedderFactory()
+        return f"{settings.current_embedder_name}/{factory.get_model_name(settings.current_embedder_name)}"
+
     # Common methods
     def split_into_chunks(self, documents):
         try:
@@ -89,6 +338,25 @@ class OllamaGateway:
             self._logger.error(output_messages.CHUNKER_DONE, error=str(e))
             raise
 
+    def get_chunkers(self):
+        if not self._chunkers:
+            self.initialize_client()
+        return self._chunkers
+
+    def chunk_documents(self, documents, strategy=None, filename=None):
+        """Chunks from the requested strategy, else the one for the file extension, else the default"""
+        try:
+            if not documents:
+                return None
+            chunker = self.get_chunkers().resolve(strategy, filename)
+            self._logger.debug(output_messages.CHUNKING_STRATEGY, strategy=chunker.name, filename=filename)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return chunker.chunk(documents)
+        except Exception as e:
+            self._logger.error(output_messages.CHUNKER_DONE, error=str(e))
+            raise
+
     def generate_embeddings(self, texts):
         try:
             if not texts:
@@ -111,15 +379,63 @@ class OllamaGateway:
             self._logger.error(output_messages.EMBEDDER_EXCEPTION, error=str(e))
             raise
 
+    # async twins, falling back to the bounded executor when a provider has no async support
+    async def aembed_documents(self, texts):
+        if has_native_async(self._embedder, "aembed_documents", Embeddings):
+            return await self._embedder.aembed_documents(texts)
+        return await self._executor.run(self._embedder.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        if has_native_async(self._embedder, "aembed_query", Embeddings):
+            return await self._embedder.aembed_query(text)
+        return await self._executor.run(self._embedder.embed_query, text)
+
+    async def ainvoke_llm(self, prompt):
+        if has_native_async(self._llm, "_agenerate", BaseLLM):
+            return await self._llm.ainvoke(prompt)
+        return await self._executor.run(self._llm.invoke, prompt)
+
+    async def agenerate_embeddings(self, texts):
+        try:
+            if not texts:
+                return None
+            if not self._embedder:
+                self.initialize_client()
+            return await self.aembed_documents(texts)
+        except Exception as e:
+            self._logger.error(output_messages.EMBEDDER_EXCEPTION, error=str(e))
+            raise
+
+    async def aget_vectors(self, documents):
+        try:
+            if not documents:
+                return None
+            if not self._embedder:
+                self.initialize_client()
+            return await self.aembed_documents(documents)
+        except Exception as e:
+            self._logger.error(output_messages.EMBEDDER_EXCEPTION, error=str(e))
+            raise
+
     # chained questions functions
-    def get_retriever(self, qdrant):
+    def get_retriever(self, qdrant, async_qdrant=None):
         if not qdrant or not self._embedder:
             return None
-        return QdrantRetriever(qdrant=qdrant, embedder=self._embedder)
-
-    def get_prompt_template(self):
+        return QdrantRetriever(
+            qdrant=qdrant,
+            embedder=self._embedder,
+            async_qdrant=async_qdrant,
+            executor=self._executor,
+            reranker=self._reranker
+        )
+
+    def get_prompt_rules(self, strict_context=True):
+        """Context only rules, or rules letting the model answer past the context"""
+        return settings.prompt_rules if strict_context else settings.prompt_rules_open
+
+    def get_prompt_template(self, strict_context=True):
         return f"""
-{settings.prompt_rules}
+{self.get_prompt_rules(strict_context)}
 
 ======== CONTEXT ========
 {{context}}
@@ -135,27 +451,37 @@ Answer (copy exactly as written above):
         if not self._llm:
             self.initialize_client()
 
-        prompt = PromptTemplate.from_template(prompt_template)
+        prompt = TimedPromptTemplate.from_template(prompt_template)
         self._logger.error("[Mothership] DEBUG PROMPT ", prompt=prompt)
         #llm_chain = LLMChain(llm=self._llm, prompt=prompt)
         combine_documents_chain = create_stuff_documents_chain(self._llm, prompt)
 
         qa_chain = create_retrieval_chain(retriever, combine_documents_chain)
 
-        return qa_chain
+        return QAChain(
+            retriever=retriever,
+            prompt=prompt,
+            combine_documents_chain=combine_documents_chain,
+            chain=qa_chain
+        )
 
-    def ask_question(self, question: str, qdrant, history: List[dict] = None):
+    def get_qa_chain(self, qdrant, collection=None, async_qdrant=None, strict_context=True):
+        """Returns the QA chain for a collection, building it on first use only."""
         if not self._llm or not self._embedder:
             self.initialize_client()
-        # Build retriever with inited embedder for qdrant
-        retriever = self.get_retriever(qdrant=qdrant)
-        if not retriever:
-            raise ValueError("Retriever could not be initialized")
-        # Build QA chain using custom prompt
-        prompt_template = self.get_prompt_template()
 
-        qa_chain = self.build_qa_chain(retriever, prompt_template=prompt_template)
+        def build():
+            # Build retriever with inited embedder for qdrant
+            retriever = self.get_retriever(qdrant=qdrant, async_qdrant=async_qdrant)
+            if not retriever:
+                raise ValueError("Retriever could not be initialized")
+            # Build QA chain using custom prompt
+            return self.build_qa_chain(retriever, prompt_template=self.get_prompt_template(strict_context))
+
+        return self._qa_chains.get((collection or settings.collection_name, strict_context), (qdrant, async_qdrant), build)
 
+    def build_combined_input(self, question: str, history: List[dict] = None):
+        """Prepends the conversation history to the question"""
         history_text = ""
         if history:
             for turn in history:
@@ -164,13 +490,19 @@ Answer (copy exactly as written above):
                 if role and content:
                     history_text += f"{role.title()}: {content}\n"
 
-        combined_input = f"{history_text}\nUser: {question}"
+        return f"{history_text}\nUser: {question}"
+
+    def ask_question(self, question: str, qdrant, history: List[dict] = None, collection=None, max_chunks=None, strict_context=True):
+        qa_chain = self.get_qa_chain(qdrant=qdrant, collection=collection, strict_context=strict_context).chain
+        combined_input = self.build_combined_input(question, history)
 
         # Run chain
         try:
-            result = qa_chain.invoke({"input": combined_input})
+            with chunk_limit(max_chunks), lexical_question(question):
+                result = qa_chain.invoke({"input": combined_input})
         except Exception as e:
             self._logger.error("[Mothership] DEBUG ", error=str(e))
+            raise
         self._logger.warning("[Mothership] DEBUG ", result=result)
 
         context_chunks = [doc.page_content for doc in result.get("context", [])]
@@ -186,11 +518,84 @@ Answer (copy exactly as written above):
             "timestamp": datetime.utcnow()
         }
 
+    async def aask_question(self, question: str, qdrant, history: List[dict] = None, async_qdrant=None, collection=None, max_chunks=None, strict_context=True):
+        qa_chain = self.get_qa_chain(qdrant=qdrant, collection=collection, async_qdrant=async_qdrant, strict_context=strict_context).chain
+        combined_input = self.build_combined_input(question, history)
+
+        # Run chain without holding the event loop
+        try:
+            with chunk_limit(max_chunks), lexical_question(question):
+                result = await qa_chain.ainvoke({"input": combined_input})
+        except Exception as e:
+            self._logger.error(output_messages.API_QUESTION_KO, error=str(e))
+            raise
+
+        context_chunks = [doc.page_content for doc in result.get("context", [])]
+        answer = result.get("answer", "").strip()
+        self._logger.debug(output_messages.API_PROMPT, answer=answer, context_chunks=len(context_chunks))
+
+        return {
+            "answer": answer,
+            "context_chunks": context_chunks,
+            "model": settings.model_name,
+            "timestamp": datetime.utcnow()
+        }
+
+    async def astream_question(self, question: str, qdrant, history: List[dict] = None, async_qdrant=None, collection=None, max_chunks=None, strict_context=True):
+        """Async twin of stream_question."""
+        qa_chain = self.get_qa_chain(qdrant=qdrant, collection=collection, async_qdrant=async_qdrant, strict_context=strict_context)
+        combined_input = self.build_combined_input(question, history)
+
+        # set and reset around the retrieval only, a generator may resume in another context
+        with chunk_limit(max_chunks), lexical_question(question):
+            context = await qa_chain.retriever.ainvoke(combined_input)
+        context_chunks = [doc.page_content for doc in context]
+        yield "context", context_chunks
+
+        answer = ""
+        async for token in qa_chain.combine_documents_chain.astream({"input": combined_input, "context": context}):
+            answer += token
+            yield "token", token
+
+        yield "done", {
+            "answer": answer.strip(),
+            "context_chunks": context_chunks,
+            "model": settings.model_name,
+            "timestamp": datetime.utcnow()
+        }
+
+    def stream_question(self, question: str, qdrant, history: List[dict] = None, collection=None, max_chunks=None, strict_context=True):
+        """Yields (event, data) pairs: the retrieved context first, then answer tokens as they are generated."""
+        qa_chain = self.get_qa_chain(qdrant=qdrant, collection=collection, strict_context=strict_context)
+        combined_input = self.build_combined_input(question, history)
+
+        with chunk_limit(max_chunks), lexical_question(question):
+            context = qa_chain.retriever.invoke(combined_input)
+        context_chunks = [doc.page_content for doc in context]
+        yield "context", context_chunks
+
+        answer = ""
+        for token in qa_chain.combine_documents_chain.stream({"input": combined_input, "context": context}):
+            answer += token
+            yield "token", token
+
+        yield "done", {
+            "answer": answer.strip(),
+            "context_chunks": context_chunks,
+            "model": settings.model_name,
+            "timestamp": datetime.utcnow()
+        }
+
     # single shot question functions
+    def get_retrieval_limit(self, max_chunks=None):
+        if self._reranker:
+            return max(self._reranker.candidates, max_chunks or 0)
+        return max_chunks
+
     def generate_query_vector(self, query_text):
         return self._splitter_embedder.embed_query(query_text)
 
-    def build_augmented_prompt(self, question: str, chunks: List[str]) -> str:
+    def build_augmented_prompt(self, question: str, chunks: List[str], strict_context=True) -> str:
         """Build context-aware prompt"""
         # Step 3: Combine document chunks into context string
         #context = "\n".join([doc.page_content for doc in chunks if doc.page_content.strip()])
@@ -198,7 +603,7 @@ Answer (copy exactly as written above):
 
         # Step 4: Build prompt manually
         prompt = f"""
-        {settings.prompt_rules} \n
+        {self.get_prompt_rules(strict_context)} \n
         Context: \n
         {context} \n
         Question: \n
@@ -207,17 +612,23 @@ Answer (copy exactly as written above):
 
         return prompt
 
-    def ask_single_question(self, question: str, qdrant):
+    def ask_single_question(self, question: str, qdrant, max_chunks=None, strict_context=True):
         try:
             # Step 1: Get vector
-            query_vector = self.generate_query_vector(question)
+            with timed("embed"):
+                query_vector = self.generate_query_vector(question)
 
             # Step 2: Get relevant documents using Qdrant
-            results = qdrant.get_relevant_documents(query_vector, question)
+            with timed("search"):
+                results = qdrant.get_relevant_documents(query_vector, question, limit=self.get_retrieval_limit(max_chunks))
+                if self._reranker:
+                    results = self._reranker.select(question, results)
+            results = cap_chunks(results, max_chunks)
             relevant_docs = [Document(page_content=hit.payload[settings.index_field]) for hit in results]
 
             # Step 3: Build prompt from retrieved context
-            prompt = self.build_augmented_prompt(question, relevant_docs)
+            with timed("prompt"):
+                prompt = self.build_augmented_prompt(question, relevant_docs, strict_context)
 
             # Step 4: Generate answer
             response = self.get_llm().invoke(prompt)
@@ -233,3 +644,41 @@ Answer (copy exactly as written above):
         except Exception as e:
             self._logger.error(output_messages.API_QUESTION_KO, error=str(e))
             raise
+
+    async def aask_single_question(self, question: str, qdrant, async_qdrant=None, max_chunks=None, strict_context=True):
+        try:
+            if not self._llm or not self._embedder:
+                self.initialize_client()
+            # Step 1: Get vector
+            with timed("embed"):
+                query_vector = await self.aembed_query(question)
+
+            # Step 2: Get relevant documents using Qdrant
+            with timed("search"):
+                if async_qdrant:
+                    results = await async_qdrant.get_relevant_documents(query_vector, question, limit=self.get_retrieval_limit(max_chunks))
+                else:
+                    results = await self._executor.run(qdrant.get_relevant_documents, query_vector, question, limit=self.get_retrieval_limit(max_chunks))
+                if self._reranker:
+                    results = await self._reranker.aselect(question, results, self._executor)
+            results = cap_chunks(results, max_chunks)
+            relevant_docs = [Document(page_content=hit.payload[settings.index_field]) for hit in results]
+
+            # Step 3: Build prompt from retrieved context
+            with timed("prompt"):
+                prompt = self.build_augmented_prompt(question, relevant_docs, strict_context)
+
+            # Step 4: Generate answer
+            response = await self.ainvoke_llm(prompt)
+
+            return {
+                "answer": response.strip(),
+                "answer_context": query_vector,
+                "context_chunks": relevant_docs,
+                "model": settings.model_name,
+                "timestamp": datetime.utcnow()
+            }
+
+        except Exception as e:
+            self._logger.error(output_messages.API_QUESTION_KO, error=str(e))
+            raise
@@ -1,12 +1,17 @@
-from prometheus_client import Counter, Histogram, Gauge
+from prometheus_client import Counter, Histogram, Gauge, start_http_server
 from typing import Optional
+from contextlib import contextmanager
+from .immortal import settings
+import asyncio
+import functools
+import inspect
 import time
 
 # Counters
 processed_files = Counter(
     'processed_files_total',
     'Total number of files processed',
-    ['status']
+    ['stage', 'status']
 )
 
 processing_errors = Counter(
@@ -15,42 +20,219 @@ processing_errors = Counter(
     ['error_type']
 )
 
+embedding_cache_lookups = Counter(
+    'embedding_cache_lookups_total',
+    'Embedding cache lookups by tier and result',
+    ['tier', 'result']
+)
+
+chunked_characters = Counter(
+    'chunked_characters_total',
+    'Characters run through a chunking strategy',
+    ['strategy']
+)
+
+chunks_created = Counter(
+    'chunks_created_total',
+    'Chunks produced by a chunking strategy',
+    ['strategy']
+)
+
+message_bytes = Counter(
+    'message_bytes_total',
+    'Encoded message bytes read from (in) and written to (out) a queue',
+    ['queue', 'direction']
+)
+
+pipeline_chunks = Counter(
+    'pipeline_chunks_total',
+    'Chunks handled by a stage, by outcome',
+    ['stage', 'outcome']
+)
+
+pipeline_vectors = Counter(
+    'pipeline_vectors_total',
+    'Vectors handled by a stage, by outcome',
+    ['stage', 'outcome']
+)
+
 # Histograms
+chunking_time = Histogram(
+    'chunking_time_seconds',
+    'Time spent chunking one message',
+    ['strategy'],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0]
+)
+
+chunk_size = Histogram(
+    'chunk_size_characters',
+    'Size of the chunks produced by a chunking strategy',
+    ['strategy'],
+    buckets=[100, 250, 500, 1000, 2000, 4000, 8000]
+)
+
 processing_time = Histogram(
     'processing_time_seconds',
     'Time spent processing files',
-    buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0]
+    ['stage'],
+    buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0]
+)
+
+message_latency = Histogram(
+    'message_latency_seconds',
+    'Time from dequeue to ack (or nack) of a queue message',
+    ['queue', 'outcome'],
+    buckets=[0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0]
+)
+
+model_call_time = Histogram(
+    'model_call_seconds',
+    'Latency of embedder and LLM calls',
+    ['kind', 'model'],
+    buckets=[0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+)
+
+request_time = Histogram(
+    'http_request_seconds',
+    'API request latency',
+    ['method', 'route', 'status'],
+    buckets=[0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+)
+
+event_loop_lag = Histogram(
+    'event_loop_lag_seconds',
+    'Delay of a timer on the event loop, the time ready callbacks wait for it',
+    buckets=[0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+backpressure_wait = Histogram(
+    'backpressure_wait_seconds',
+    'Time a producer held a message while the queue was over its high watermark',
+    ['queue'],
+    buckets=[0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 900.0]
 )
 
 # Gauges
 queue_size = Gauge(
     'queue_size',
-    'Current size of the processing queue'
+    'Current size of a queue',
+    ['queue']
+)
+
+deferred_files = Gauge(
+    'deferred_files',
+    'Files the sentry left in the watch folder until the files queue has room'
 )
 
-def track_processing_time():
-    """Decorator to track processing time of functions"""
+_metrics_server_started = False
+
+def start_metrics_server(port: Optional[int] = None):
+    """Serves this worker's metrics over HTTP on a background thread, port 0 turns it off"""
+    global _metrics_server_started
+    port = settings.metrics_port if port is None else port
+    if port and not _metrics_server_started:
+        start_http_server(port)
+        _metrics_server_started = True
+
+def track_processing_time(stage: str = 'default'):
+    """Decorator to track processing time of functions, coroutine functions included"""
     def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    processing_time.labels(stage=stage).observe(time.perf_counter() - start_time)
+            return async_wrapper
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             try:
-                result = func(*args, **kwargs)
-                processing_time.observe(time.time() - start_time)
-                return result
-            except Exception as e:
-                processing_time.observe(time.time() - start_time)
-                raise
+                return func(*args, **kwargs)
+            finally:
+                processing_time.labels(stage=stage).observe(time.perf_counter() - start_time)
         return wrapper
     return decorator
 
-def update_queue_size(size: int):
+@contextmanager
+def time_model_call(kind: str, model: str):
+    """Times an embedder or LLM call, failed calls included"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        model_call_time.labels(kind=kind, model=model).observe(time.perf_counter() - start_time)
+
+def record_model_call(kind: str, model: str, seconds: float):
+    """Record the latency of a model call timed elsewhere"""
+    model_call_time.labels(kind=kind, model=model).observe(seconds)
+
+def update_queue_size(queue: str, size: int):
     """Update the queue size metric"""
-    queue_size.set(size)
+    queue_size.labels(queue=queue).set(size)
 
-def record_processed_file(status: str = 'success'):
+def record_backpressure(queue: str, seconds: float):
+    """Record a producer pause on a full queue"""
+    backpressure_wait.labels(queue=queue).observe(seconds)
+
+def update_deferred_files(count: int):
+    """Update the deferred files metric"""
+    deferred_files.set(count)
+
+def record_processed_file(status: str = 'success', stage: str = 'pipeline'):
     """Record a processed file"""
-    processed_files.labels(status=status).inc()
+    processed_files.labels(stage=stage, status=status).inc()
+
+def record_message_bytes(queue: str, direction: str, size: int):
+    """Record the bytes a message took on the wire"""
+    message_bytes.labels(queue=queue, direction=direction).inc(size)
+
+def record_message_latency(queue: str, outcome: str, seconds: float):
+    """Record how long a message stayed with the worker that dequeued it"""
+    message_latency.labels(queue=queue, outcome=outcome).observe(seconds)
+
+def record_chunks(stage: str, outcome: str, count: int):
+    """Record chunks a stage handled"""
+    if count:
+        pipeline_chunks.labels(stage=stage, outcome=outcome).inc(count)
+
+def record_vectors(stage: str, outcome: str, count: int):
+    """Record vectors a stage handled"""
+    if count:
+        pipeline_vectors.labels(stage=stage, outcome=outcome).inc(count)
+
+def record_request(method: str, route: str, status: int, seconds: float):
+    """Record an API request"""
+    request_time.labels(method=method, route=route, status=str(status)).observe(seconds)
 
 def record_error(error_type: str):
     """Record a processing error"""
-    processing_errors.labels(error_type=error_type).inc() 
\ No newline at end of file
+    processing_errors.labels(error_type=error_type).inc() 
+
+def record_chunking(strategy: str, seconds: float, characters: int, chunk_sizes: list):
+    """Record chunking throughput and chunk size distribution"""
+    chunking_time.labels(strategy=strategy).observe(seconds)
+    chunked_characters.labels(strategy=strategy).inc(characters)
+    chunks_created.labels(strategy=strategy).inc(len(chunk_sizes))
+    for size in chunk_sizes:
+        chunk_size.labels(strategy=strategy).observe(size)
+
+def record_cache_lookup(tier: str, result: str, count: int = 1):
+    """Record embedding cache hits and misses"""
+    if count:
+        embedding_cache_lookups.labels(tier=tier, result=result).inc(count)
+
+async def run_loop_lag_monitor(interval: Optional[float] = None, samples: Optional[list] = None):
+    """Sleeps interval seconds over and over, how late each wake-up is measures the blocking on this loop"""
+    interval = settings.loop_lag_interval if interval is None else interval
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        event_loop_lag.observe(lag)
+        if samples is not None:
+            samples.append(lag)
@@ -0,0 +1,123 @@
+# chunking strategies - reavers break documents into scarabs
+from .immortal import settings
+from .adept import output_messages
+from .phoenix import record_chunking
+import abc
+import copy
+import re
+import time
+from pathlib import Path
+from typing import List, Tuple
+from langchain_core.documents import Document
+from langchain_experimental.text_splitter import SemanticChunker
+from langchain_text_splitters import MarkdownHeaderTextSplitter
+
+class ChunkingStrategy(abc.ABC):
+    """Splits documents into chunks"""
+    name = None
+
+    @abc.abstractmethod
+    def split(self, documents) -> List[Document]:
+        ...
+
+    def chunk(self, documents):
+        """split, recording throughput and chunk sizes"""
+        start_time = time.perf_counter()
+        chunks = self.split(documents)
+        record_chunking(
+            strategy=self.name,
+            seconds=time.perf_counter() - start_time,
+            characters=sum(len(document.page_content) for document in documents),
+            chunk_sizes=[len(chunk.page_content) for chunk in chunks]
+        )
+        return chunks
+
+class SemanticStrategy(ChunkingStrategy):
+    """Embedding based breakpoints, one embedder round trip per sentence"""
+    name = "semantic"
+
+    def __init__(self, splitter: SemanticChunker):
+        self.splitter = splitter
+
+    def split(self, documents):
+        return self.splitter.split_documents(documents)
+
+class WordWindowStrategy(ChunkingStrategy):
+    """Fixed windows of whitespace separated words overlapping by a few words, no model involved"""
+    name = "word"
+    WORD_PATTERN = re.compile(r"\S+")
+
+    def __init__(self, window: int, overlap: int):
+        if overlap >= window:
+            raise ValueError(f"{output_messages.CHUNKING_OVERLAP_KO}: {overlap} >= {window}")
+        self.window = window
+        self.overlap = overlap
+
+    def split_text(self, text: str) -> List[Tuple[int, str]]:
+        """(start index, chunk) pairs, chunks keep the original spacing of the text"""
+        spans = [match.span() for match in self.WORD_PATTERN.finditer(text)]
+        windows = []
+        step = self.window - self.overlap
+        for first in range(0, len(spans), step):
+            last = min(first + self.window, len(spans)) - 1
+            windows.append((spans[first][0], text[spans[first][0]:spans[last][1]]))
+            if last == len(spans) - 1:
+                break
+        return windows
+
+    def split(self, documents):
+        chunks = []
+        for document in documents:
+            for start_index, text in self.split_text(document.page_content):
+                metadata = copy.deepcopy(document.metadata)
+                metadata["start_index"] = start_index
+                chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+class MarkdownStrategy(ChunkingStrategy):
+    """Splits on markdown headings, sections longer than the word window are windowed again"""
+    name = "markdown"
+    HEADERS = [("#", "h1"), ("##", "h2"), ("###", "h3")]
+
+    def __init__(self, window: int, overlap: int):
+        self.headers = MarkdownHeaderTextSplitter(headers_to_split_on=self.HEADERS, strip_headers=False)
+        self.windows = WordWindowStrategy(window, overlap)
+
+    def split(self, documents):
+        chunks = []
+        for document in documents:
+            for section in self.headers.split_text(document.page_content):
+                # the headings a section sits under end up in its metadata
+                metadata = {**copy.deepcopy(document.metadata), **section.metadata}
+                for _, text in self.windows.split_text(section.page_content):
+                    chunks.append(Document(page_content=text, metadata=metadata))
+        return chunks
+
+class ChunkingRegistry:
+    """Chunking strategies by name, picked per message or per file extension"""
+
+    def __init__(self, default: str, by_extension: dict = None):
+        self._strategies = {}
+        self._default = default
+        self._by_extension = {extension.lower(): name for extension, name in (by_extension or {}).items()}
+
+    def register(self, strategy: ChunkingStrategy):
+        self._strategies[strategy.name] = strategy
+
+    def names(self):
+        return list(self._strategies)
+
+    def get(self, name: str) -> ChunkingStrategy:
+        if name not in self._strategies:
+            raise ValueError(f"{output_messages.CHUNKING_STRATEGY_KO}: {name}")
+        return self._strategies[name]
+
+    def resolve(self, requested: str = None, filename: str = None) -> ChunkingStrategy:
+        """The strategy asked for by the message, else the one for the file extension, else the default"""
+        if requested:
+            return self.get(requested)
+        if filename:
+            name = self._by_extension.get(Path(filename).suffix.lower())
+            if name:
+                return self.get(name)
+        return self.get(self._default)
@@ -0,0 +1,209 @@
+# pylon/revelation.py - trace context carried through the queue envelope, spans written as OTLP json lines
+from .immortal import settings
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+import atexit
+import json
+import os
+import secrets
+import socket
+import threading
+import time
+
+# span of the stage run in progress, messages sent meanwhile become its children
+current_span = ContextVar("current_span", default=None)
+
+def new_trace_id():
+    return secrets.token_hex(16)
+
+def new_span_id():
+    return secrets.token_hex(8)
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    parent_span_id: str = None
+    span_id: str = field(default_factory=new_span_id)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int = None
+    attributes: dict = field(default_factory=dict)
+    error: str = None
+
+    def context(self):
+        """What travels in the envelope, the next stage parents its spans to this one"""
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": otlp_value(value)} for key, value in self.attributes.items() if value is not None],
+            # 2 is STATUS_CODE_ERROR, 1 STATUS_CODE_OK
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1}
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+# Collector stand-in: one file per process, each line an OTLP/JSON ExportTraceServiceRequest
+class FileSpanExporter:
+
+    def __init__(self, service_name, folder=None, batch_size=None, interval=None, max_bytes=None, max_age=None, backups=None):
+        self.service_name = service_name
+        self.folder = Path(folder or settings.trace_export_folder)
+        self.batch_size = batch_size or settings.trace_export_batch
+        self.interval = settings.trace_export_interval if interval is None else interval
+        self.max_bytes = settings.trace_export_max_bytes if max_bytes is None else max_bytes
+        self.max_age = settings.trace_export_max_age if max_age is None else max_age
+        self.backups = settings.trace_export_backups if backups is None else backups
+        self.path = self.folder / f"{service_name}-{socket.gethostname()}-{os.getpid()}.jsonl"
+        self._spans = []
+        self._opened = time.monotonic()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._due = threading.Event()
+        # spans are written by this thread, never on the event loop of the stage
+        self._writer = threading.Thread(target=self.run, name=f"{service_name}-span-exporter", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def export(self, span):
+        with self._lock:
+            self._spans.append(span)
+            due = len(self._spans) >= self.batch_size
+        if due:
+            self._due.set()
+
+    def run(self):
+        """Flushes every TRACE_EXPORT_INTERVAL seconds, or as soon as a batch is full"""
+        while True:
+            self._due.wait(timeout=self.interval or None)
+            self._due.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": otlp_value(self.service_name)}]},
+            "scopeSpans": [{"scope": {"name": "protoss"}, "spans": [span.to_otlp() for span in spans]}]
+        }]}
+        try:
+            # the writer thread and the exit flush never interleave lines
+            with self._write_lock:
+                self.folder.mkdir(parents=True, exist_ok=True)
+                self.rotate()
+                with open(self.path, "a", encoding=settings.encoding) as export_file:
+                    export_file.write(json.dumps(request) + "\n")
+        except OSError:
+            # tracing never takes a stage down
+            pass
+
+    def rotate(self):
+        """Renames the current file once it reaches TRACE_EXPORT_MAX_BYTES or TRACE_EXPORT_MAX_AGE, keeps TRACE_EXPORT_BACKUPS of them"""
+        if not self.path.exists():
+            return
+        full = self.max_bytes and self.path.stat().st_size >= self.max_bytes
+        old = self.max_age and time.monotonic() - self._opened >= self.max_age
+        if not (full or old):
+            return
+        self.path.rename(self.path.with_name(f"{self.path.stem}.{time.time_ns()}.jsonl"))
+        self._opened = time.monotonic()
+        rotated = sorted(self.folder.glob(f"{self.path.stem}.*.jsonl"))
+        for stale in rotated[:max(len(rotated) - self.backups, 0)]:
+            stale.unlink(missing_ok=True)
+
+class Tracer:
+
+    def __init__(self, service_name, exporter=None):
+        self.service_name = service_name
+        self.enabled = settings.trace_enabled
+        self.exporter = exporter or (FileSpanExporter(service_name) if self.enabled else None)
+
+    def start_span(self, name, parent=None, start_ns=None, **attributes):
+        """A span under the parent context (a dict from the envelope), a new trace when there is none"""
+        parent = parent or (current_span.get().context() if current_span.get() else None)
+        return Span(
+            name=name,
+            trace_id=parent["trace_id"] if parent else new_trace_id(),
+            parent_span_id=parent.get("span_id") if parent else None,
+            start_ns=start_ns or time.time_ns(),
+            attributes=attributes
+        )
+
+    def end_span(self, span, error=None):
+        span.end_ns = time.time_ns()
+        span.error = str(error) if error else None
+        if self.enabled:
+            self.exporter.export(span)
+
+    def receive(self, stage, decoded_message, queue_message=None, **attributes):
+        """Stage span of a dequeued message, the time it waited in its queue is exported right away as a sibling span"""
+        trace = (decoded_message or {}).get(settings.trace_field) or {}
+        parent = trace if trace.get("trace_id") else None
+        dequeued_ns = getattr(queue_message, "dequeued_ns", None) or time.time_ns()
+        enqueued_ns = trace.get("enqueued_ns")
+        queue = getattr(queue_message, "queue", None)
+        attributes = {
+            "message.id": (decoded_message or {}).get("id"),
+            "message.filename": (decoded_message or {}).get("filename"),
+            "message.part": (decoded_message or {}).get("part"),
+            "queue.name": queue,
+            "queue.enqueued_ns": enqueued_ns,
+            "queue.dequeued_ns": dequeued_ns,
+            **attributes
+        }
+        span = self.start_span(f"{stage}.process", parent, **attributes)
+        if enqueued_ns and self.enabled:
+            # sibling of the stage span, both children of the span that sent the message
+            wait = self.start_span(f"{queue}.wait", parent, start_ns=enqueued_ns, **{"queue.name": queue, "message.id": attributes["message.id"]})
+            wait.end_ns = dequeued_ns
+            self.exporter.export(wait)
+        return span
+
+    @contextmanager
+    def activate(self, span):
+        """Makes the span current, ending it on the way out (as failed when an exception escapes)"""
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, error=e)
+            raise
+        else:
+            self.end_span(span, error=span.error)
+        finally:
+            current_span.reset(token)
+
+    @contextmanager
+    def span(self, name, parent=None, **attributes):
+        with self.activate(self.start_span(name, parent, **attributes)) as span:
+            yield span
+
+    @contextmanager
+    def stage(self, stage, decoded_message, queue_message=None, **attributes):
+        with self.activate(self.receive(stage, decoded_message, queue_message, **attributes)) as span:
+            yield span
+
+def outgoing_trace():
+    """Trace context for a message about to be sent, None outside any span"""
+    span = current_span.get()
+    return span.context() if span else None
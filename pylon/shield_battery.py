@@ -0,0 +1,195 @@
+from .immortal import settings
+from .adept import output_messages
+from .phoenix import record_cache_lookup
+from .void_ray import has_native_async
+from collections import OrderedDict
+from array import array
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+import asyncio
+import hashlib
+import threading
+import time
+import redis
+import structlog
+
+# Content-addressed embeddings cache: in-process LRU first, redis second
+class EmbeddingCache:
+
+    def __init__(self, max_bytes=None, ttl=None):
+        self._logger = structlog.get_logger()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._max_bytes = max_bytes if max_bytes is not None else settings.embedding_cache_max_bytes
+        self._ttl = ttl if ttl is not None else settings.embedding_cache_ttl
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_retry_at = 0.0
+        self.hits = {"memory": 0, "redis": 0}
+        self.misses = 0
+
+    def initialize_client(self):
+        self._redis = redis.Redis(
+            host=settings.redis_host,
+            port=settings.redis_port,
+            db=settings.redis_db,
+            socket_timeout=settings.redis_timeout,
+            socket_connect_timeout=settings.redis_timeout,
+            retry_on_timeout=bool(settings.redis_retry),
+            health_check_interval=settings.redis_health_check_interval
+        )
+
+    def get_client(self):
+        if not self._redis:
+            self.initialize_client()
+        return self._redis
+
+    def make_key(self, model_name, text):
+        digest = hashlib.sha256(f"{model_name}\0{text}".encode(settings.encoding)).hexdigest()
+        return f"{settings.embedding_cache_prefix}:{digest}"
+
+    def stats(self):
+        return {
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._size
+        }
+
+    # vectors are kept as packed float32, the precision qdrant stores anyway
+    def pack(self, vector):
+        return array("f", vector).tobytes()
+
+    def unpack(self, raw):
+        return array("f", raw).tolist()
+
+    def as_stored(self, vector):
+        """The vector as a cache hit would return it, so results do not depend on the cache state"""
+        return self.unpack(self.pack(vector))
+
+    def get_many(self, model_name, texts) -> List[Optional[List[float]]]:
+        keys = [self.make_key(model_name, text) for text in texts]
+        found = [None] * len(keys)
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                raw = self._entries.get(key)
+                if raw is not None:
+                    self._entries.move_to_end(key)
+                    found[i] = raw
+
+        memory_hits = sum(1 for raw in found if raw is not None)
+        missing = [i for i, raw in enumerate(found) if raw is None]
+        redis_hits = 0
+        if missing:
+            values = self.redis_get([keys[i] for i in missing])
+            for i, raw in zip(missing, values):
+                if raw is not None:
+                    found[i] = raw
+                    self.remember(keys[i], raw)
+                    redis_hits += 1
+
+        misses = len(keys) - memory_hits - redis_hits
+        self.hits["memory"] += memory_hits
+        self.hits["redis"] += redis_hits
+        self.misses += misses
+        record_cache_lookup("memory", "hit", memory_hits)
+        record_cache_lookup("redis", "hit", redis_hits)
+        record_cache_lookup("all", "miss", misses)
+
+        return [self.unpack(raw) if raw is not None else None for raw in found]
+
+    def put_many(self, model_name, texts, vectors):
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            key = self.make_key(model_name, text)
+            raw = self.pack(vector)
+            entries[key] = raw
+            self.remember(key, raw)
+        self.redis_set(entries)
+
+    def remember(self, key, raw):
+        """Adds an entry to the in-process tier, evicting the least recently used past the size budget"""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            if len(raw) > self._max_bytes:
+                return
+            self._entries[key] = raw
+            self._size += len(raw)
+            while self._size > self._max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def redis_available(self):
+        return time.monotonic() >= self._redis_retry_at
+
+    def redis_failed(self, error):
+        # the cache is an optimization, a redis outage must never stop embeddings
+        self._logger.warning(output_messages.CACHE_REDIS_KO, error=str(error))
+        self._redis_retry_at = time.monotonic() + settings.redis_retry_delay
+
+    def redis_get(self, keys):
+        if not keys or not self.redis_available():
+            return [None] * len(keys)
+        try:
+            return self.get_client().mget(keys)
+        except redis.exceptions.RedisError as e:
+            self.redis_failed(e)
+            return [None] * len(keys)
+
+    def redis_set(self, entries):
+        if not entries or not self.redis_available():
+            return
+        try:
+            pipeline = self.get_client().pipeline(transaction=False)
+            for key, raw in entries.items():
+                pipeline.set(key, raw, ex=self._ttl or None)
+            pipeline.execute()
+        except redis.exceptions.RedisError as e:
+            self.redis_failed(e)
+
+# Embeddings wrapper so every langchain consumer (SemanticChunker included) goes through the cache
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, embedder, cache, model_name, executor=None):
+        self.embedder = embedder
+        self.cache = cache
+        self.model_name = model_name
+        self.executor = executor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(self.model_name, texts)
+        # repeated texts inside one call are only embedded once
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = [self.cache.as_stored(vector) for vector in self.embedder.embed_documents(missing)]
+            computed = dict(zip(missing, embedded))
+            self.cache.put_many(self.model_name, missing, embedded)
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        # queries skip the cache, some embedders treat them differently from documents
+        return self.embedder.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # cache tiers are blocking (lock and redis round trip), keep them off the event loop
+        vectors = await asyncio.to_thread(self.cache.get_many, self.model_name, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            if has_native_async(self.embedder, "aembed_documents", Embeddings) or not self.executor:
+                embedded = await self.embedder.aembed_documents(missing)
+            else:
+                embedded = await self.executor.run(self.embedder.embed_documents, missing)
+            embedded = [self.cache.as_stored(vector) for vector in embedded]
+            computed = dict(zip(missing, embedded))
+            await asyncio.to_thread(self.cache.put_many, self.model_name, missing, embedded)
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if has_native_async(self.embedder, "aembed_query", Embeddings) or not self.executor:
+            return await self.embedder.aembed_query(text)
+        return await self.executor.run(self.embedder.embed_query, text)
@@ -0,0 +1,76 @@
+from pylon import settings, output_messages
+import hashlib
+import os
+import re
+import tempfile
+import structlog
+
+# Blob store on the shared stargate volume, carries what is too big for a redis message
+class BlobGateway:
+
+    # sha256 of the content, then the message it belongs to (bare digests are from before per-message blobs)
+    REFERENCE_PATTERN = re.compile(r"^[0-9a-f]{64}(-[A-Za-z0-9_-]{1,64})?$")
+
+    def __init__(self, folder=None):
+        self._logger = structlog.get_logger()
+        self._folder = folder or settings.blob_folder
+
+    def is_reference(self, reference):
+        return isinstance(reference, str) and bool(self.REFERENCE_PATTERN.match(reference))
+
+    def get_path(self, reference):
+        # references come from queue messages, never let one point outside the store
+        if not self.is_reference(reference):
+            raise ValueError(f"{output_messages.BLOB_REFERENCE_KO}: {reference}")
+        return os.path.join(self._folder, reference[:2], reference)
+
+    def exists(self, reference):
+        return os.path.exists(self.get_path(reference))
+
+    def store(self, chunks, owner):
+        """Streams chunks into the store, hashing while writing, and returns the <sha256>-<owner> reference"""
+        os.makedirs(self._folder, exist_ok=True)
+        digest = hashlib.sha256()
+        temporary_file = tempfile.NamedTemporaryFile(dir=self._folder, prefix=".incoming-", delete=False)
+        try:
+            with temporary_file:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    temporary_file.write(chunk)
+            # one blob per message, two messages with the same bytes each delete their own copy
+            reference = f"{digest.hexdigest()}-{owner}"
+            path = self.get_path(reference)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temporary_file.name, path)
+            self._logger.debug(output_messages.BLOB_STORED, reference=reference)
+            return reference
+        finally:
+            if os.path.exists(temporary_file.name):
+                os.unlink(temporary_file.name)
+
+    def put_file(self, filepath, owner):
+        def read_chunks():
+            with open(filepath, "rb") as f:
+                while chunk := f.read(settings.blob_chunk_size):
+                    yield chunk
+        return self.store(read_chunks(), owner)
+
+    def put_bytes(self, data, owner):
+        return self.store([data], owner)
+
+    def read_chunks(self, reference):
+        with open(self.get_path(reference), "rb") as f:
+            while chunk := f.read(settings.blob_chunk_size):
+                yield chunk
+
+    def read_bytes(self, reference):
+        # text and json extraction needs the whole content, large PDFs are read from get_path instead
+        with open(self.get_path(reference), "rb") as f:
+            return f.read()
+
+    def delete(self, reference):
+        try:
+            os.unlink(self.get_path(reference))
+            self._logger.debug(output_messages.BLOB_DELETED, reference=reference)
+        except FileNotFoundError:
+            pass
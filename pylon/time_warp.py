@@ -0,0 +1,29 @@
+# pylon/time_warp.py - where a request spent its time, by phase, sent back as a Server-Timing header
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+# phase -> seconds for the request in progress, copied contexts (executor threads, callbacks) share the same dict
+request_timings = ContextVar("request_timings", default=None)
+
+def start_timings():
+    timings = {}
+    request_timings.set(timings)
+    return timings
+
+def add_timing(phase, seconds):
+    timings = request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - started)
+
+def server_timing(timings):
+    """Server-Timing header value, durations in milliseconds"""
+    return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in timings.items())
@@ -1,10 +1,44 @@
 # general purpose classes and functions
 import contextlib 
+import contextvars
+import functools
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
 class ProcessingError(Exception):
     """Custom exception for processing errors"""
     pass
 
+class BoundedExecutor:
+    """Thread pool for blocking calls made from async code, bounded so slow providers cannot pile up threads"""
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="void-ray")
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # keep context variables (request timings, traces) visible inside the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, functools.partial(context.run, func, *args, **kwargs))
+
+def available_cpus():
+    """CPUs this container may actually use, honouring the cgroup quota and the cpuset"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def has_native_async(instance, method, base):
+    """True when the instance overrides the base class async method instead of inheriting its executor fallback"""
+    return getattr(type(instance), method, None) is not getattr(base, method, None)
+
 @contextlib.contextmanager
 def suppress_stderr():
     """Suppress standard output errors"""
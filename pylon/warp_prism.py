@@ -1,18 +1,70 @@
 from pylon import settings, output_messages
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance, PayloadSchemaType, SearchParams, Filter, FieldCondition, MatchText, MatchValue
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import PointStruct, VectorParams, VectorParamsDiff, Distance, HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, ProductQuantization, ProductQuantizationConfig, CompressionRatio, QuantizationSearchParams, PayloadSchemaType, SearchParams, SearchRequest, CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation, PointIdsList, Filter, FieldCondition, MatchText, MatchValue, Range, HasIdCondition, IsEmptyCondition, PayloadField, FilterSelector
+import hashlib
+import re
 import uuid
 import structlog
+import threading
 import grpc
+from dataclasses import dataclass
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.errors import PyMongoError
 import logging 
 
+def reciprocal_rank_fusion(result_lists, k):
+    """Fuses ranked point lists, each point scores the sum of 1 / (k + rank) over the lists it appears in"""
+    scores = {}
+    points = {}
+    for results in result_lists:
+        for rank, point in enumerate(results, start=1):
+            scores[point.id] = scores.get(point.id, 0.0) + 1.0 / (k + rank)
+            points.setdefault(point.id, point)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [points[point_id].model_copy(update={"score": scores[point_id]}) for point_id in ranked]
+
+class UnknownCollectionError(LookupError):
+    """A request named a collection that is not configured in QDRANT_COLLECTIONS"""
+    pass
+
+# stands for the score threshold of the gateway search profile, None already means no threshold
+PROFILE_THRESHOLD = object()
+
+@dataclass(frozen=True)
+class SearchProfile:
+    """Search settings of one collection, the global ones unless QDRANT_COLLECTIONS overrides them"""
+    max_chunks: int
+    score_threshold: float
+    hnsw_ef: int
+    retrieval_mode: str
+    # brute force scan, faster and exact on a corpus small enough to skip the index
+    exact: bool = False
+
+    @classmethod
+    def for_collection(cls, collection):
+        overrides = settings.qdrant_collections.get(collection) or {}
+        return cls(
+            max_chunks=int(overrides.get("max_chunks", settings.max_chunks)),
+            score_threshold=float(overrides.get("score_threshold", settings.model_score)),
+            hnsw_ef=int(overrides.get("hnsw_ef", settings.model_hnsw)),
+            retrieval_mode=overrides.get("retrieval_mode", settings.retrieval_mode),
+            exact=bool(overrides.get("exact", False))
+        )
+
 class QdrantGateway:
 
-    def __init__(self):
-        self._qdrant_client = None
+    TERM_PATTERN = re.compile(r"[^\s\"'`,;:!?()\[\]{}]+")
+
+    def __init__(self, collection=None, client=None):
+        # a client handed in (e.g. QdrantClient(":memory:")) is used as is, else one is opened on first use
+        self._qdrant_client = client
         self._logger = structlog.get_logger()
+        self.collection = collection or settings.collection_name
+        self.profile = SearchProfile.for_collection(self.collection)
+
+    def bind(self, collection):
+        """A gateway of the same kind over another collection, sharing this gateway client"""
+        return type(self)(collection, client=self.get_client())
 
     def initialize_client(self):
         self._qdrant_client = QdrantClient(
@@ -31,66 +83,294 @@ class QdrantGateway:
             self.initialize_client()
         return self._qdrant_client
 
-    def recreate_collection(self):
+    # collection schema, everything the memory footprint depends on comes from settings
+    def vectors_config(self):
+        return VectorParams(
+            size=settings.vector_dimension,
+            distance=Distance.COSINE,
+            on_disk=settings.qdrant_on_disk_vectors
+        )
+
+    def hnsw_config(self):
+        return HnswConfigDiff(
+            m=settings.qdrant_hnsw_m,
+            ef_construct=settings.qdrant_hnsw_ef_construct,
+            on_disk=settings.qdrant_hnsw_on_disk
+        )
+
+    def quantization_config(self):
+        if settings.qdrant_quantization == settings.qdrant_quantization_scalar:
+            return ScalarQuantization(scalar=ScalarQuantizationConfig(
+                type=ScalarType.INT8,
+                quantile=settings.qdrant_scalar_quantile,
+                always_ram=settings.qdrant_quantization_always_ram
+            ))
+        if settings.qdrant_quantization == settings.qdrant_quantization_product:
+            return ProductQuantization(product=ProductQuantizationConfig(
+                compression=CompressionRatio(settings.qdrant_product_compression),
+                always_ram=settings.qdrant_quantization_always_ram
+            ))
+        return None
+
+    def search_params(self, hnsw_ef=None):
+        """Search on the quantized vectors, oversampled and rescored with the originals from disk"""
+        quantization = None
+        if self.quantization_config():
+            quantization = QuantizationSearchParams(
+                ignore=False,
+                rescore=settings.qdrant_rescore,
+                oversampling=settings.qdrant_oversampling
+            )
+        return SearchParams(hnsw_ef=int(hnsw_ef or self.profile.hnsw_ef), exact=self.profile.exact, quantization=quantization)
+
+    def collection_schema(self):
+        return {
+            "vectors_config": self.vectors_config(),
+            "hnsw_config": self.hnsw_config(),
+            "quantization_config": self.quantization_config(),
+            "on_disk_payload": settings.qdrant_on_disk_payload
+        }
+
+    def tuning_diff(self):
+        """The schema as an update for a collection that already exists"""
+        return {
+            "vectors_config": {"": VectorParamsDiff(on_disk=settings.qdrant_on_disk_vectors)},
+            "hnsw_config": self.hnsw_config(),
+            "quantization_config": self.quantization_config()
+        }
+
+    # COLLECTION_NAME is an alias over versioned collections, a re-index swaps it without downtime
+    def versioned_collection_name(self, embedding_model):
+        slug = re.sub(r"[^a-z0-9]+", "-", embedding_model.lower()).strip("-")
+        return f"{self.collection}{settings.collection_version_separator}{slug}"
+
+    def alias_operations(self, alias, collection, current):
+        operations = []
+        if current:
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection, alias_name=alias)))
+        return operations
+
+    def get_alias_target(self, alias=None):
+        """The collection an alias points to, None when the name is not an alias"""
+        alias = alias or self.collection
+        for collection_alias in self.get_client().get_aliases().aliases:
+            if collection_alias.alias_name == alias:
+                return collection_alias.collection_name
+        return None
+
+    def create_collection(self, collection):
+        self.get_client().create_collection(collection_name=collection, **self.collection_schema())
+        self._logger.info(f"{output_messages.QDRANT_COLLECTION_CREATION}", name=collection)
+
+    def swap_alias(self, collection, alias=None, drop_legacy=False):
+        """Points the alias to another collection in a single atomic update"""
+        alias = alias or self.collection
+        current = self.get_alias_target(alias)
+        if not current and self.get_client().collection_exists(alias):
+            # a collection created before aliases holds the name, it has to go before the alias can exist
+            if not drop_legacy:
+                self._logger.error(f"{output_messages.QDRANT_LEGACY_COLLECTION_KO}", name=alias)
+                raise ValueError(f"{output_messages.QDRANT_LEGACY_COLLECTION_KO}: {alias}")
+            self._logger.warning(f"{output_messages.QDRANT_LEGACY_COLLECTION}", name=alias)
+            self.get_client().delete_collection(alias)
+        self.get_client().update_collection_aliases(change_aliases_operations=self.alias_operations(alias, collection, current))
+        self._logger.info(f"{output_messages.QDRANT_ALIAS_SWAPPED}", alias=alias, collection=collection, previous=current)
+        return current
+
+    def scroll(self, collection, offset=None, limit=None):
+        """A page of points with payload and without vectors, and the offset of the next page"""
+        return self.get_client().scroll(
+            collection_name=collection,
+            offset=offset,
+            limit=limit or settings.qdrant_retrieve_batch,
+            with_payload=True,
+            with_vectors=False
+        )
+
+    def recreate_collection(self, embedding_model=None):
         if self._qdrant_client:
             try:
-                exists = self._qdrant_client.collection_exists(settings.collection_name)
-                self._logger.info(f"QDRANT DEBUG ", name=settings.collection_name, exists=exists)
-                if not exists:
+                exists = self._qdrant_client.collection_exists(self.collection) or self.get_alias_target() is not None
+                self._logger.info(f"QDRANT DEBUG ", name=self.collection, exists=exists)
+                if not exists and embedding_model:
+                    # fresh installs start aliased
+                    collection = self.versioned_collection_name(embedding_model)
+                    self.create_collection(collection)
+                    self.swap_alias(collection)
+                elif not exists:
                     self._qdrant_client.create_collection(
-                        collection_name=settings.collection_name,
-                        vectors_config=VectorParams(
-                            size=settings.vector_dimension,
-                            distance=Distance.COSINE
-                        )
+                        collection_name=self.collection,
+                        **self.collection_schema()
                     )
-                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_CREATION}", name=settings.collection_name)
+                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_CREATION}", name=self.collection)
                 else:
-                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_EXISTS}", result=self._qdrant_client.collection_exists(settings.collection_name))
+                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_EXISTS}", result=self._qdrant_client.collection_exists(self.collection))
+                    if settings.qdrant_tune_existing:
+                        self.tune_collection()
             except grpc.RpcError as e:
                 if "already exists" not in str(e).lower():
                     raise
 
-    def create_payload_index(self, field_name="text", field_schema=PayloadSchemaType.TEXT):
+    def tune_collection(self, collection=None):
+        """Applies the configured schema to an existing collection, qdrant rebuilds the index in the background"""
+        collection = collection or self.collection
+        self.get_client().update_collection(collection_name=collection, **self.tuning_diff())
+        self._logger.info(f"{output_messages.QDRANT_COLLECTION_TUNED}", name=collection)
+
+    def create_payload_index(self, field_name="text", field_schema=PayloadSchemaType.TEXT, collection=None):
+        collection = collection or self.collection
         if self._qdrant_client:
             index_definitions = {
                 field_name: PayloadSchemaType.TEXT,
                 "source": PayloadSchemaType.KEYWORD,
                 "chunk_index": PayloadSchemaType.INTEGER,
+                "part": PayloadSchemaType.INTEGER,
             }
-            collection_info = self._qdrant_client.get_collection(collection_name=settings.collection_name)
+            collection_info = self._qdrant_client.get_collection(collection_name=collection)
             existing_indexes = collection_info.payload_schema or {}
             for field, schema in index_definitions.items():
                 if field not in existing_indexes:
                     self._qdrant_client.create_payload_index(
-                        collection_name=settings.collection_name,
+                        collection_name=collection,
                         field_name=field,
                         field_schema=schema
                     )
                     self._logger.info(f"{output_messages.QDRANT_INDEX_CREATION}", name=field)
 
-    def search(self, query_vector, question, collection=settings.collection_name):
+    def search_request(self, query_vector, limit, query_filter=None, score_threshold=PROFILE_THRESHOLD, with_vectors=None):
+        if score_threshold is PROFILE_THRESHOLD:
+            score_threshold = self.profile.score_threshold
+        return SearchRequest(
+            vector=query_vector,
+            filter=query_filter,
+            limit=int(limit),
+            with_payload=True,
+            with_vector=settings.qdrant_with_vectors if with_vectors is None else with_vectors,
+            score_threshold=float(score_threshold) if score_threshold is not None else None,
+            params=self.search_params()
+        )
+
+    def lexical_terms(self, question):
+        """Query words worth a full-text match, identifiers and codes (digits, inner punctuation, capitals) win over plain words"""
+        words, identifiers = [], []
+        for term in self.TERM_PATTERN.findall(question or ""):
+            term = term.strip(".-_/")
+            if len(term) < settings.hybrid_min_term_length or term.lower() in (word.lower() for word in words):
+                continue
+            # casing is left to the text index tokenizer
+            words.append(term)
+            if any(c.isdigit() for c in term) or any(c in "-_./" for c in term) or term[1:] != term[1:].lower():
+                identifiers.append(term)
+        # plain words match most chunks, with an identifier around they only dilute the full-text hits
+        return identifiers or words
+
+    def hybrid_requests(self, query_vector, question, limit):
+        """The dense request, plus the same vector restricted to points whose text contains a query term"""
+        prefetch = max(settings.hybrid_prefetch, limit)
+        requests = [self.search_request(query_vector, prefetch)]
+        terms = self.lexical_terms(question)
+        if terms:
+            lexical_filter = Filter(should=[
+                FieldCondition(key=settings.index_field, match=MatchText(text=term)) for term in terms
+            ])
+            # an exact identifier can sit in a chunk the embedder finds dissimilar, no score threshold here
+            requests.append(self.search_request(query_vector, prefetch, lexical_filter, score_threshold=None))
+        return requests, terms
+
+    def rank_by_terms(self, points, terms):
+        """Orders full-text hits by how many distinct query terms their text holds, dense score breaking ties"""
+        def matches(point):
+            text = point.payload.get(settings.index_field, "").lower()
+            return sum(1 for term in terms if term.lower() in text)
+        return sorted(points, key=lambda point: (matches(point), point.score), reverse=True)
+
+    def fuse(self, results, terms, limit):
+        dense = results[0]
+        lexical = self.rank_by_terms(results[1], terms) if len(results) > 1 else []
+        fused = reciprocal_rank_fusion([dense, lexical], settings.rrf_k)[:int(limit)]
+        self._logger.debug(f"{output_messages.QDRANT_HYBRID_RESULT}", dense=len(dense), lexical=len(lexical), fused=len(fused))
+        return fused
+
+    def hybrid_search(self, query_vector, question, collection=None, limit=None):
+        """Dense and full-text filtered searches in one round trip, fused with reciprocal rank fusion"""
+        limit = limit or self.profile.max_chunks
+        requests, terms = self.hybrid_requests(query_vector, question, limit)
+        results = self._qdrant_client.search_batch(collection_name=collection or self.collection, requests=requests)
+        return self.fuse(results, terms, limit)
+
+    def search(self, query_vector, question, collection=None, limit=None, with_vectors=None):
         results = self._qdrant_client.search(
-            collection_name=collection,
+            collection_name=collection or self.collection,
             query_vector=query_vector,
-            limit=int(settings.max_chunks),
+            limit=int(limit or self.profile.max_chunks),
             with_payload=True,
-            with_vectors=True,
-            score_threshold=float(settings.model_score),
-            search_params=SearchParams(hnsw_ef=int(settings.model_hnsw))
+            # vectors only when a caller needs them, they are most of the response size
+            with_vectors=settings.qdrant_with_vectors if with_vectors is None else with_vectors,
+            score_threshold=float(self.profile.score_threshold),
+            search_params=self.search_params()
         )
         self._logger.debug(f"{output_messages.QDRANT_SEARCH_RESULT}", search_results=results)
 
         return results
         
+    def point_id(self, source, part, chunk_index, document):
+        """Same source, part, position and text give the same point, re-ingesting a file overwrites instead of duplicating"""
+        content_hash = hashlib.sha256(document.encode(settings.encoding)).hexdigest()
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}\0{part}\0{chunk_index}\0{content_hash}"))
+
+    def point_ids(self, documents, metadata):
+        return [
+            self.point_id(metadata[i].get("source"), metadata[i].get("part"), metadata[i].get("chunk_index", i), document)
+            for i, document in enumerate(documents)
+        ]
+
+    def stale_filters(self, source, ids, part=None, parts=None):
+        """Filters matching the points of a source (or source part) that are not in the latest ingestion"""
+        source_condition = FieldCondition(key="source", match=MatchValue(value=source))
+        if parts is None:
+            return [Filter(must=[source_condition], must_not=[HasIdCondition(has_id=ids)])]
+        return [
+            Filter(must=[source_condition, FieldCondition(key="part", match=MatchValue(value=part))], must_not=[HasIdCondition(has_id=ids)]),
+            # the file shrank, or was ingested whole before
+            Filter(must=[source_condition], should=[
+                FieldCondition(key="part", range=Range(gte=parts)),
+                IsEmptyCondition(is_empty=PayloadField(key="part"))
+            ])
+        ]
+
+    def existing_ids(self, ids, collection=None):
+        """The ids already stored, without loading payloads or vectors"""
+        existing = set()
+        for start in range(0, len(ids), settings.qdrant_retrieve_batch):
+            points = self.get_client().retrieve(
+                collection_name=collection or self.collection,
+                ids=ids[start:start + settings.qdrant_retrieve_batch],
+                with_payload=False,
+                with_vectors=False
+            )
+            existing.update(str(point.id) for point in points)
+        return existing
+
+    def delete_stale(self, source, ids, part=None, parts=None, collection=None):
+        for stale_filter in self.stale_filters(source, ids, part, parts):
+            self.get_client().delete(collection_name=collection or self.collection, points_selector=FilterSelector(filter=stale_filter))
+        self._logger.debug(f"{output_messages.QDRANT_STALE_DELETED}", source=source, part=part)
+
+    def delete_ids(self, ids, collection=None):
+        if ids:
+            self.get_client().delete(collection_name=collection or self.collection, points_selector=PointIdsList(points=list(ids)))
+            self._logger.debug(f"{output_messages.QDRANT_POINTS_DELETED}", points=len(ids))
+
     def generate_points(self, vectors, documents, metadata):
         if not vectors or not documents:
             self._logger.debug(f"{output_messages.QDRANT_POINTS_SKIPPED}")
             return None
 
+        ids = self.point_ids(documents, metadata)
         points = [
                     PointStruct(
-                        id=str(uuid.uuid4()),
+                        id=ids[i],
                         vector=vector,
                         payload={str(settings.index_field): document, **metadata[i]}
                     )
@@ -98,10 +378,10 @@ class QdrantGateway:
                 ]
         return points
     
-    def add_points(self, points, collection=settings.collection_name):
+    def add_points(self, points, collection=None):
         if points:
             self._qdrant_client.upsert(
-                        collection_name=collection,
+                        collection_name=collection or self.collection,
                         points=points,
                     )
 
@@ -111,8 +391,204 @@ class QdrantGateway:
         points = self.generate_points(vectors, texts, metadata)
         self.add_points(points)
 
-    def get_relevant_documents(self, vector, query):
-        return self.search(query_vector=vector, question=query)
+    def get_relevant_documents(self, vector, query, limit=None):
+        if self.profile.retrieval_mode == settings.retrieval_hybrid:
+            return self.hybrid_search(query_vector=vector, question=query, limit=limit)
+        return self.search(query_vector=vector, question=query, limit=limit)
+
+# Async twin of the gateway, for callers running on an event loop
+class AsyncQdrantGateway(QdrantGateway):
+
+    def initialize_client(self):
+        self._qdrant_client = AsyncQdrantClient(
+            host=settings.db_host,
+            port=settings.db_port,
+            timeout=settings.db_timeout,
+            prefer_grpc=True,
+            check_compatibility=False
+        )
+
+    async def health_check(self):
+        await self.get_client().get_collections()
+        return True
+
+    async def get_alias_target(self, alias=None):
+        alias = alias or self.collection
+        for collection_alias in (await self.get_client().get_aliases()).aliases:
+            if collection_alias.alias_name == alias:
+                return collection_alias.collection_name
+        return None
+
+    async def create_collection(self, collection):
+        await self.get_client().create_collection(collection_name=collection, **self.collection_schema())
+        self._logger.info(f"{output_messages.QDRANT_COLLECTION_CREATION}", name=collection)
+
+    async def swap_alias(self, collection, alias=None, drop_legacy=False):
+        alias = alias or self.collection
+        current = await self.get_alias_target(alias)
+        if not current and await self.get_client().collection_exists(alias):
+            if not drop_legacy:
+                self._logger.error(f"{output_messages.QDRANT_LEGACY_COLLECTION_KO}", name=alias)
+                raise ValueError(f"{output_messages.QDRANT_LEGACY_COLLECTION_KO}: {alias}")
+            self._logger.warning(f"{output_messages.QDRANT_LEGACY_COLLECTION}", name=alias)
+            await self.get_client().delete_collection(alias)
+        await self.get_client().update_collection_aliases(change_aliases_operations=self.alias_operations(alias, collection, current))
+        self._logger.info(f"{output_messages.QDRANT_ALIAS_SWAPPED}", alias=alias, collection=collection, previous=current)
+        return current
+
+    async def scroll(self, collection, offset=None, limit=None):
+        return await self.get_client().scroll(
+            collection_name=collection,
+            offset=offset,
+            limit=limit or settings.qdrant_retrieve_batch,
+            with_payload=True,
+            with_vectors=False
+        )
+
+    async def recreate_collection(self, embedding_model=None):
+        if self._qdrant_client:
+            try:
+                exists = await self._qdrant_client.collection_exists(self.collection) or await self.get_alias_target() is not None
+                if not exists and embedding_model:
+                    collection = self.versioned_collection_name(embedding_model)
+                    await self.create_collection(collection)
+                    await self.swap_alias(collection)
+                elif not exists:
+                    await self._qdrant_client.create_collection(
+                        collection_name=self.collection,
+                        **self.collection_schema()
+                    )
+                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_CREATION}", name=self.collection)
+                else:
+                    self._logger.info(f"{output_messages.QDRANT_COLLECTION_EXISTS}", result=exists)
+                    if settings.qdrant_tune_existing:
+                        await self.tune_collection()
+            except grpc.RpcError as e:
+                if "already exists" not in str(e).lower():
+                    raise
+
+    async def tune_collection(self, collection=None):
+        collection = collection or self.collection
+        await self.get_client().update_collection(collection_name=collection, **self.tuning_diff())
+        self._logger.info(f"{output_messages.QDRANT_COLLECTION_TUNED}", name=collection)
+
+    async def create_payload_index(self, field_name="text", field_schema=PayloadSchemaType.TEXT, collection=None):
+        collection = collection or self.collection
+        if self._qdrant_client:
+            index_definitions = {
+                field_name: PayloadSchemaType.TEXT,
+                "source": PayloadSchemaType.KEYWORD,
+                "chunk_index": PayloadSchemaType.INTEGER,
+                "part": PayloadSchemaType.INTEGER,
+            }
+            collection_info = await self._qdrant_client.get_collection(collection_name=collection)
+            existing_indexes = collection_info.payload_schema or {}
+            for field, schema in index_definitions.items():
+                if field not in existing_indexes:
+                    await self._qdrant_client.create_payload_index(
+                        collection_name=collection,
+                        field_name=field,
+                        field_schema=schema
+                    )
+                    self._logger.info(f"{output_messages.QDRANT_INDEX_CREATION}", name=field)
+
+    async def search(self, query_vector, question, collection=None, limit=None, with_vectors=None):
+        results = await self.get_client().search(
+            collection_name=collection or self.collection,
+            query_vector=query_vector,
+            limit=int(limit or self.profile.max_chunks),
+            with_payload=True,
+            # vectors only when a caller needs them, they are most of the response size
+            with_vectors=settings.qdrant_with_vectors if with_vectors is None else with_vectors,
+            score_threshold=float(self.profile.score_threshold),
+            search_params=self.search_params()
+        )
+        self._logger.debug(f"{output_messages.QDRANT_SEARCH_RESULT}", search_results=results)
+
+        return results
+
+    async def search_batch(self, query_vectors, collection=None):
+        """Runs several searches in a single round trip, one result list per query vector"""
+        requests = [self.search_request(query_vector, self.profile.max_chunks) for query_vector in query_vectors]
+        return await self.get_client().search_batch(collection_name=collection or self.collection, requests=requests)
+
+    async def hybrid_search(self, query_vector, question, collection=None, limit=None):
+        limit = limit or self.profile.max_chunks
+        requests, terms = self.hybrid_requests(query_vector, question, limit)
+        results = await self.get_client().search_batch(collection_name=collection or self.collection, requests=requests)
+        return self.fuse(results, terms, limit)
+
+    async def existing_ids(self, ids, collection=None):
+        existing = set()
+        for start in range(0, len(ids), settings.qdrant_retrieve_batch):
+            points = await self.get_client().retrieve(
+                collection_name=collection or self.collection,
+                ids=ids[start:start + settings.qdrant_retrieve_batch],
+                with_payload=False,
+                with_vectors=False
+            )
+            existing.update(str(point.id) for point in points)
+        return existing
+
+    async def delete_stale(self, source, ids, part=None, parts=None, collection=None):
+        for stale_filter in self.stale_filters(source, ids, part, parts):
+            await self.get_client().delete(collection_name=collection or self.collection, points_selector=FilterSelector(filter=stale_filter))
+        self._logger.debug(f"{output_messages.QDRANT_STALE_DELETED}", source=source, part=part)
+
+    async def delete_ids(self, ids, collection=None):
+        if ids:
+            await self.get_client().delete(collection_name=collection or self.collection, points_selector=PointIdsList(points=list(ids)))
+            self._logger.debug(f"{output_messages.QDRANT_POINTS_DELETED}", points=len(ids))
+
+    async def upsert(self, points, collection=None):
+        if points:
+            await self.get_client().upsert(
+                        collection_name=collection or self.collection,
+                        points=points,
+                    )
+
+    async def add_points(self, points, collection=None):
+        await self.upsert(points, collection)
+
+    async def add_to_qdrant(self, vectors, texts, metadata):
+        if not vectors or not texts:
+            return
+        points = self.generate_points(vectors, texts, metadata)
+        await self.add_points(points)
+
+    async def get_relevant_documents(self, vector, query, limit=None):
+        if self.profile.retrieval_mode == settings.retrieval_hybrid:
+            return await self.hybrid_search(query_vector=vector, question=query, limit=limit)
+        return await self.search(query_vector=vector, question=query, limit=limit)
+
+# One gateway pair per collection, bound on first use and sharing the clients of the default pair
+class CollectionRouter:
+    def __init__(self, qdrant, async_qdrant=None):
+        self._qdrant = qdrant
+        self._async_qdrant = async_qdrant
+        self._gateways = {qdrant.collection: (qdrant, async_qdrant)}
+        self._lock = threading.Lock()
+        self._logger = structlog.get_logger()
+
+    def is_allowed(self, collection):
+        return collection == settings.collection_name or collection in settings.qdrant_collections
+
+    def get(self, collection=None):
+        """The (sync, async) gateways of a collection, only the configured collections can be searched"""
+        collection = collection or settings.collection_name
+        with self._lock:
+            gateways = self._gateways.get(collection)
+            if gateways:
+                return gateways
+            if not self.is_allowed(collection):
+                raise UnknownCollectionError(f"{output_messages.QDRANT_UNKNOWN_COLLECTION}{collection}")
+            gateways = (
+                self._qdrant.bind(collection),
+                self._async_qdrant.bind(collection) if self._async_qdrant else None
+            )
+            self._gateways[collection] = gateways
+            self._logger.info(f"{output_messages.QDRANT_COLLECTION_ROUTED}", name=collection)
+            return gateways
 
 class MongoGateway:
     def __init__(self):
@@ -1,17 +1,21 @@
 from fastapi import FastAPI, File, Request, HTTPException, Depends, UploadFile, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware import Middleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from pydantic import BaseModel, Field
 import httpx
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 import time
+import json
 from robotics_bay.robotics_bay_settings import api_settings
-from pylon import settings, output_messages
+from pylon import settings, output_messages, record_request, run_loop_lag_monitor, start_timings, server_timing, UnknownCollectionError
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from pylon.context import ApplicationContext
+import asyncio
 import os
 
 class ApiService:
@@ -21,7 +25,7 @@ class ApiService:
     async def health_check(self):
         """Health check endpoint"""
         try:
-            qdrant_health = self.context.qdrant.health_check()
+            qdrant_health = await self.context.async_qdrant.health_check()
 
             async with httpx.AsyncClient(timeout=api_settings.api_timeout) as client:
                 ollama_health = await client.get(f"{settings.model_api}{settings.model_health}")
@@ -40,31 +44,79 @@ class ApiService:
             self.context.logger.error(output_messages.API_HEALTH_KO, error=str(e))
             raise HTTPException(status_code=503, detail=output_messages.API_HEALTH_KO_MSG)
 
+    def get_gateways(self, data):
+        """The gateways of the requested collection, unknown collections are a 404 before any work is done"""
+        try:
+            return self.context.collections.get(data.collection)
+        except UnknownCollectionError as e:
+            self.context.logger.warning(output_messages.API_COLLECTION_KO, collection=data.collection)
+            raise HTTPException(status_code=404, detail=str(e))
+
+    def get_max_chunks(self, data, qdrant):
+        """Chunks the prompt gets, the request asks for them or the collection search profile decides"""
+        return data.max_context_chunks or qdrant.profile.max_chunks
+
     async def handle_question(self, data):
         """Ask chain questions with vector DB context augmentation"""
+        qdrant, async_qdrant = self.get_gateways(data)
         try:
             #answer = self.context.ollama.ask_question(data.question, self.context.qdrant)
-            answer = self.context.ollama.ask_question(
+            answer = await self.context.ollama.aask_question(
                 question=data.question,
                 history=data.history,
-                qdrant=self.context.qdrant
+                qdrant=qdrant,
+                async_qdrant=async_qdrant,
+                collection=data.collection,
+                max_chunks=self.get_max_chunks(data, qdrant),
+                strict_context=data.strict_context
             )
         except Exception as e:
             self.context.logger.error(output_messages.API_QUESTION_KO, error=str(e))
             raise HTTPException(status_code=500, detail=str(e))
         return answer
 
+    async def stream_question(self, data, gateways):
+        """Stream chain answers as server-sent events: context, tokens, then the full QAResponse"""
+        qdrant, async_qdrant = gateways
+        try:
+            async for event, payload in self.context.ollama.astream_question(
+                question=data.question,
+                history=data.history,
+                qdrant=qdrant,
+                async_qdrant=async_qdrant,
+                collection=data.collection,
+                max_chunks=self.get_max_chunks(data, qdrant),
+                strict_context=data.strict_context
+            ):
+                if event == "done":
+                    payload = QAResponse(**payload).model_dump(mode="json")
+                yield format_sse(event, payload)
+        except Exception as e:
+            self.context.logger.error(output_messages.API_QUESTION_KO, error=str(e))
+            yield format_sse("error", {"detail": str(e)})
+
     async def handle_question_one_shot(self, data):
         """Ask a one-shot question with vector DB context augmentation"""
+        qdrant, async_qdrant = self.get_gateways(data)
         try:
-            answer = self.context.ollama.ask_single_question(data.question, self.context.qdrant)
+            answer = await self.context.ollama.aask_single_question(
+                question=data.question,
+                qdrant=qdrant,
+                async_qdrant=async_qdrant,
+                max_chunks=self.get_max_chunks(data, qdrant),
+                strict_context=data.strict_context
+            )
         except Exception as e:
             self.context.logger.error(output_messages.API_QUESTION_KO, error=str(e))
             raise HTTPException(status_code=500, detail=str(e))
         return answer
 
+def format_sse(event, data):
+    """Server-sent event frame with a json payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 # Rate limiter setup
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(key_func=get_remote_address, enabled=api_settings.rate_limit_enabled)
 
 # Initialize FastAPI with middleware
 app = FastAPI(
@@ -88,7 +140,9 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 # Set up ApplicationContext on startup
 @app.on_event("startup")
 async def startup_event():
-    app.state.context = await ApplicationContext.create()
+    app.state.context = await ApplicationContext.create("disruptor")
+    # blocking calls on the loop show up as lag, kept on the app so the task is not collected
+    app.state.loop_lag_monitor = asyncio.create_task(run_loop_lag_monitor())
     app.state.context.logger.info(f"{output_messages.API_INITIALIZATION}")
 
 # Dependency to access context
@@ -104,7 +158,8 @@ class QARequest(BaseModel):
     question: str = Field(..., min_length=1, max_length=1000)
     history: List[dict] = Field(default=[]) 
     collection: str = Field(default=settings.collection_name)
-    max_context_chunks: int = Field(default=5, ge=1, le=20)
+    # left out, the collection max_chunks (QDRANT_COLLECTIONS, else MAX_CHUNKS) applies
+    max_context_chunks: Optional[int] = Field(default=None, ge=1, le=20)
     strict_context: bool = Field(default=True)
 
 class QAResponse(BaseModel):
@@ -117,8 +172,15 @@ class QAResponse(BaseModel):
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     start_time = time.time()
+    # embed, search, prompt and generate add their time here while the request runs
+    timings = start_timings()
     response = await call_next(request)
     duration = time.time() - start_time
+    # streamed answers send their headers before generating, only what came before is in them
+    response.headers["Server-Timing"] = server_timing({**timings, "total": duration})
+    # route templates, not raw urls, keep the label set bounded
+    route = request.scope.get("route")
+    record_request(request.method, route.path if route else "unmatched", response.status_code, duration)
 
     # no DI yet
     context = getattr(request.app.state, "context", None)
@@ -133,6 +195,11 @@ async def log_requests(request: Request, call_next):
 
     return response
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of the API: requests, embedder and LLM latency"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 @limiter.limit("5/minute")
 async def health_check(request: Request, service: ApiService = Depends(get_service)):
@@ -144,12 +211,28 @@ async def ask_question(request: Request, data: QARequest, service: ApiService =
     """Ask a question with vector DB context augmentation"""
     return await service.handle_question(data)
 
+@app.post("/ask/stream")
+@limiter.limit("30/minute")
+async def ask_question_stream(request: Request, data: QARequest, service: ApiService = Depends(get_service)):
+    """Ask a question and stream the context and answer tokens as server-sent events"""
+    # resolved before the response starts, an unknown collection is still a 404 and not an error event
+    gateways = service.get_gateways(data)
+    return StreamingResponse(
+        service.stream_question(data, gateways),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), collection: str = Query(default=settings.collection_name), context: ApplicationContext = Depends(get_context)):
     """Deal with uploaded files and send them to sentry folder for later processing"""
+    if not context.collections.is_allowed(collection):
+        context.logger.warning(output_messages.API_COLLECTION_KO, collection=collection)
+        raise HTTPException(status_code=404, detail=f"{output_messages.QDRANT_UNKNOWN_COLLECTION}{collection}")
     try:
         #upload_dir = api_settings.watch_folder # send the file here to be picked by sentry after
-        upload_dir = os.path.abspath(api_settings.watch_folder)
+        # sentry sends the files of a collection subfolder to that collection
+        upload_dir = os.path.abspath(os.path.join(api_settings.watch_folder, "" if collection == settings.collection_name else collection))
         os.makedirs(upload_dir, exist_ok=True)
         #context = app.state.context
         file_path = os.path.join(upload_dir, file.filename)
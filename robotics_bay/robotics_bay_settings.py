@@ -21,6 +21,7 @@ class ApiSettings(BaseSettings):
     allow_credentials: bool = Field(..., env="ALLOW_CREDENTIALS")
     allow_methods: str = Field(..., env="ALLOW_METHODS")
     allow_headers: str = Field(..., env="ALLOW_HEADERS")
+    rate_limit_enabled: bool = Field(..., env="RATE_LIMIT_ENABLED")
 
     model_config = SettingsConfigDict(
         env_file = Path(__file__).resolve().parent / ".env",
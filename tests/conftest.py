@@ -0,0 +1,29 @@
+# tests/conftest.py - shared fixtures, queues run on fakeredis and nothing reaches the network
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from pylon import settings, RedisGateway
+from fakeredis import aioredis
+import pytest
+
+@pytest.fixture
+def reliable(monkeypatch):
+    """Reliable list mode with the defaults the tests count on"""
+    monkeypatch.setattr(settings, "redis_transport", settings.redis_transport_list)
+    monkeypatch.setattr(settings, "redis_reliable", True)
+    monkeypatch.setattr(settings, "redis_max_deliveries", 3)
+    monkeypatch.setattr(settings, "redis_visibility_timeout", 900)
+    monkeypatch.setattr(settings, "redis_high_watermark", 0)
+    monkeypatch.setattr(settings, "trace_enabled", False)
+
+@pytest.fixture
+def stream(reliable, monkeypatch):
+    monkeypatch.setattr(settings, "redis_transport", settings.redis_transport_stream)
+    monkeypatch.setattr(settings, "redis_consumer_name", "tester")
+
+@pytest.fixture
+def gateway(reliable):
+    return RedisGateway(aioredis.FakeRedis())
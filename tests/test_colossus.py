@@ -0,0 +1,189 @@
+# tests/test_colossus.py - reliable queue state machine: take, ack, nack, reaper, leases, dead letters
+from pylon import settings
+import asyncio
+import pytest
+import redis
+import time
+
+QUEUE = "test-files"
+
+def message(number=0):
+    return {"id": f"message-{number}", settings.redis_content_field: b"content"}
+
+async def fields(gateway, key):
+    return await gateway._connection.hgetall(key)
+
+def test_take_moves_to_processing_with_a_lease(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        taken = await gateway.get_message(QUEUE, timeout=1)
+        connection = gateway._connection
+        assert gateway.decode_message(taken)["id"] == "message-0"
+        assert await connection.llen(QUEUE) == 0
+        assert await connection.llen(gateway.processing_queue(QUEUE)) == 1
+        assert len(await fields(gateway, gateway.leases_key(QUEUE))) == 1
+        assert list((await fields(gateway, gateway.deliveries_key(QUEUE))).values()) == [b"1"]
+    asyncio.run(scenario())
+
+def test_ack_clears_every_trace_of_the_message(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        await gateway.ack_message(await gateway.get_message(QUEUE, timeout=1))
+        connection = gateway._connection
+        assert await connection.llen(gateway.processing_queue(QUEUE)) == 0
+        assert not await fields(gateway, gateway.leases_key(QUEUE))
+        assert not await fields(gateway, gateway.deliveries_key(QUEUE))
+        assert not gateway._held
+    asyncio.run(scenario())
+
+def test_nack_requeues_then_dead_letters(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        connection = gateway._connection
+        for _ in range(settings.redis_max_deliveries - 1):
+            await gateway.nack_message(await gateway.get_message(QUEUE, timeout=1))
+            assert await connection.llen(QUEUE) == 1
+        # the last allowed delivery fails too
+        await gateway.nack_message(await gateway.get_message(QUEUE, timeout=1))
+        assert await connection.llen(QUEUE) == 0
+        assert await connection.llen(gateway.processing_queue(QUEUE)) == 0
+        assert await connection.llen(gateway.dead_letter_queue(QUEUE)) == 1
+    asyncio.run(scenario())
+
+def test_redelivery_past_the_limit_is_dead_lettered(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        connection = gateway._connection
+        # a worker crashing mid-message never nacks, only the reaper gives it back
+        for _ in range(settings.redis_max_deliveries):
+            taken = await gateway.get_message(QUEUE, timeout=1)
+            await connection.hset(gateway.leases_key(QUEUE), gateway.fingerprint(taken.receipt), 0)
+            await gateway.requeue_expired(QUEUE)
+        assert await gateway.get_message(QUEUE, timeout=1) is None
+        assert await connection.llen(gateway.dead_letter_queue(QUEUE)) == 1
+    asyncio.run(scenario())
+
+def test_reaper_only_requeues_expired_leases(gateway):
+    async def scenario():
+        for number in range(2):
+            await gateway.send_message(message(number), QUEUE)
+        expired = await gateway.get_message(QUEUE, timeout=1)
+        await gateway.get_message(QUEUE, timeout=1)
+        connection = gateway._connection
+        await connection.hset(gateway.leases_key(QUEUE), gateway.fingerprint(expired.receipt), time.time() - 1)
+
+        assert await gateway.requeue_expired(QUEUE) == 1
+        assert await connection.lrange(QUEUE, 0, -1) == [expired.receipt]
+        assert await connection.llen(gateway.processing_queue(QUEUE)) == 1
+    asyncio.run(scenario())
+
+def test_reaper_leases_messages_moved_without_one(gateway):
+    async def scenario():
+        connection = gateway._connection
+        # a worker died between BLMOVE and setting the lease
+        await connection.rpush(gateway.processing_queue(QUEUE), b"orphan")
+        assert await gateway.requeue_expired(QUEUE) == 0
+        lease = await connection.hget(gateway.leases_key(QUEUE), gateway.fingerprint(b"orphan"))
+        assert float(lease) > time.time()
+    asyncio.run(scenario())
+
+def test_extend_lease_pushes_the_timeout_back(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        taken = await gateway.get_message(QUEUE, timeout=1)
+        connection = gateway._connection
+        key, fingerprint = gateway.leases_key(QUEUE), gateway.fingerprint(taken.receipt)
+        await connection.hset(key, fingerprint, time.time() + 1)
+
+        await gateway.extend_leases()
+        assert float(await connection.hget(key, fingerprint)) > time.time() + settings.redis_visibility_timeout - 5
+        assert await gateway.requeue_expired(QUEUE) == 0
+    asyncio.run(scenario())
+
+def test_extend_lease_after_release_reports_it_lost(gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        taken = await gateway.get_message(QUEUE, timeout=1)
+        await gateway._connection.hset(gateway.leases_key(QUEUE), gateway.fingerprint(taken.receipt), 0)
+        await gateway.requeue_expired(QUEUE)
+
+        assert await gateway.extend_lease(taken) is False
+        await gateway.extend_leases()
+        assert not gateway._held
+        assert not await fields(gateway, gateway.leases_key(QUEUE))
+    asyncio.run(scenario())
+
+class BrokenRedis:
+    """Connection whose writes fail, the way a full or unreachable redis answers"""
+
+    async def rpush(self, *args, **kwargs):
+        raise redis.exceptions.ConnectionError("connection refused")
+
+def test_send_failure_reaches_the_caller(gateway):
+    gateway._connection = BrokenRedis()
+    with pytest.raises(redis.exceptions.ConnectionError):
+        asyncio.run(gateway.send_message(message(), QUEUE))
+
+def test_failed_background_task_stops_the_stage(gateway):
+    async def failing():
+        raise RuntimeError("reaper down")
+
+    async def stage():
+        gateway.supervise(failing())
+        await asyncio.sleep(10)
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(asyncio.wait_for(stage(), timeout=5))
+
+def test_stream_nack_retries_right_away(stream, gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        await gateway.nack_message(await gateway.get_message(QUEUE, timeout=1))
+        # no visibility timeout to sit out, the copy is the next entry
+        retried = await gateway.get_message(QUEUE, timeout=1)
+        assert gateway.decode_message(retried)["id"] == "message-0"
+        assert await gateway._connection.xlen(QUEUE) == 1
+    asyncio.run(scenario())
+
+def test_stream_nack_counts_deliveries_across_copies(stream, gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        connection = gateway._connection
+        for _ in range(settings.redis_max_deliveries):
+            await gateway.nack_message(await gateway.get_message(QUEUE, timeout=1))
+        assert await connection.xlen(QUEUE) == 0
+        assert await connection.xlen(gateway.dead_letter_queue(QUEUE)) == 1
+    asyncio.run(scenario())
+
+def test_stream_nack_leaves_a_reclaimed_entry_alone(stream, gateway):
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        taken = await gateway.get_message(QUEUE, timeout=1)
+        # another replica claimed it after this one went quiet
+        await gateway._connection.xclaim(QUEUE, settings.redis_consumer_group, "other", 0, [taken.receipt])
+        assert await gateway.extend_lease(taken) is False
+        await gateway.nack_message(taken)
+        assert await gateway._connection.xlen(QUEUE) == 1
+        assert await gateway.get_message(QUEUE, timeout=1) is None
+    asyncio.run(scenario())
+
+def test_backpressure_keeps_the_held_message_leased(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "redis_watermarks", {"full": {"high": 1, "low": 0}})
+    monkeypatch.setattr(settings, "redis_backpressure_interval", 0.01)
+
+    async def scenario():
+        await gateway.send_message(message(), QUEUE)
+        taken = await gateway.get_message(QUEUE, timeout=1)
+        connection = gateway._connection
+        key, fingerprint = gateway.leases_key(QUEUE), gateway.fingerprint(taken.receipt)
+        await connection.hset(key, fingerprint, time.time() + 1)
+        await connection.rpush("full", b"waiting")
+        gateway._paused.add("full")
+
+        async def drain():
+            await asyncio.sleep(0.1)
+            await connection.delete("full")
+
+        await asyncio.gather(gateway.wait_for_capacity("full"), drain())
+        assert float(await connection.hget(key, fingerprint)) > time.time() + settings.redis_visibility_timeout - 5
+    asyncio.run(scenario())
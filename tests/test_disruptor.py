@@ -0,0 +1,79 @@
+# tests/test_disruptor.py - question endpoints end to end, on the benchmark stand-ins and an in-memory qdrant
+import os
+import sys
+from conftest import ROOT
+sys.path.insert(0, str(ROOT / "observatory"))
+
+from pylon import settings, QdrantGateway, AsyncQdrantGateway, OllamaGateway
+from pylon.context import ApplicationContext
+from hallucination import EMBEDDER_NAME, LLM_NAME, HallucinatedEmbeddings, register_embedder, register_llm
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from dotenv import dotenv_values
+import asyncio
+import httpx
+import pytest
+import structlog
+
+TEXTS = ["Refunds are paid within 14 days of the request.", "Invoices are sent on the first day of the month."]
+
+async def build_context():
+    ollama = OllamaGateway()
+    ollama.initialize_client()
+    qdrant = QdrantGateway(client=QdrantClient(location=":memory:"))
+    async_qdrant = AsyncQdrantGateway(client=AsyncQdrantClient(location=":memory:"))
+    await async_qdrant.recreate_collection(ollama.get_embedding_model())
+    metadata = [{"source": "billing.md", "chunk_index": i} for i in range(len(TEXTS))]
+    await async_qdrant.add_to_qdrant(HallucinatedEmbeddings().embed_documents(TEXTS), TEXTS, metadata)
+    return ApplicationContext(None, qdrant, ollama, structlog.get_logger(), async_qdrant)
+
+@pytest.fixture
+def ask(reliable, monkeypatch):
+    """Posts to the API, driven in-process over the stand-in embedder and LLM"""
+    monkeypatch.setattr(settings, "current_embedder_name", EMBEDDER_NAME)
+    monkeypatch.setattr(settings, "model_name", LLM_NAME)
+    monkeypatch.setattr(settings, "embedding_cache_enabled", False)
+    monkeypatch.setattr(settings, "rerank_enabled", False)
+    monkeypatch.setattr(settings, "retrieval_mode", settings.retrieval_dense)
+    register_embedder()
+    register_llm()
+    # compose hands the API both env files, its settings read part of the root one from the environment
+    for name, value in dotenv_values(ROOT / ".env").items():
+        monkeypatch.setenv(name, os.environ.get(name, value))
+    from robotics_bay.disruptor import app, limiter
+    monkeypatch.setattr(limiter, "enabled", False)
+
+    async def post(path, body):
+        app.state.context = await build_context()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://disruptor") as client:
+            return await client.post(path, json=body)
+
+    return lambda path, body: asyncio.run(post(path, body))
+
+def test_ask_answers_from_the_collection(ask):
+    response = ask("/ask", {"question": "When are refunds paid?", "max_context_chunks": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["context_chunks"]) == 1
+    assert body["answer"] in TEXTS
+
+def test_ask_stream_sends_context_tokens_and_answer(ask):
+    response = ask("/ask/stream", {"question": "When are refunds paid?", "strict_context": False})
+    assert response.status_code == 200
+    events = [line.split(": ", 1)[1] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "context" and events[-1] == "done"
+    assert "error" not in events
+
+def test_unknown_collection_is_a_404_on_every_path(ask):
+    for path in ("/ask", "/ask/stream"):
+        assert ask(path, {"question": "When are refunds paid?", "collection": "nowhere"}).status_code == 404
+
+def test_collection_max_chunks_applies_when_the_request_leaves_it_out(ask, monkeypatch):
+    # every chunk is a match, only the chunk limits decide
+    monkeypatch.setattr(settings, "model_score", -1.0)
+    question = {"question": "When are refunds paid?"}
+    assert len(ask("/ask", question).json()["context_chunks"]) == len(TEXTS)
+
+    monkeypatch.setattr(settings, "qdrant_collections", {settings.collection_name: {"max_chunks": 1}})
+    assert len(ask("/ask", question).json()["context_chunks"]) == 1
+    assert len(ask("/ask", {**question, "max_context_chunks": 2}).json()["context_chunks"]) == 2
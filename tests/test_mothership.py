@@ -0,0 +1,65 @@
+# tests/test_mothership.py - retrieval and prompts, on a stand-in embedder and qdrant
+from pylon import settings, OllamaGateway
+from pylon.mothership_core import QdrantRetriever, chunk_limit, lexical_question
+from types import SimpleNamespace
+import asyncio
+
+class Embedder:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+class RecordingQdrant:
+    """Remembers the question each search matched its terms on"""
+
+    def __init__(self):
+        self.questions = []
+
+    def get_relevant_documents(self, vector, query, limit=None):
+        self.questions.append(query)
+        return [SimpleNamespace(payload={settings.index_field: "chunk"})]
+
+def test_lexical_terms_come_from_the_question_not_the_history():
+    qdrant = RecordingQdrant()
+    retriever = QdrantRetriever(qdrant=qdrant, embedder=Embedder())
+    combined = "User: tell me about invoices\nAssistant: sure\n\nUser: and the refunds?"
+
+    with chunk_limit(3), lexical_question("and the refunds?"):
+        retriever.invoke(combined)
+        asyncio.run(retriever.ainvoke(combined))
+    # without a question, as in callers that never set one
+    retriever.invoke("refunds")
+    assert qdrant.questions == ["and the refunds?", "and the refunds?", "refunds"]
+
+class RecordingReranker:
+    """Remembers the query each cross-encoder pass scored the hits against"""
+    candidates = 4
+
+    def __init__(self):
+        self.queries = []
+
+    def select(self, query, results):
+        self.queries.append(query)
+        return results
+
+    async def aselect(self, query, results, executor=None):
+        return self.select(query, results)
+
+def test_reranker_scores_against_the_question_not_the_history():
+    reranker = RecordingReranker()
+    retriever = QdrantRetriever(qdrant=RecordingQdrant(), embedder=Embedder(), reranker=reranker)
+    combined = "User: tell me about invoices\nAssistant: sure\n\nUser: and the refunds?"
+
+    with chunk_limit(3), lexical_question("and the refunds?"):
+        retriever.invoke(combined)
+        asyncio.run(retriever.ainvoke(combined))
+    assert reranker.queries == ["and the refunds?", "and the refunds?"]
+
+def test_strict_context_picks_the_prompt_rules():
+    gateway = OllamaGateway()
+    assert settings.prompt_rules in gateway.get_prompt_template()
+    open_template = gateway.get_prompt_template(strict_context=False)
+    assert settings.prompt_rules_open in open_template and settings.prompt_rules not in open_template
+    assert settings.prompt_rules_open in gateway.build_augmented_prompt("question", ["chunk"], strict_context=False)
@@ -0,0 +1,106 @@
+# tests/test_probe.py - probe batch collection on fakeredis
+import sys
+from conftest import ROOT
+sys.path.insert(0, str(ROOT / "nexus"))
+sys.path.insert(0, str(ROOT / "observatory"))
+
+from pylon import settings, Tracer, QdrantGateway, CollectionRouter
+from types import SimpleNamespace
+from probe import EmbedderService
+from nexus_settings import embedder_settings
+from hallucination import HallucinatedEmbeddings
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+import asyncio
+import structlog
+
+def test_undecodable_pages_message_is_dead_lettered(gateway):
+    async def scenario():
+        queue = settings.redis_queue_pages
+        payload = gateway.generate_message(id="broken", content=b"{not json", filename="broken.md", content_field=None, content_type=None, content_mime=None)
+        await gateway.send_message(payload, queue)
+
+        service = EmbedderService()
+        service.context = SimpleNamespace(redis=gateway, tracer=Tracer("probe"), logger=structlog.get_logger())
+        collecting = asyncio.create_task(service.collect_batches(asyncio.Queue()))
+        # fakeredis never blocks, the collector retries it right away until it runs out of deliveries
+        for _ in range(100):
+            if await gateway._connection.llen(gateway.dead_letter_queue(queue)):
+                break
+            await asyncio.sleep(0.01)
+        collecting.cancel()
+
+        assert await gateway._connection.llen(gateway.dead_letter_queue(queue)) == 1
+        assert await gateway._connection.llen(gateway.processing_queue(queue)) == 0
+        # nothing left for the heartbeat to keep leased
+        assert not gateway._held
+    asyncio.run(scenario())
+
+def test_team_collection_is_created_on_its_first_write(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "qdrant_collections", {"team-a": {}})
+    monkeypatch.setattr(embedder_settings, "batch_timeout", 0.05)
+
+    async def scenario():
+        queue = settings.redis_queue_pages
+        content = gateway.serialize_documents([Document(page_content="Team A ships on fridays.")])
+        payload = gateway.generate_message(id="team", content=content, filename="team.md", content_field=None, content_type=None, content_mime="text/markdown", extra={settings.collection_field: "team-a"})
+        await gateway.send_message(payload, queue)
+
+        qdrant = QdrantGateway(client=QdrantClient(location=":memory:"))
+        ollama = SimpleNamespace(get_embedding_model=lambda: "stub-model", get_vectors=lambda documents: HallucinatedEmbeddings().embed_documents(documents))
+        service = EmbedderService()
+        service.context = SimpleNamespace(redis=gateway, tracer=Tracer("probe"), logger=structlog.get_logger(), qdrant=qdrant, collections=CollectionRouter(qdrant), ollama=ollama)
+        embed_queue, upsert_queue, status_queue = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        stages = [
+            asyncio.create_task(service.collect_batches(embed_queue)),
+            asyncio.create_task(service.embed_batches(embed_queue, upsert_queue)),
+            asyncio.create_task(service.upsert_batches(upsert_queue, status_queue)),
+        ]
+        try:
+            await asyncio.wait_for(status_queue.get(), timeout=10)
+        finally:
+            for stage in stages:
+                stage.cancel()
+        return qdrant.get_client()
+
+    client = asyncio.run(scenario())
+    aliases = {alias.alias_name: alias.collection_name for alias in client.get_aliases().aliases}
+    assert aliases["team-a"] == "team-a__stub-model"
+    assert client.count("team-a").count == 1
+    # nothing went to the default collection
+    assert not client.collection_exists(settings.collection_name)
+
+def test_markdown_headings_reach_the_stored_payload(gateway, monkeypatch):
+    monkeypatch.setattr(embedder_settings, "batch_timeout", 0.05)
+
+    async def scenario():
+        queue = settings.redis_queue_pages
+        page = Document(page_content="Refunds are paid within 14 days.", metadata={"h1": "Billing", "h2": "Refunds", "source": "/tmp/upload-1234"})
+        payload = gateway.generate_message(id="billing", content=gateway.serialize_documents([page]), filename="billing.md", content_field=None, content_type=None, content_mime="text/markdown")
+        await gateway.send_message(payload, queue)
+
+        qdrant = QdrantGateway(client=QdrantClient(location=":memory:"))
+        qdrant.recreate_collection()
+        ollama = SimpleNamespace(get_vectors=lambda documents: HallucinatedEmbeddings().embed_documents(documents))
+        service = EmbedderService()
+        service.context = SimpleNamespace(redis=gateway, tracer=Tracer("probe"), logger=structlog.get_logger(), qdrant=qdrant, ollama=ollama)
+        embed_queue, upsert_queue, status_queue = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        stages = [
+            asyncio.create_task(service.collect_batches(embed_queue)),
+            asyncio.create_task(service.embed_batches(embed_queue, upsert_queue)),
+            asyncio.create_task(service.upsert_batches(upsert_queue, status_queue)),
+        ]
+        try:
+            await asyncio.wait_for(status_queue.get(), timeout=10)
+        finally:
+            for stage in stages:
+                stage.cancel()
+        return qdrant.get_client()
+
+    points, _ = asyncio.run(scenario()).scroll(settings.collection_name, with_payload=True)
+    assert len(points) == 1
+    assert points[0].payload["h1"] == "Billing"
+    assert points[0].payload["h2"] == "Refunds"
+    # the point identity is the probe's, not the extractor's
+    assert points[0].payload["source"] == "billing.md"
+    assert points[0].payload["chunk_index"] == 0
@@ -0,0 +1,38 @@
+# tests/test_reaver.py - chunking strategies, on a stand-in embedder where one is needed
+from pylon.reaver import ChunkingStrategy, SemanticStrategy, WordWindowStrategy
+from langchain_core.documents import Document
+from langchain_experimental.text_splitter import SemanticChunker
+import pytest
+
+def test_word_windows_overlap_and_keep_spacing():
+    windows = WordWindowStrategy(window=4, overlap=1)
+    text = "one two  three four five six seven"
+    assert windows.split_text(text) == [(0, "one two  three four"), (15, "four five six seven")]
+
+    chunks = windows.split([Document(page_content=text, metadata={"source": "a.txt"})])
+    assert [chunk.metadata for chunk in chunks] == [{"source": "a.txt", "start_index": 0}, {"source": "a.txt", "start_index": 15}]
+
+def test_strategy_must_implement_split():
+    class Unfinished(ChunkingStrategy):
+        name = "unfinished"
+
+    with pytest.raises(TypeError):
+        Unfinished()
+
+class CountingEmbeddings:
+    """Vectors that only depend on the text, counting every text it is asked to embed"""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(text)), float(text.count(" "))] for text in texts]
+
+def test_semantic_split_embeds_each_sentence_once():
+    embedder = CountingEmbeddings()
+    text = "The first sentence is here. A second one follows. Then a third and last one."
+    chunks = SemanticStrategy(SemanticChunker(embedder)).split([Document(page_content=text)])
+    assert " ".join(chunk.page_content for chunk in chunks) == text
+    # the chunk vectors are probe's job, through the embedding cache
+    assert embedder.embedded == 3
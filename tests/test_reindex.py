@@ -0,0 +1,110 @@
+# tests/test_reindex.py - re-index catch-up and alias swap, on an in-memory qdrant
+import sys
+from conftest import ROOT
+sys.path.insert(0, str(ROOT / "nexus"))
+
+from pylon import settings, QdrantGateway, AsyncQdrantGateway
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import PointStruct
+from types import SimpleNamespace
+from reindex import ReindexService
+from nexus_settings import embedder_settings
+import asyncio
+import pytest
+import structlog
+
+class Embedder:
+    def get_embedding_model(self):
+        return "new-model"
+
+    async def aembed_documents(self, texts):
+        return [[1.0] * settings.vector_dimension for _ in texts]
+
+def point(number):
+    return PointStruct(id=number, vector=[1.0] * settings.vector_dimension, payload={settings.index_field: f"chunk {number}"})
+
+async def ids(qdrant, collection):
+    points, _ = await qdrant.scroll(collection, limit=100)
+    return {point.id for point in points}
+
+def test_catch_up_mirrors_writes_and_deletions():
+    async def scenario():
+        qdrant = AsyncQdrantGateway(client=AsyncQdrantClient(location=":memory:"))
+        for collection in ("source", "target"):
+            await qdrant.create_collection(collection)
+        await qdrant.upsert([point(1), point(2), point(3)], collection="source")
+        # 4 was copied, then probe's delete_stale removed it from the source
+        await qdrant.upsert([point(1), point(2), point(4)], collection="target")
+
+        service = ReindexService()
+        service.context = SimpleNamespace(async_qdrant=qdrant, ollama=Embedder(), logger=structlog.get_logger())
+        assert await service.catch_up("source", "target") == 2
+        assert await ids(qdrant, "target") == {1, 2, 3}
+        assert await service.catch_up("source", "target") == 0
+    asyncio.run(scenario())
+
+def test_catch_up_after_the_swap_only_copies():
+    async def scenario():
+        qdrant = AsyncQdrantGateway(client=AsyncQdrantClient(location=":memory:"))
+        for collection in ("source", "target"):
+            await qdrant.create_collection(collection)
+        await qdrant.upsert([point(1), point(2)], collection="source")
+        # 3 reached the target through the alias, it never was in the source
+        await qdrant.upsert([point(1), point(3)], collection="target")
+
+        service = ReindexService()
+        service.context = SimpleNamespace(async_qdrant=qdrant, ollama=Embedder(), logger=structlog.get_logger())
+        assert await service.catch_up("source", "target", mirror_deletions=False) == 1
+        assert await ids(qdrant, "target") == {1, 2, 3}
+    asyncio.run(scenario())
+
+def test_reindex_ends_under_steady_writes_and_keeps_the_last_ones(gateway, monkeypatch):
+    monkeypatch.setattr(embedder_settings, "reindex_catch_up_passes", 3)
+    monkeypatch.setattr(embedder_settings, "reindex_catch_up_threshold", 0)
+
+    class SteadyWrites(ReindexService):
+        """A probe writes to the old collection before every catch-up pass and right before the swap"""
+        written = 100
+
+        async def catch_up(self, source, target, mirror_deletions=True):
+            if mirror_deletions:
+                await self.write(source)
+            return await super().catch_up(source, target, mirror_deletions)
+
+        async def write(self, collection):
+            self.written += 1
+            await self.context.async_qdrant.upsert([point(self.written)], collection=collection)
+
+    async def scenario():
+        qdrant = AsyncQdrantGateway(client=AsyncQdrantClient(location=":memory:"))
+        old = qdrant.versioned_collection_name("old-model")
+        await qdrant.create_collection(old)
+        await qdrant.swap_alias(old)
+        await qdrant.upsert([point(1), point(2)], collection=old)
+
+        service = SteadyWrites()
+        service.context = SimpleNamespace(async_qdrant=qdrant, ollama=Embedder(), redis=gateway, logger=structlog.get_logger())
+        swap_alias = qdrant.swap_alias
+        async def write_then_swap(collection, **kwargs):
+            await service.write(old)
+            return await swap_alias(collection, **kwargs)
+        monkeypatch.setattr(qdrant, "swap_alias", write_then_swap)
+
+        await service.reindex()
+        target = qdrant.versioned_collection_name("new-model")
+        assert await qdrant.get_alias_target() == target
+        # 3 capped passes wrote 101 to 103, 104 landed after the last one
+        assert await ids(qdrant, target) == {1, 2, 101, 102, 103, 104}
+    asyncio.run(scenario())
+
+def test_legacy_collection_is_only_dropped_when_asked():
+    qdrant = QdrantGateway(collection="legacy", client=QdrantClient(location=":memory:"))
+    for collection in ("legacy", "legacy__model"):
+        qdrant.create_collection(collection)
+
+    with pytest.raises(ValueError):
+        qdrant.swap_alias("legacy__model")
+    assert qdrant.get_client().collection_exists("legacy")
+
+    qdrant.swap_alias("legacy__model", drop_legacy=True)
+    assert qdrant.get_alias_target() == "legacy__model"
@@ -0,0 +1,35 @@
+# tests/test_revelation.py - span export to OTLP json lines
+from pylon import Tracer
+from pylon.revelation import FileSpanExporter
+import json
+import time
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_full_batches_are_written_by_the_exporter_thread(tmp_path):
+    exporter = FileSpanExporter("probe", folder=tmp_path, batch_size=2, interval=0)
+    tracer = Tracer("probe", exporter=exporter)
+    tracer.enabled = True
+    for name in ("first", "second"):
+        tracer.end_span(tracer.start_span(name))
+
+    assert wait_for(exporter.path.exists)
+    spans = json.loads(exporter.path.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [span["name"] for span in spans] == ["first", "second"]
+
+def test_export_files_rotate_past_max_bytes_and_keep_the_backups(tmp_path):
+    exporter = FileSpanExporter("probe", folder=tmp_path, batch_size=1000, interval=0, max_bytes=1, max_age=0, backups=2)
+    tracer = Tracer("probe", exporter=exporter)
+    for i in range(5):
+        exporter.export(tracer.start_span(f"span-{i}"))
+        exporter.flush()
+
+    rotated = sorted(tmp_path.glob(f"{exporter.path.stem}.*.jsonl"))
+    # every flush after the first finds a full file, the 4 rotated ones are pruned to 2
+    assert len(rotated) == 2
+    assert exporter.path.exists()
+    assert '"span-4"' in exporter.path.read_text()
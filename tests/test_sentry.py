@@ -0,0 +1,78 @@
+# tests/test_sentry.py - sentry dispatch on fakeredis and a temporary watch folder
+import sys
+from conftest import ROOT
+sys.path.insert(0, str(ROOT / "cybernetics_core"))
+
+from pylon import settings, Tracer
+from types import SimpleNamespace
+from sentry import WatcherService
+from cybernetic_core_settings import watcher_settings
+import asyncio
+import os
+import pytest
+import structlog
+
+@pytest.fixture
+def watcher(gateway, tmp_path, monkeypatch):
+    monkeypatch.setattr(watcher_settings, "watch_folder", str(tmp_path))
+    monkeypatch.setattr(settings, "qdrant_collections", {"team-a": {}})
+    service = WatcherService()
+    service.context = SimpleNamespace(redis=gateway, tracer=Tracer("sentry"), logger=structlog.get_logger())
+    service.create_collection_folders()
+    return service
+
+def test_collection_subfolder_files_carry_their_collection(watcher, gateway, tmp_path):
+    (tmp_path / "company.md").write_text("# Company")
+    (tmp_path / "team-a" / "team.md").write_text("# Team A")
+
+    async def scenario():
+        await watcher.rescan(None)
+        messages = []
+        while message := await gateway.get_message(settings.redis_queue_files, timeout=0.01):
+            messages.append(gateway.decode_message(message))
+        return messages
+
+    collections = {message["filename"]: message.get(settings.collection_field) for message in asyncio.run(scenario())}
+    assert collections == {"company.md": None, "team.md": "team-a"}
+    assert (tmp_path / watcher_settings.processed_folder.lstrip("/") / "team-a" / "team.md").exists()
+
+def test_failed_admission_of_a_settled_file_is_deferred(watcher, gateway, tmp_path, monkeypatch):
+    (tmp_path / "late.md").write_text("# Late")
+
+    async def unreachable(queue):
+        raise ConnectionError("tempest unreachable")
+    monkeypatch.setattr(gateway, "get_capacity", unreachable)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        watcher.settle(loop, None, "late.md", watcher.get_file_state("late.md"))
+        assert len(watcher.tasks) == 1
+        await asyncio.gather(*watcher.tasks, return_exceptions=True)
+        # done callbacks run on the next loop iteration
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert not watcher.tasks
+    assert watcher.deferred == {"late.md"}
+
+def test_deferred_files_are_retried_oldest_first_without_a_rescan(watcher, gateway, tmp_path, monkeypatch):
+    for age, name in enumerate(["new.md", "old.md", "gone.md"]):
+        (tmp_path / name).write_text(name)
+        os.utime(tmp_path / name, ns=(10**18 - age * 10**9, 10**18 - age * 10**9))
+    (tmp_path / "gone.md").unlink()
+    watcher.deferred = {"new.md", "old.md", "gone.md"}
+    # a file dropped meanwhile is left to inotify or the safety rescan
+    (tmp_path / "other.md").write_text("other")
+
+    async def room_for_one(queue):
+        return 1
+    monkeypatch.setattr(gateway, "get_capacity", room_for_one)
+
+    async def scenario():
+        await watcher.retry_deferred(None)
+        message = await gateway.get_message(settings.redis_queue_files, timeout=0.01)
+        assert await gateway.get_message(settings.redis_queue_files, timeout=0.01) is None
+        return gateway.decode_message(message)
+
+    assert asyncio.run(scenario())["filename"] == "old.md"
+    assert watcher.deferred == {"new.md"}
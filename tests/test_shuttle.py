@@ -0,0 +1,22 @@
+# tests/test_shuttle.py - blob store references and ownership
+from pylon import BlobGateway
+import pytest
+
+def test_same_bytes_get_one_blob_per_message(tmp_path):
+    blob = BlobGateway(str(tmp_path))
+    first = blob.put_bytes(b"same content", "message-1")
+    second = blob.put_bytes(b"same content", "message-2")
+    assert first != second
+
+    # the first ack removes its own copy only
+    blob.delete(first)
+    assert not blob.exists(first)
+    assert blob.read_bytes(second) == b"same content"
+
+def test_references_stay_inside_the_store(tmp_path):
+    blob = BlobGateway(str(tmp_path))
+    for reference in ("../../etc/passwd", "a" * 64 + "-../x", "a" * 64 + "/x"):
+        with pytest.raises(ValueError):
+            blob.get_path(reference)
+    # references written before per-message blobs are still read
+    assert blob.get_path("a" * 64).endswith("a" * 64)
@@ -1,19 +1,18 @@
 import asyncio
-import base64
 import traceback
-from pylon import settings, output_messages
+from pylon import settings, output_messages, record_processed_file, start_metrics_server
 from pylon.context import ApplicationContext
 from twilight_council_settings import chunker_settings
 import traceback
-import json
 from langchain_core.documents import Document
 
 class ChunkerService:
     def __init__(self):
         self.context = None
 
-    async def initialize(self):
-        self.context = await ApplicationContext.create()
+    async def initialize(self, context=None):
+        self.context = context or await ApplicationContext.create("stalker")
+        start_metrics_server()
         self.context.logger.info(f"{output_messages.CHUNKER_INITIALIZATION}")
 
     async def run(self):
@@ -30,7 +29,10 @@ class ChunkerService:
     async def look_for_document_messages(self):
         """Asynchronous pages ingestion."""
         self.context.logger.debug(f"{output_messages.CHUNKER_WAIT_START}")
+        # reaper, lease heartbeat and queue monitor, if one of them fails the stage stops with it
+        background = self.context.redis.supervise(self.context.redis.run_background(settings.redis_queue_documents, [settings.redis_queue_documents, settings.redis_queue_pages]))
         while True:
+                document_message = None
                 try:
                     document_message = await self.context.redis.get_message(settings.redis_queue_documents)
                     if not document_message:
@@ -39,53 +41,62 @@ class ChunkerService:
                     # decodes the message
                     decoded_documents = self.context.redis.decode_message(document_message)
                     if not decoded_documents:
+                        await self.context.redis.nack_message(document_message)
                         continue
                     
-                    # reads decoded message
-                    filename = decoded_documents.get("filename")
-                    message_id = decoded_documents.get("id")
-                    content_mime = decoded_documents.get(settings.redis_content_type)
-                    base64_content = decoded_documents.get(settings.redis_content_field)
+                    with self.context.tracer.stage("stalker", decoded_documents, document_message):
+                        # reads decoded message
+                        filename = decoded_documents.get("filename")
+                        message_id = decoded_documents.get("id")
+                        content_mime = decoded_documents.get(settings.redis_content_type)
 
-                    # decodes the documents
-                    base64_content = decoded_documents.get(settings.redis_content_field)
-                    decoded_json = base64.b64decode(base64_content).decode(settings.encoding)
-                    document_dicts = json.loads(decoded_json)
+                        # decodes the documents
+                        content = self.context.redis.get_content(decoded_documents)
+                        document_dicts = self.context.redis.deserialize_documents(content)
 
-                    documents = [
-                        Document(**d) if isinstance(d, dict) else Document(page_content=str(d))
-                        for d in document_dicts
-                    ]
+                        documents = [
+                            Document(**d) if isinstance(d, dict) else Document(page_content=str(d))
+                            for d in document_dicts
+                        ]
 
-                    # split the data into chunks (documents into pages)
-                    # until here no reasoning has been called or llm engine
-                    pages = self.context.ollama.split_into_chunks(documents=documents)
+                        # split the data into chunks (documents into pages)
+                        # until here no reasoning has been called or llm engine
+                        # the message can ask for a chunking strategy, cheap ones for bulk backfills
+                        pages = self.context.ollama.chunk_documents(
+                            documents=documents,
+                            strategy=decoded_documents.get(settings.chunking_field),
+                            filename=filename
+                        )
 
-                    # Serialize pages and encode as base64
-                    serialized = json.dumps([
-                        p.dict() if hasattr(p, "dict") else str(p)
-                        for p in pages
-                    ])
-                    encoded_content = base64.b64encode(serialized.encode(settings.encoding)).decode(settings.encoding)
+                        extra = self.context.redis.get_parts(decoded_documents) or {}
+                        if decoded_documents.get(settings.collection_field):
+                            extra[settings.collection_field] = decoded_documents[settings.collection_field]
 
-                    
-                    # sets the payload with informatio for metadata
-                    payload = self.context.redis.generate_message(
-                        id=message_id,
-                        encoded_content=encoded_content,
-                        filename=filename,
-                        content_field=None,
-                        content_type=None,
-                        content_mime=content_mime
-                    )
+                        # Serialize pages
+                        serialized = self.context.redis.serialize_documents(pages)
+
+                        # sets the payload with informatio for metadata
+                        payload = self.context.redis.generate_message(
+                            id=message_id,
+                            content=serialized,
+                            filename=filename,
+                            content_field=None,
+                            content_type=None,
+                            content_mime=content_mime,
+                            extra=extra or None
+                        )
 
-                    # send pages to their redis queue
-                    await self.context.redis.send_message(payload, settings.redis_queue_pages)
-                    #await self.context.redis.send_it(queue=settings.redis_queue_pages, content=payload, message_id=self.context.redis.generate_message_id())
+                        # send pages to their redis queue
+                        await self.context.redis.send_message(payload, settings.redis_queue_pages)
+                        #await self.context.redis.send_it(queue=settings.redis_queue_pages, content=payload, message_id=self.context.redis.generate_message_id())
+                        await self.context.redis.ack_message(document_message)
+                        record_processed_file("success", "stalker")
 
                 except Exception as e:
+                    record_processed_file("failed", "stalker")
                     self.context.logger.error(f"{output_messages.CHUNKER_EXCEPTION}", error=str(e))
                     traceback.print_exc()
+                    await self.context.redis.nack_message(document_message)
 
                 await asyncio.sleep(chunker_settings.check_interval)
 